@@ -0,0 +1,217 @@
+"""
+File: example_download_scheduler.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: Python file for an example benchmarking the download scheduler against the SentinelHub download
+             client, both downloading from a local mock of the SentinelHub API. Like the service, the mock limits
+             the request rate with a token bucket, answering 429 with a 'Retry-After' once it is empty, and slows
+             down as more requests are in flight. A second check runs the scheduler against a fake executor
+             answering 429 and then 200, checking that its concurrency backs off and recovers.
+
+Contents:
+    - benchmark_scheduler: Example function comparing the time the scheduler and the client take for the same
+                           requests.
+    - check_scheduler_backoff: Example function checking the scheduler backs off on 429 and then recovers.
+    - start_mock_server: Function that starts the mock server in a background thread.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+import time
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Third-party library imports
+import requests
+from sentinelhub import DownloadRequest, MimeType, SentinelHubDownloadClient
+from sentinelhub.constants import RequestType
+
+# Local module imports
+import local_sentinelhub.download_scheduler_functions as dsf
+from conf.config import *
+
+
+def benchmark_scheduler():
+    """
+    Example of how to benchmark the download scheduler. The same requests of 4 'projects' are downloaded by a new
+    client with 5 threads per project, as 'sentinelhub_download()' does without a scheduler, one project after
+    another and all at once, then by a single scheduler shared by the projects.
+    """
+
+    # Settings
+    n_projects = 4
+    n_requests = 50 # Per project
+    requests_per_second = 60 # Limit of the mock
+    base_latency = 0.2 # Seconds the mock takes per request
+    latency_per_request = 0.005 # Seconds added per request in flight
+
+    server = start_mock_server(requests_per_second, base_latency, latency_per_request)
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/v1/process"
+
+    def make_requests():
+        return [DownloadRequest(url=url, request_type=RequestType.POST, post_values={'slot': i},
+                                data_type=MimeType.JSON, use_session=False) for i in range(n_requests)]
+
+    def run_projects(download_function, at_once=True):
+        threads = [threading.Thread(target=download_function, args=(make_requests(),)) for _ in range(n_projects)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+            if (not at_once):
+                thread.join()
+        for thread in threads:
+            thread.join()
+        return time.time() - start
+
+    def client_download(requests):
+        SentinelHubDownloadClient(config=config).download(requests, max_threads=5)
+
+    # A new client per call with a fixed number of threads, as the examples loop over locations
+    serial_time = run_projects(client_download, at_once=False)
+    client_time = run_projects(client_download)
+
+    # One scheduler shared by every project
+    scheduler = dsf.create_download_scheduler(config=config, max_threads=32,
+                                              requests_per_minute=requests_per_second * 60)
+    scheduler_time = run_projects(lambda requests: dsf.scheduler_download(scheduler, requests))
+    stats = dsf.scheduler_stats(scheduler)
+    dsf.stop_download_scheduler(scheduler)
+
+    server.shutdown()
+
+    total = n_projects * n_requests
+    print(f"Client, one project at a time: {serial_time:.2f} s, {total / serial_time:.1f} requests/s")
+    print(f"Client, all projects at once: {client_time:.2f} s, {total / client_time:.1f} requests/s")
+    print(f"Scheduler: {scheduler_time:.2f} s, {total / scheduler_time:.1f} requests/s")
+    print(f"Scheduler stats: {stats}")
+
+
+def check_scheduler_backoff():
+    """
+    Example of how to check the scheduler's back-off without the service. A fake executor, passed as
+    'execute_function', answers 429 with a 'Retry-After' to the first requests, then 200 to every other. The
+    concurrency limit must be halved by the 429s, the workers paused for the 'Retry-After', and the limit must
+    grow back once requests succeed again. Raises an AssertionError if not.
+    """
+
+    # Settings
+    initial_threads = 8
+    n_throttled = 4 # Requests answered with 429 before the fake recovers
+    retry_after_ms = 200
+    latency = 0.01 # Seconds taken by every request
+
+    lock = threading.Lock()
+    state = {'calls': 0, 'last_429': None, 'first_200': None}
+
+    def fake_execute(download_request):
+        with lock:
+            state['calls'] += 1
+            throttled = state['calls'] <= n_throttled
+            if (throttled):
+                state['last_429'] = time.monotonic()
+            elif (state['first_200'] is None):
+                state['first_200'] = time.monotonic()
+
+        if (throttled):
+            response = requests.Response()
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after_ms)
+            raise requests.HTTPError(response=response)
+
+        time.sleep(latency)
+        return download_request, {}
+
+    scheduler = dsf.create_download_scheduler(config=config, max_threads=16, initial_threads=initial_threads,
+                                              execute_function=fake_execute)
+
+    # Throttled round, every request still succeeds once retried
+    results = dsf.scheduler_download(scheduler, list(range(initial_threads)))
+    backed_off = scheduler['limit']
+
+    assert results == list(range(initial_threads)), "Throttled requests weren't retried."
+    assert backed_off < initial_threads, f"Concurrency wasn't reduced by 429s, the limit is {backed_off}."
+    assert state['first_200'] - state['last_429'] >= 0.9 * retry_after_ms / 1000.0, "Retry-After wasn't respected."
+
+    # Successful rounds, concurrency grows back
+    dsf.scheduler_download(scheduler, list(range(200)))
+    recovered = scheduler['limit']
+    stats = dsf.scheduler_stats(scheduler)
+    dsf.stop_download_scheduler(scheduler)
+
+    assert recovered > backed_off, f"Concurrency didn't recover, the limit stayed at {recovered}."
+    assert stats['throttled'] >= n_throttled and stats['failed'] == 0, f"Unexpected stats: {stats}"
+
+    print(f"Back-off check passed: limit {initial_threads} -> {backed_off:.2f} after 429s -> {recovered:.2f} "
+          f"after successes. Stats: {stats}")
+
+
+def start_mock_server(requests_per_second, base_latency, latency_per_request):
+    """
+    Start a mock of the SentinelHub process API in a background thread. Each request is answered after a latency
+    that grows with the requests in flight, or with 429 and a 'Retry-After' in milliseconds if its token bucket,
+    holding a second's worth of requests, is empty.
+
+    Args:
+        requests_per_second (int): Requests accepted per second.
+        base_latency (float): Seconds taken by a request when it is the only one in flight.
+        latency_per_request (float): Seconds added per other request in flight.
+
+    Returns:
+        ThreadingHTTPServer: The server, listening on a free port of 127.0.0.1.
+    """
+
+    lock = threading.Lock()
+    state = {'in_flight': 0, 'tokens': float(requests_per_second), 'updated': time.time()}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            with lock:
+                now = time.time()
+                state['tokens'] = min(requests_per_second,
+                                      state['tokens'] + (now - state['updated']) * requests_per_second)
+                state['updated'] = now
+                throttled = state['tokens'] < 1.0
+                if (not throttled):
+                    state['tokens'] -= 1.0
+                    state['in_flight'] += 1
+                    latency = base_latency + latency_per_request * (state['in_flight'] - 1)
+
+            if (throttled):
+                retry_after = int(1000 * (1.0 - state['tokens']) / requests_per_second)
+                self.send_response(429)
+                self.send_header('Retry-After', str(max(retry_after, 1)))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            time.sleep(latency)
+
+            with lock:
+                state['in_flight'] -= 1
+
+            response = json.dumps({'request': json.loads(body or b'{}')}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, format, *args): # Keeps the benchmark's output readable
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+if __name__ == "__main__":
+    check_scheduler_backoff()
+    benchmark_scheduler()
@@ -20,6 +20,7 @@ from datetime import datetime
 import utils.misc_functions as mf
 import local_sentinelsat.request_functions as rf
 import utils.model_application_functions as maf
+import utils.polymer_functions as pf
 import models.model_functions as mmf
 from config import *
 
@@ -53,9 +54,15 @@ def download_and_apply_model():
     # /Users/aidan/Documents/secondGit/copy_prior_branch_OceanSatelliteImages/polymer-v4.16.1/chlorPoly/MaxFarm
     # MaxFarm_poly_files
 
+    worker = pf.start_polymer_worker() # Loads POLYMER once for every snapshot
+
     maf.model_routine_space_eff(coordinates, date_tuples, project_name, mmf.chlor,
                                 file_paths_dict['poly_dir'], request_function=rf.get_olci_singular,
-                                npy_save_to=npy_save_to)
+                                npy_save_to=npy_save_to, use_roi=True, polymer_worker=worker,
+                                variables=mmf.chlor_bands)
+
+    if (worker is not None):
+        pf.stop_polymer_worker(worker)
 
 if __name__ == "__main__":
     download_and_apply_model()
\ No newline at end of file
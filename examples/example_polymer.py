@@ -118,7 +118,9 @@ def download_and_apply_folder():
         coordinates, date_tuples, file_paths_dict['download_dir'], request_function=rf.get_olci
     )
 
-    pf.run_polymer_on_folder(file_paths_dict['download_dir'])  # Now we call the polymer script
+    # Now we call the polymer script, on up to four snapshots at once
+    statuses = pf.run_polymer_on_folder(file_paths_dict['download_dir'], max_jobs=4)
+    print(statuses)
 
 if __name__ == "__main__":
     download_and_apply_folder()
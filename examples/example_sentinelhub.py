@@ -8,7 +8,8 @@ Description: Python file for examples in basic functionality of the SentinelHub
 Contents:
     - basic_download_single: Example function for how to download a singular band of data.
     - basic_download_multi: Example function for how to download multiple bands of data.
-    - multiple_locations: Example function for how to download from multiple locations in one function.
+    - multiple_locations: Example function for how to download from multiple locations in one function, sharing
+                          one download scheduler.
 
 Notes:
     - This code is distributed under the MIT License. See LICENSE.txt for more details.
@@ -21,6 +22,7 @@ from datetime import datetime
 import local_sentinelhub.sentinelhub_manage_functions as shm
 import utils.misc_functions as mf
 import local_sentinelhub.requestFunctions as rf
+import local_sentinelhub.download_scheduler_functions as dsf
 
 def basic_download_single():
     """
@@ -41,6 +43,7 @@ def basic_download_single():
     file_paths_dict = {
         'sat_image_save_path': 'out/satData/images/',
         'operations_save_path': 'out/satData/logs/MaxFarm_oper.txt',
+        'catalog_path': 'out/satData/logs/MaxFarm_oper.db',
         'figure_save_path': 'out/figures/',
         'csvpath_thermal': 'out/data/MaxFarm_compDataMaxFarm_Thermal.csv'
     }
@@ -60,7 +63,7 @@ def basic_download_single():
         file_paths_dict['operations_save_path'], thermalPreface, coordinates,
         file_paths_dict['figure_save_path'], file_paths_dict['csvpath_thermal'],
         operext, projectName, request_function=rf.get_thermal_request,
-        createImages=createImages
+        createImages=createImages, catalog_path=file_paths_dict['catalog_path']
     )
 
 
@@ -69,6 +72,7 @@ def basic_download_multi():
     Example of how to download multiple bands of data from a satellite using the SentinelHub API.
     In order to do this you must make the csvpath into a list with the length equal to the bands of the request.
     The preface must be made into a list as well, one with the same length.
+    With 'multi_band' set the request is only downloaded once per time slot, rather than once per band.
     """
 
     # Settings
@@ -109,7 +113,7 @@ def basic_download_multi():
         file_paths_dict['operations_save_path'], preface, coordinates,
         file_paths_dict['figure_save_path'], file_paths_dict['csvpath'],
         operext, projectName, request_function=rf.get_all_s2l2a_request,
-        createImages=createImages
+        createImages=createImages, multi_band=True
     )
 
 
@@ -153,6 +157,9 @@ def multiple_locations():
     end = datetime(end_year, end_month, end_day)
     date_tuples = mf.get_timeslots(start, end, n_chunks)
 
+    # One scheduler for every location and request, concurrency adapts to the account's limits
+    scheduler = dsf.create_download_scheduler(max_threads=16)
+
     for i in range(len(projectName)):
 
         #file_paths_dict = file_paths_dicts[i]
@@ -167,7 +174,7 @@ def multiple_locations():
             file_paths_dicts[0]['operations_save_path'], prefaces[0], coordinates[i],
             file_paths_dicts[0]['figure_save_path'], file_paths_dicts[0]['csvpath'],
             operext, projectName[i], request_function=rf.get_sediment_request,
-            createImages=createImages
+            createImages=createImages, scheduler=scheduler
         )
 
         resolution = 100
@@ -176,9 +183,12 @@ def multiple_locations():
             file_paths_dicts[1]['operations_save_path'], prefaces[1], coordinates[i],
             file_paths_dicts[1]['figure_save_path'], file_paths_dicts[1]['csvpath'],
             operext, projectName[i], request_function=rf.get_chlor_algo_request,
-            createImages=createImages
+            createImages=createImages, multi_band=True, scheduler=scheduler
         )
 
+    print(dsf.scheduler_stats(scheduler))
+    dsf.stop_download_scheduler(scheduler)
+
 
 if __name__ == "__main__":
     basic_download_single()
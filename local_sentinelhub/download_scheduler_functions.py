@@ -0,0 +1,445 @@
+"""
+File: download_scheduler_functions.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the functions for a download scheduler, shared by every project, band and
+             location downloading from the SentinelHub API. Requests from all of them go through one queue and
+             one pool of HTTP connections. The number of requests in flight adapts to the service, growing while
+             responses stay fast and shrinking when latency rises or the service answers 429 (too many requests),
+             and token buckets keep the request rate and processing units used within the account's limits.
+
+Contents:
+    - create_download_scheduler: Function that creates a scheduler and starts its worker threads.
+    - stop_download_scheduler: Function that stops a scheduler's worker threads.
+    - scheduler_submit: Function that queues a download request, returning a future of its result.
+    - scheduler_download: Function that downloads a list of requests through a scheduler, in order.
+    - scheduler_stats: Function that returns counts and the current concurrency of a scheduler.
+    - session_executor: Function that returns a function executing requests over pooled HTTP connections.
+    - create_token_bucket: Function that creates a token bucket.
+    - bucket_wait: Function that returns how long until a token bucket holds enough tokens.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+# Third-party library imports
+import requests
+from requests.adapters import HTTPAdapter
+from sentinelhub import SentinelHubDownloadClient, SHConstants
+from sentinelhub.download.models import DownloadResponse
+
+# Local module imports
+from conf.config import *
+
+
+# Statuses retried rather than failed, the service is busy rather than the request wrong
+retry_statuses = [429, 500, 502, 503, 504]
+
+
+def create_download_scheduler(config=config,  # SHConfig used for the OAuth session and timeouts.
+                              max_threads=16,  # Most requests in flight at once.
+                              initial_threads=4,  # Requests in flight at once to start with.
+                              min_threads=1,  # Fewest requests in flight at once.
+                              requests_per_minute=None,  # Request rate limit of the account.
+                              units_per_minute=None,  # Processing unit rate limit of the account.
+                              latency_factor=2.0,  # Latency, relative to the lowest seen, that reduces concurrency.
+                              max_attempts=5,  # Attempts made at a request before it fails.
+                              execute_function=None  # Function executing a single request.
+                              ):
+    """
+    Create a download scheduler and start its worker threads. The scheduler is a dict holding the shared state, to
+    be passed to 'scheduler_submit()' or 'scheduler_download()' from any thread, and to 'sentinelhub_main()' as
+    'scheduler'.
+
+    Concurrency is adapted additively up and multiplicatively down: each success under the latency threshold adds
+    about one request in flight per round of requests, or one per success until the first reduction so a new
+    scheduler quickly finds the service's capacity, while a 429 halves it and pauses every worker for the
+    service's 'Retry-After'. A latency over 'latency_factor' times the lowest seen shrinks it by a quarter. It is
+    reduced at most once per round of requests, as the responses of one round all carry the same news.
+
+    Args:
+        config (SHConfig): Configuration of the SentinelHub account (default is the one in 'conf/config.py').
+        max_threads (int): Most requests in flight at once, the number of worker threads (default is 16).
+        initial_threads (int): Requests in flight at once to start with (default is 4).
+        min_threads (int): Fewest requests in flight at once (default is 1).
+        requests_per_minute (float): Requests the account may make per minute (default is None, no limit).
+        units_per_minute (float): Processing units the account may use per minute (default is None, no limit).
+        latency_factor (float): Latency, relative to the lowest seen, above which concurrency is reduced
+            (default is 2.0).
+        max_attempts (int): Attempts made at a request that is throttled or meets a server error (default is 5).
+        execute_function (function): Function called as 'execute_function(download_request)', returning the
+            decoded result and the response headers, and raising 'requests.HTTPError' on an error status
+            (default is None, 'session_executor(config, max_threads)').
+
+    Returns:
+        dict: The scheduler.
+    """
+
+    if (execute_function is None):
+        execute_function = session_executor(config, max_threads)
+
+    scheduler = {
+        'queue': queue.Queue(),
+        'condition': threading.Condition(),
+        'execute': execute_function,
+        'limit': float(max(min_threads, min(initial_threads, max_threads))), # Requests allowed in flight
+        'min_threads': min_threads,
+        'max_threads': max_threads,
+        'active': 0, # Requests in flight
+        'paused_until': 0.0, # Set from 'Retry-After', no request starts before it
+        'reduced_at': 0.0, # Concurrency is reduced at most once per round of requests
+        'slow_start': True, # Grows by one per success until first reduced
+        'latency': None, # Moving average of the response time
+        'lowest_latency': None,
+        'latency_factor': latency_factor,
+        'max_attempts': max_attempts,
+        'request_bucket': None if requests_per_minute is None else create_token_bucket(requests_per_minute / 60.0),
+        'unit_bucket': None if units_per_minute is None else create_token_bucket(units_per_minute / 60.0),
+        'stats': {'completed': 0, 'failed': 0, 'throttled': 0, 'retried': 0},
+        'workers': [],
+    }
+
+    for _ in range(max_threads):
+        worker = threading.Thread(target=scheduler_worker, args=(scheduler,), daemon=True)
+        worker.start()
+        scheduler['workers'].append(worker)
+
+    return scheduler
+
+
+def stop_download_scheduler(scheduler):
+    """
+    Stop a scheduler's worker threads once the requests already queued, and any retries of them, are done.
+
+    Args:
+        scheduler (dict): The scheduler.
+
+    Returns:
+        None
+    """
+
+    scheduler['queue'].join()
+
+    for _ in scheduler['workers']:
+        scheduler['queue'].put(None)
+
+    for worker in scheduler['workers']:
+        worker.join()
+
+    scheduler['workers'] = []
+
+
+def scheduler_submit(scheduler, download_request, units=1.0):
+    """
+    Queue a download request.
+
+    Args:
+        scheduler (dict): The scheduler.
+        download_request (DownloadRequest): The request, such as 'request.download_list[0]' of a
+            'SentinelHubRequest'.
+        units (float): Processing units the request is expected to use (default is 1.0).
+
+    Returns:
+        Future: Future of the decoded result.
+    """
+
+    future = Future()
+    scheduler['queue'].put((future, download_request, units, 0))
+
+    return future
+
+
+def scheduler_download(scheduler, download_requests, units=1.0):
+    """
+    Download a list of requests through a scheduler, blocking until every one is done. Requests queued by other
+    threads are interleaved with these, the scheduler deciding how many run at once.
+
+    Args:
+        scheduler (dict): The scheduler.
+        download_requests (list): The requests.
+        units (float): Processing units each request is expected to use (default is 1.0).
+
+    Returns:
+        list: The decoded results, in the order of the requests.
+    """
+
+    futures = [scheduler_submit(scheduler, download_request, units=units) for download_request in download_requests]
+
+    return [future.result() for future in futures]
+
+
+def scheduler_stats(scheduler):
+    """
+    Get the counts of a scheduler's requests and its current concurrency.
+
+    Args:
+        scheduler (dict): The scheduler.
+
+    Returns:
+        dict: Requests 'completed', 'failed', 'throttled' and 'retried', the concurrency 'limit', the requests
+            'active' and 'queued', and the average 'latency' in seconds.
+    """
+
+    with scheduler['condition']:
+        stats = dict(scheduler['stats'])
+        stats['limit'] = int(scheduler['limit'])
+        stats['active'] = scheduler['active']
+        stats['queued'] = scheduler['queue'].qsize()
+        stats['latency'] = scheduler['latency']
+
+    return stats
+
+
+def session_executor(config, pool_size=16):
+    """
+    Get a function that executes SentinelHub download requests over one pool of HTTP connections, rather than a
+    new connection per request, with the OAuth headers of the account's cached session.
+
+    Args:
+        config (SHConfig): Configuration of the SentinelHub account.
+        pool_size (int): Connections kept open, at least the number of worker threads (default is 16).
+
+    Returns:
+        function: Called as 'execute(download_request)', returning the decoded result and the response headers.
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    client = SentinelHubDownloadClient(config=config)
+    token_lock = threading.Lock() # Reading the session headers refreshes an expired token
+
+    def execute(download_request):
+        headers = dict(SHConstants.HEADERS)
+        if (download_request.use_session):
+            with token_lock:
+                headers.update(client.get_session().session_headers)
+        headers.update(download_request.headers)
+
+        response = session.request(download_request.request_type.value, url=download_request.url,
+                                   json=download_request.post_values, headers=headers,
+                                   timeout=config.download_timeout_seconds)
+        response.raise_for_status()
+
+        return DownloadResponse.from_response(response, download_request).decode(), dict(response.headers)
+
+    return execute
+
+
+def create_token_bucket(rate, capacity=None):
+    """
+    Create a token bucket, refilled at a fixed rate up to its capacity.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): Most tokens the bucket holds, the largest burst allowed (default is None, one second's
+            worth and at least 1).
+
+    Returns:
+        dict: The token bucket, starting full.
+    """
+
+    if (capacity is None):
+        capacity = max(1.0, rate)
+
+    return {'rate': rate, 'capacity': capacity, 'tokens': capacity, 'updated': time.monotonic()}
+
+
+def bucket_wait(bucket, amount):
+    """
+    Get how long until a token bucket holds 'amount' tokens, or as many as it can if its capacity is lower.
+
+    Args:
+        bucket (dict): The token bucket, or None for no limit.
+        amount (float): Tokens needed.
+
+    Returns:
+        float: Seconds to wait, 0 if the tokens are there now.
+    """
+
+    if (bucket is None):
+        return 0.0
+
+    now = time.monotonic()
+    bucket['tokens'] = min(bucket['capacity'], bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+    bucket['updated'] = now
+
+    missing = min(amount, bucket['capacity']) - bucket['tokens']
+
+    return max(0.0, missing / bucket['rate'])
+
+
+def scheduler_worker(scheduler):
+    """
+    Worker thread of a scheduler, running queued requests whenever the concurrency limit, any pause and the token
+    buckets allow. Stops once it takes None from the queue.
+
+    Args:
+        scheduler (dict): The scheduler.
+
+    Returns:
+        None
+    """
+
+    while True:
+        item = scheduler['queue'].get()
+
+        try:
+            if (item is None):
+                return
+            scheduler_run(scheduler, item)
+        finally:
+            scheduler['queue'].task_done()
+
+
+def scheduler_run(scheduler, item):
+    """
+    Run a single queued request, setting the result of its future or queueing it again to be retried.
+
+    Args:
+        scheduler (dict): The scheduler.
+        item (tuple): The future, download request, expected processing units and attempts made so far.
+
+    Returns:
+        None
+    """
+
+    future, download_request, units, attempts = item
+
+    if (attempts == 0 and not future.set_running_or_notify_cancel()): # Cancelled while queued
+        return
+
+    scheduler_acquire(scheduler, units)
+
+    start = time.monotonic()
+
+    try:
+        result, headers = scheduler['execute'](download_request)
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        headers = dict(e.response.headers) if e.response is not None else {}
+        scheduler_feedback(scheduler, time.monotonic() - start, status, headers, units)
+
+        if (status in retry_statuses and attempts + 1 < scheduler['max_attempts']):
+            with scheduler['condition']:
+                scheduler['stats']['retried'] += 1
+                if (status != 429): # Backs off, a 429 already pauses every worker
+                    scheduler['paused_until'] = max(scheduler['paused_until'],
+                                                    time.monotonic() + min(2 ** attempts, 60))
+            scheduler['queue'].put((future, download_request, units, attempts + 1))
+        else:
+            with scheduler['condition']:
+                scheduler['stats']['failed'] += 1
+            future.set_exception(e)
+        return
+    except Exception as e:
+        scheduler_feedback(scheduler, time.monotonic() - start, None, {}, units)
+        with scheduler['condition']:
+            scheduler['stats']['failed'] += 1
+        future.set_exception(e)
+        return
+
+    scheduler_feedback(scheduler, time.monotonic() - start, 200, headers, units)
+
+    with scheduler['condition']:
+        scheduler['stats']['completed'] += 1
+    future.set_result(result)
+
+
+def scheduler_acquire(scheduler, units):
+    """
+    Wait until a request may start, then count it as in flight and take its tokens.
+
+    Args:
+        scheduler (dict): The scheduler.
+        units (float): Processing units the request is expected to use.
+
+    Returns:
+        None
+    """
+
+    with scheduler['condition']:
+        while True:
+            now = time.monotonic()
+
+            wait = max(scheduler['paused_until'] - now,
+                       bucket_wait(scheduler['request_bucket'], 1.0),
+                       bucket_wait(scheduler['unit_bucket'], units))
+
+            if (wait <= 0 and scheduler['active'] < int(scheduler['limit'])):
+                break
+
+            scheduler['condition'].wait(wait if wait > 0 else None)
+
+        scheduler['active'] += 1
+
+        for bucket, amount in [(scheduler['request_bucket'], 1.0), (scheduler['unit_bucket'], units)]:
+            if (bucket is not None):
+                bucket['tokens'] -= min(amount, bucket['capacity'])
+
+
+def scheduler_feedback(scheduler, latency, status, headers, units):
+    """
+    Adapt a scheduler to the outcome of a request, and count it as no longer in flight.
+
+    Args:
+        scheduler (dict): The scheduler.
+        latency (float): Seconds the request took.
+        status (int): HTTP status of the response, or None if there was none.
+        headers (dict): Headers of the response.
+        units (float): Processing units the request was expected to use.
+
+    Returns:
+        None
+    """
+
+    with scheduler['condition']:
+        scheduler['active'] -= 1
+
+        now = time.monotonic()
+        # At most one reduction per round, a round lasting about the average latency
+        can_reduce = now - scheduler['reduced_at'] > (scheduler['latency'] or latency)
+
+        if (status == 429):
+            scheduler['stats']['throttled'] += 1
+            if (can_reduce):
+                scheduler['limit'] = max(scheduler['min_threads'], scheduler['limit'] / 2.0)
+                scheduler['reduced_at'] = now
+                scheduler['slow_start'] = False
+
+            retry_after = float(headers.get('Retry-After', 0)) / 1000.0 # SentinelHub sends milliseconds
+            scheduler['paused_until'] = max(scheduler['paused_until'], now + max(retry_after, 0.05))
+
+        elif (status == 200):
+            if (scheduler['latency'] is None):
+                scheduler['latency'] = latency
+            else:
+                scheduler['latency'] = 0.8 * scheduler['latency'] + 0.2 * latency
+
+            if (scheduler['lowest_latency'] is None or scheduler['latency'] < scheduler['lowest_latency']):
+                scheduler['lowest_latency'] = scheduler['latency']
+
+            if (scheduler['latency'] > scheduler['latency_factor'] * scheduler['lowest_latency']):
+                if (can_reduce):
+                    scheduler['limit'] = max(scheduler['min_threads'], scheduler['limit'] * 0.75)
+                    scheduler['reduced_at'] = now
+                    scheduler['slow_start'] = False
+            else:
+                increase = 1.0 if scheduler['slow_start'] else 1.0 / scheduler['limit']
+                scheduler['limit'] = min(scheduler['max_threads'], scheduler['limit'] + increase)
+
+            # Corrects the estimate with the units the service reports it used
+            spent = headers.get('X-ProcessingUnits-Spent')
+            if (spent is not None and scheduler['unit_bucket'] is not None):
+                scheduler['unit_bucket']['tokens'] -= float(spent) - units
+
+        scheduler['condition'].notify_all()
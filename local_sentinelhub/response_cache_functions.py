@@ -0,0 +1,294 @@
+"""
+File: response_cache_functions.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the functions for a response cache, a folder holding the decoded data of every
+             SentinelHub request made, compressed, keyed by a hash of the request itself. The request's payload
+             holds the evalscript, data collection, time interval, bounding box, size and mosaicking order, so a
+             rerun with different plotting or csv settings, or after the log was deleted, reads identical requests
+             from disk instead of downloading them again. The least recently used responses are deleted once the
+             cache is over its size, and in offline mode requests not in the cache fail instead of being sent.
+
+Contents:
+    - open_response_cache: Function that opens, creating if needed, a response cache.
+    - response_cache_key: Function that returns the key of a download request.
+    - cache_get: Function that returns the cached data of a key.
+    - cache_put: Function that stores the data of a key, evicting old responses if the cache is over its size.
+    - cache_contains: Function that checks if the data of a key is cached.
+    - cached_submit: Function that returns a future of a request's data, from the cache or from a download.
+    - cache_evict: Function that deletes the least recently used responses until the cache fits its size.
+    - cache_size: Function that returns the bytes used by a cache.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import Future
+
+# Third-party library imports
+import numpy as np
+
+# Local module imports
+
+
+def open_response_cache(root_path, max_bytes=None, offline=False):
+    """
+    Open a response cache, creating its folder if it doesn't exist yet.
+
+    Args:
+        root_path (str): Path of the cache's folder, may be shared by every project.
+        max_bytes (int): Bytes the cached responses may use, the least recently used are deleted past it (default
+            is None, no limit).
+        offline (bool): If True requests not in the cache fail rather than being downloaded (default is False).
+
+    Returns:
+        dict: The cache.
+    """
+
+    root = os.path.abspath(root_path)
+    os.makedirs(root, exist_ok=True)
+
+    cache = {'root': root, 'max_bytes': max_bytes, 'offline': offline, 'lock': threading.Lock()}
+    cache['size'] = cache_size(cache) # Kept up to date by 'cache_put()', measured again when evicting
+
+    return cache
+
+
+def response_cache_key(download_request):
+    """
+    Get the key of a download request, a hash of its URL, method, payload and response type. Authentication
+    headers aren't part of the payload, so the key is the same for every account and token.
+
+    Args:
+        download_request (DownloadRequest): The request, such as 'request.download_list[0]' of a
+            'SentinelHubRequest'.
+
+    Returns:
+        str: The key, as hex.
+    """
+
+    payload = {
+        'url': download_request.url,
+        'request_type': download_request.request_type.value,
+        'post_values': download_request.post_values,
+        'data_type': download_request.data_type.value,
+    }
+
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cache_get(cache, key):
+    """
+    Get the cached data of a key, marking it as just used.
+
+    Args:
+        cache (dict): The cache.
+        key (str): Key of the response, see 'response_cache_key()'.
+
+    Returns:
+        np.ndarray: The data, or None if it isn't cached.
+    """
+
+    path = cache_path(cache, key)
+
+    try:
+        with np.load(path) as file:
+            data = file['data']
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e: # Corrupt, such as a disk that filled up
+        print(f"Error: cached response '{path}' could not be read, ignoring it: {e}")
+        return None
+
+    try:
+        os.utime(path) # The modification time orders the responses for eviction
+    except FileNotFoundError: # Evicted by another process meanwhile
+        pass
+
+    return data
+
+
+def cache_put(cache, key, data):
+    """
+    Store the data of a key. It is written compressed to a temporary file, then renamed into place, so a reader
+    never sees a partially written response.
+
+    Args:
+        cache (dict): The cache.
+        key (str): Key of the response, see 'response_cache_key()'.
+        data (np.ndarray): The decoded data of the response.
+
+    Returns:
+        bool: True if the data was stored, False if it isn't an array.
+    """
+
+    if (not isinstance(data, np.ndarray)):
+        return False
+
+    path = cache_path(cache, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    file_descriptor, temp_path = tempfile.mkstemp(suffix='.partial', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            np.savez_compressed(file, data=data)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Error: response could not be cached: {e}")
+        if (os.path.exists(temp_path)):
+            os.remove(temp_path)
+        return False
+
+    with cache['lock']:
+        cache['size'] += os.path.getsize(path)
+        over = cache['max_bytes'] is not None and cache['size'] > cache['max_bytes']
+
+    if (over):
+        cache_evict(cache)
+
+    return True
+
+
+def cache_contains(cache, key):
+    """
+    Check if the data of a key is cached.
+
+    Args:
+        cache (dict): The cache.
+        key (str): Key of the response.
+
+    Returns:
+        bool: True if it is cached.
+    """
+
+    return os.path.isfile(cache_path(cache, key))
+
+
+def cached_submit(cache, download_request, submit_function):
+    """
+    Get a future of a request's data. A cached response is read from disk, otherwise the request is passed to
+    'submit_function' and its data is stored once downloaded. In offline mode a request that isn't cached fails
+    without being sent.
+
+    Args:
+        cache (dict): The cache, or None to always download.
+        download_request (DownloadRequest): The request.
+        submit_function (function): Function called as 'submit_function(download_request)', returning a future of
+            the decoded data, such as 'dsf.scheduler_submit()'.
+
+    Returns:
+        Future: Future of the decoded data.
+    """
+
+    if (cache is None):
+        return submit_function(download_request)
+
+    key = response_cache_key(download_request)
+    data = cache_get(cache, key)
+
+    if (data is not None or cache['offline']):
+        future = Future()
+        if (data is not None):
+            future.set_result(data)
+        else:
+            future.set_exception(LookupError(f"Response '{key}' isn't cached and the cache is offline."))
+        return future
+
+    def store(done): # Runs once downloaded, in the thread that downloaded it
+        if (not done.cancelled() and done.exception() is None):
+            cache_put(cache, key, done.result())
+
+    future = submit_function(download_request)
+    future.add_done_callback(store)
+
+    return future
+
+
+def cache_evict(cache):
+    """
+    Delete the least recently used responses until the cache fits its size. The folder is measured again, so
+    responses added or deleted by other processes sharing it are counted.
+
+    Args:
+        cache (dict): The cache.
+
+    Returns:
+        int: Bytes freed.
+    """
+
+    responses = []
+    for root, dirs, files in os.walk(cache['root']):
+        for file in files:
+            if (file.endswith('.npz')):
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                responses.append((stat.st_mtime, stat.st_size, path))
+
+    responses.sort()
+
+    size = sum(response[1] for response in responses)
+    freed = 0
+
+    for mtime, response_size, path in responses:
+        if (cache['max_bytes'] is None or size - freed <= cache['max_bytes']):
+            break
+        try:
+            os.remove(path)
+            freed += response_size
+        except FileNotFoundError: # Evicted by another process
+            freed += response_size
+
+    with cache['lock']:
+        cache['size'] = size - freed
+
+    return freed
+
+
+def cache_size(cache):
+    """
+    Get the bytes used by the responses in a cache.
+
+    Args:
+        cache (dict): The cache.
+
+    Returns:
+        int: Size in bytes.
+    """
+
+    size = 0
+
+    for root, dirs, files in os.walk(cache['root']):
+        for file in files:
+            if (file.endswith('.npz')):
+                try:
+                    size += os.path.getsize(os.path.join(root, file))
+                except FileNotFoundError:
+                    pass
+
+    return size
+
+
+def cache_path(cache, key):
+    """
+    Get the path of a response in a cache, within a folder named after the key's first two characters so no
+    folder holds too many files.
+
+    Args:
+        cache (dict): The cache.
+        key (str): Key of the response.
+
+    Returns:
+        str: Path of the response's file.
+    """
+
+    return os.path.join(cache['root'], key[:2], key + '.npz')
@@ -7,7 +7,16 @@ Description: This module contains the functions that manage the processes for th
 
 Contents:
     - sentinelhub_main: Main function for interacting with the SentinelHub API.
+    - sentinelhub_missing_slots: Function that returns the date tuples not yet downloaded for a preface.
+    - sentinelhub_cached_slots: Function that returns the date tuples whose responses are all in a response cache.
     - sentinelhub_routine: Function to handle the core routine for SentinelHub API.
+    - sentinelhub_routine_multi: Function to handle the core routine for a multi-band request, downloading once.
+    - sentinelhub_download: Function that downloads the data for a list of date tuples.
+    - sentinelhub_download_iter: Function that yields the data for a list of date tuples, one time slot at a time.
+    - sentinelhub_save_outputs: Function that writes the npy/png/nc/log/figure/csv outputs for a single band.
+    - sentinelhub_stream_outputs: Function that writes the outputs of every band a time slot at a time, as it arrives.
+    - sentinelhub_plot_page: Function that plots the composite figure of a page of time slots.
+    - request_units: Function that estimates the processing units a request uses.
 
 Notes:
     - This code is distributed under the MIT License. See LICENSE.txt for more details.
@@ -15,6 +24,8 @@ Notes:
 
 # Standard library imports
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Third-party library imports
 from sentinelhub import (
@@ -33,6 +44,14 @@ import utils.plot_functions as pf
 import utils.save_file_functions as sff
 import utils.array_operations as ao
 import utils.misc_functions as mf
+import utils.catalog_functions as cat
+import utils.timeseries_functions as ts
+import local_sentinelhub.download_scheduler_functions as dsf
+import local_sentinelhub.tiling_functions as tlf
+import local_sentinelhub.response_cache_functions as rcf
+
+# Time slots per composite figure, a figure of every slot of a long run would not fit in memory
+plot_page_size = 51
 
 def sentinelhub_main(resolution,  # Spatial resolution for data retrieval.
          date_tuples,  # List of tuples, each containing start and end dates for data retrieval.
@@ -46,7 +65,14 @@ def sentinelhub_main(resolution,  # Spatial resolution for data retrieval.
          project_name,  # Name of the project.
          request_function,  # Function used for making API requests.
          createImages=False,  # Optional flag to create images.
-         as_nc=False  # Optional flag to save images as NetCDF files.
+         as_nc=False,  # Optional flag to save images as NetCDF files.
+         multi_band=False,  # Optional flag to download a multi-band request once for every preface.
+         catalog_path=None,  # Optional path to an indexed operation catalog, used instead of the log for checks.
+         stats_store_path=None,  # Optional path to a time-series store, the csv files are exported from it.
+         scheduler=None,  # Optional download scheduler shared with other projects, bands and locations.
+         streaming=False,  # Optional flag to write the outputs of each time slot as soon as it is downloaded.
+         mosaic_dir=None,  # Optional folder for memory maps backing the mosaics of tiled requests.
+         cache=None  # Optional response cache, identical requests are read from it instead of downloaded.
          ):
     """
     Main function for managing data retrieval, processing, and storage. For the SentinelHub API.
@@ -65,6 +91,25 @@ def sentinelhub_main(resolution,  # Spatial resolution for data retrieval.
         request_function (function): Function used for making API requests.
         createImages (bool): Flag to create images (default is False).
         as_nc (bool): Flag to save images as NetCDF files (default is False).
+        multi_band (bool): If True and preface is a list, the request is downloaded once per time slot and every
+            band is sliced from the same data, instead of downloading the whole request once per preface
+            (default is False).
+        catalog_path (str): Path to an SQLite operation catalog. When passed, the "already fetched" checks use the
+            catalog instead of scanning the log file; an existing log is imported the first time (default is None).
+        stats_store_path (str): Path to an SQLite time-series store. When passed, statistics are merged into the
+            store and each csv is exported from it once at the end, instead of appending to and re-sorting the csv
+            on every call (default is None).
+        scheduler (dict): A scheduler from 'dsf.create_download_scheduler()'. When passed the requests are queued
+            on it, alongside those of every other project, band and location sharing it, instead of being
+            downloaded by a new client with a fixed number of threads (default is None).
+        streaming (bool): If True each time slot is written to every output as soon as it is downloaded, then
+            released, so memory use doesn't grow with the number of time slots (default is False).
+        mosaic_dir (str): Folder for temporary files backing each time slot's data as a memory map instead of in
+            RAM. An area over the API's 2500 pixel limit is always split into tiles that are downloaded in
+            parallel and mosaicked, this keeps the mosaics on disk (default is None).
+        cache (dict): A response cache from 'rcf.open_response_cache()'. Requests already in it are read from disk
+            instead of downloaded, and new responses are added to it. If the cache is offline only the time slots
+            it holds are processed, the rest are skipped (default is None).
 
     Returns:
         None
@@ -91,34 +136,123 @@ def sentinelhub_main(resolution,  # Spatial resolution for data retrieval.
         preface = [preface]
         csvpath = [csvpath]
 
+    missing_slots = []
+
     for i in range(len(preface)):
 
         # Creating csv
         if (not os.path.exists(csvpath[i])): # Checks if csv already exists
             mf.folder_creation_manage(csvpath[i])  # Creates folders leading up to file
 
-        if (createImages):
-            nonexisting = io.check_files_exist(date_tuples, operext, sat_image_save_path, preface[i])
-        else:
-            nonexisting = io.check_files_exist_in_text_file(date_tuples, operext, operations_save_path, preface[i], project_name)
+        missing_slots.append(sentinelhub_missing_slots(date_tuples, operext, sat_image_save_path, operations_save_path,
+                                                       preface[i], project_name, createImages=createImages,
+                                                       catalog_path=catalog_path))
+
+        if (cache is not None and cache['offline']): # Nothing is downloaded, only what the cache holds is used
+            cached = sentinelhub_cached_slots(missing_slots[i], farm_bbox, farm_size, request_function, cache)
+            if (len(cached) != len(missing_slots[i])):
+                print(f"Offline: {len(missing_slots[i]) - len(cached)} time slots of '{preface[i]}' aren't cached, "
+                      f"skipping them.")
+            missing_slots[i] = cached
+
+    if (multi_band and len(preface) > 1): # One download per time slot, every band sliced from it
+        sentinelhub_routine_multi(farm_bbox, farm_size, missing_slots, sat_image_save_path, operations_save_path,
+                                  preface, farm_coords_wgs84, figure_save_path, csvpath, operext, project_name,
+                                  request_function, createImages=createImages, as_nc=as_nc,
+                                  catalog_path=catalog_path, stats_store_path=stats_store_path, scheduler=scheduler,
+                                  streaming=streaming, mosaic_dir=mosaic_dir, cache=cache)
+    else:
+        for i in range(len(preface)):
+            if (len(missing_slots[i]) != 0):
+                sentinelhub_routine(farm_bbox, farm_size, missing_slots[i], sat_image_save_path, operations_save_path,
+                                    preface[i], farm_coords_wgs84, figure_save_path, csvpath[i], operext, project_name,
+                                    request_function, createImages = createImages, i=i, as_nc = as_nc,
+                                    catalog_path=catalog_path, stats_store_path=stats_store_path,
+                                    scheduler=scheduler, streaming=streaming, mosaic_dir=mosaic_dir, cache=cache)
+            else:
+                print("All of these files are already downloaded")
+
+    if (stats_store_path is not None): # Exporting the csv files that got new rows, once per run
+        connection = ts.open_timeseries_store(stats_store_path)
+        for i in range(len(preface)):
+            if (len(missing_slots[i]) != 0):
+                ts.timeseries_export_csv(connection, os.path.abspath(csvpath[i]), csvpath[i])
+        connection.close()
+
+
+def sentinelhub_missing_slots(date_tuples,  # List of tuples, each containing start and end dates for data retrieval.
+                              operext,  # File extension for operation log and satellite images.
+                              sat_image_save_path,  # Directory where satellite images are saved.
+                              operations_save_path,  # Path to the operation log file.
+                              preface,  # Prefix for file names.
+                              project_name,  # Name of the project.
+                              createImages=False,  # Optional flag, checks the saved images instead of the log.
+                              catalog_path=None  # Optional path to an indexed operation catalog.
+                              ):
+    """
+    Determine which date tuples still need to be downloaded for a single preface.
+
+    Args:
+        date_tuples (list): A list of tuples, each containing start and end dates for data retrieval.
+        operext (str): File extension for operation log and satellite images.
+        sat_image_save_path (str): Directory where satellite images are saved.
+        operations_save_path (str): Path to the operation log file.
+        preface (str): Prefix for file names.
+        project_name (str): Name of the project.
+        createImages (bool): If True the saved images are checked, otherwise the log file (default is False).
+        catalog_path (str): Path to an SQLite operation catalog, checked instead of the log file (default is None).
+
+    Returns:
+        list: Date tuples that have not been downloaded yet, 'date_tuples' itself if none have been.
+    """
+
+    if (catalog_path is not None and not createImages):
+        connection = cat.open_catalog(catalog_path, operations_save_path)
+        flots = cat.catalog_missing_slots(connection, date_tuples, operext, preface, project_name)
+        connection.close()
+        return date_tuples if len(flots) == len(date_tuples) else flots
+
+    if (createImages):
+        nonexisting = io.check_files_exist(date_tuples, operext, sat_image_save_path, preface)
+    else:
+        nonexisting = io.check_files_exist_in_text_file(date_tuples, operext, operations_save_path, preface, project_name)
+
+    if (len(nonexisting) == len(date_tuples)):
+        return date_tuples
+
+    flots = []
+
+    for file_name in nonexisting:
+        if (not createImages): # Names in the log file start with the project name
+            file_name = file_name[len(project_name) + 1:]
+        date_strings = file_name.split("_")[0:2]
+        start_date, end_date = date_strings
+        flots.append((start_date, end_date))
 
-        if (len(nonexisting) == len(date_tuples)):
-            sentinelhub_routine(farm_bbox, farm_size, date_tuples, sat_image_save_path, operations_save_path, preface[i],
-                                farm_coords_wgs84, figure_save_path, csvpath[i], operext, project_name,
-                                request_function, createImages = createImages, i=i, as_nc = as_nc)
-        elif (len(nonexisting) != 0):
-            flots = []
+    return flots
 
-            for file_name in nonexisting:
-                date_strings = file_name.split("_")[0:2]
-                start_date, end_date = date_strings
-                flots.append((start_date, end_date))
 
-            sentinelhub_routine(farm_bbox, farm_size, flots, sat_image_save_path, operations_save_path, preface[i],
-                                farm_coords_wgs84, figure_save_path, csvpath[i], operext, project_name,
-                                request_function, createImages = createImages, i=i, as_nc = as_nc)
-        else:
-            print("All of these files are already downloaded")
+def sentinelhub_cached_slots(date_tuples, farm_bbox, farm_size, request_function, cache):
+    """
+    Determine which date tuples have the response of every request they need in a response cache, such as to only
+    process those when the cache is offline.
+
+    Args:
+        date_tuples (list): A list of tuples, each containing start and end dates for data retrieval.
+        farm_bbox (BBox): Bounding box of the farm area.
+        farm_size (tuple): Size of the farm area.
+        request_function (function): Function used for making API requests.
+        cache (dict): The response cache.
+
+    Returns:
+        list: Date tuples whose responses are all cached.
+    """
+
+    tiles = tlf.split_bbox(farm_bbox, farm_size)
+
+    return [date_tuple for date_tuple in date_tuples
+            if all(rcf.cache_contains(cache, rcf.response_cache_key(download_request))
+                   for download_request in tlf.tile_requests(date_tuple, tiles, request_function, config))]
 
 
 def sentinelhub_routine(farm_bbox,  # Bounding box of the farm area.
@@ -135,7 +269,13 @@ def sentinelhub_routine(farm_bbox,  # Bounding box of the farm area.
             request_function,  # Function used for making API requests.
             createImages=False,  # Optional flag to create images.
             i=0,  # Optional index for processing.
-            as_nc=False  # Optional flag to save images as NetCDF files.
+            as_nc=False,  # Optional flag to save images as NetCDF files.
+            catalog_path=None,  # Optional path to an indexed operation catalog.
+            stats_store_path=None,  # Optional path to a time-series store.
+            scheduler=None,  # Optional shared download scheduler.
+            streaming=False,  # Optional flag to write each time slot as it arrives.
+            mosaic_dir=None,  # Optional folder for memory maps backing the mosaics.
+            cache=None  # Optional response cache.
             ):
     """
     Core routine for downloading, processing, and saving satellite data. For the SentinelHub API.
@@ -156,20 +296,275 @@ def sentinelhub_routine(farm_bbox,  # Bounding box of the farm area.
         createImages (bool): Flag to create images (default is False).
         i (int): Index for processing (default is 0).
         as_nc (bool): Flag to save images as NetCDF files (default is False).
+        catalog_path (str): Path to an SQLite operation catalog to record the slots in (default is None).
+        stats_store_path (str): Path to an SQLite time-series store, used instead of the csv (default is None).
+        scheduler (dict): Download scheduler the requests are queued on (default is None).
+        streaming (bool): Flag to write each time slot as soon as it is downloaded, see
+            'sentinelhub_stream_outputs()' (default is False).
+        mosaic_dir (str): Folder for temporary files backing each time slot's data as a memory map (default is
+            None, in RAM).
+        cache (dict): Response cache read before downloading and added to after (default is None).
 
     Returns:
         None
     """
 
+    if (streaming):
+        sentinelhub_stream_outputs(farm_bbox, farm_size, date_tuples, [date_tuples], [i], sat_image_save_path,
+                                   operations_save_path, [preface], farm_coords_wgs84, figure_save_path, [csvpath],
+                                   operext, project_name, request_function, createImages=createImages, as_nc=as_nc,
+                                   catalog_path=catalog_path, stats_store_path=stats_store_path, scheduler=scheduler,
+                                   mosaic_dir=mosaic_dir, cache=cache)
+        return
+
+    data = sentinelhub_download(date_tuples, farm_bbox, farm_size, request_function, scheduler=scheduler,
+                                mosaic_dir=mosaic_dir, cache=cache)
+
+    if (isinstance(data[0][0][0], np.ndarray)):
+        data = ao.reshape_data(data, i)
+
+    sentinelhub_save_outputs(data, date_tuples, sat_image_save_path, operations_save_path, preface, farm_coords_wgs84,
+                             figure_save_path, csvpath, operext, project_name, createImages=createImages, as_nc=as_nc,
+                             catalog_path=catalog_path, stats_store_path=stats_store_path)
+
+
+def sentinelhub_routine_multi(farm_bbox,  # Bounding box of the farm area.
+                              farm_size,  # Size of the farm area.
+                              band_date_tuples,  # List holding, for every band, the date tuples it still needs.
+                              sat_image_save_path,  # Directory where satellite images will be saved.
+                              operations_save_path,  # Directory where operation log file will be saved.
+                              prefaces,  # List of prefixes for file names, one per band.
+                              farm_coords_wgs84,  # Bounding box coordinates [min_lon, min_lat, max_lon, max_lat] in WGS84.
+                              figure_save_path,  # Directory where figures will be saved (if applicable).
+                              csvpaths,  # List of file paths for CSV data, one per band.
+                              operext,  # File extension for operation log and satellite images.
+                              project_name,  # Name of the project.
+                              request_function,  # Function used for making API requests.
+                              createImages=False,  # Optional flag to create images.
+                              as_nc=False,  # Optional flag to save images as NetCDF files.
+                              catalog_path=None,  # Optional path to an indexed operation catalog.
+                              stats_store_path=None,  # Optional path to a time-series store.
+                              scheduler=None,  # Optional shared download scheduler.
+                              streaming=False,  # Optional flag to write each time slot as it arrives.
+                              mosaic_dir=None,  # Optional folder for memory maps backing the mosaics.
+                              cache=None  # Optional response cache.
+                              ):
+    """
+    Core routine for a multi-band request. Every time slot needed by at least one band is downloaded a single time,
+    then each band is sliced from the downloaded data and its outputs are written. For the SentinelHub API.
+
+    Args:
+        farm_bbox (BBox): Bounding box of the farm area.
+        farm_size (tuple): Size of the farm area.
+        band_date_tuples (list of list): For every band, the date tuples that band still needs.
+        sat_image_save_path (str): Directory where satellite images will be saved.
+        operations_save_path (str): Directory where the operation log file will be saved.
+        prefaces (list): Prefixes for file names, one per band of the request.
+        farm_coords_wgs84 (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat] in WGS84.
+        figure_save_path (str): Directory where figures will be saved (if applicable).
+        csvpaths (list): File paths for CSV data, one per band of the request.
+        operext (str): File extension for operation log and satellite images.
+        project_name (str): Name of the project.
+        request_function (function): Function used for making API requests.
+        createImages (bool): Flag to create images (default is False).
+        as_nc (bool): Flag to save images as NetCDF files (default is False).
+        catalog_path (str): Path to an SQLite operation catalog to record the slots in (default is None).
+        stats_store_path (str): Path to an SQLite time-series store, used instead of the csv (default is None).
+        scheduler (dict): Download scheduler the requests are queued on (default is None).
+        streaming (bool): Flag to write each time slot as soon as it is downloaded, see
+            'sentinelhub_stream_outputs()' (default is False).
+        mosaic_dir (str): Folder for temporary files backing each time slot's data as a memory map (default is
+            None, in RAM).
+        cache (dict): Response cache read before downloading and added to after (default is None).
+
+    Returns:
+        None
+    """
+
+    # Union of the slots any band is missing, keeping the original order
+    slots = []
+    slot_index = {}
+    for date_tuples in band_date_tuples:
+        for date_tuple in date_tuples:
+            if (tuple(date_tuple) not in slot_index):
+                slot_index[tuple(date_tuple)] = len(slots)
+                slots.append(tuple(date_tuple))
+
+    if (len(slots) == 0):
+        print("All of these files are already downloaded")
+        return
+
+    if (streaming):
+        sentinelhub_stream_outputs(farm_bbox, farm_size, slots, band_date_tuples, list(range(len(prefaces))),
+                                   sat_image_save_path, operations_save_path, prefaces, farm_coords_wgs84,
+                                   figure_save_path, csvpaths, operext, project_name, request_function,
+                                   createImages=createImages, as_nc=as_nc, catalog_path=catalog_path,
+                                   stats_store_path=stats_store_path, scheduler=scheduler, mosaic_dir=mosaic_dir,
+                                   cache=cache)
+        return
+
+    data = sentinelhub_download(slots, farm_bbox, farm_size, request_function, scheduler=scheduler,
+                                mosaic_dir=mosaic_dir, cache=cache)
+
+    for i in range(len(prefaces)):
+        if (len(band_date_tuples[i]) == 0):
+            continue
+
+        band_data = [data[slot_index[tuple(date_tuple)]] for date_tuple in band_date_tuples[i]]
+
+        if (isinstance(band_data[0][0][0], np.ndarray)):
+            band_data = ao.reshape_data(band_data, i)
+
+        sentinelhub_save_outputs(band_data, band_date_tuples[i], sat_image_save_path, operations_save_path,
+                                 prefaces[i], farm_coords_wgs84, figure_save_path, csvpaths[i], operext, project_name,
+                                 createImages=createImages, as_nc=as_nc, catalog_path=catalog_path,
+                                 stats_store_path=stats_store_path)
+
+
+def sentinelhub_download(date_tuples,  # List of tuples, each containing start and end dates for data retrieval.
+                         farm_bbox,  # Bounding box of the farm area.
+                         farm_size,  # Size of the farm area.
+                         request_function,  # Function used for making API requests.
+                         scheduler=None,  # Optional shared download scheduler.
+                         mosaic_dir=None,  # Optional folder for memory maps backing the mosaics.
+                         cache=None  # Optional response cache.
+                         ):
+    """
+    Download the data of a request for every passed time slot. For the SentinelHub API. An area over the API's
+    pixel limit is split into tiles, downloaded in parallel and mosaicked, see 'tlf.split_bbox()'.
+
+    Args:
+        date_tuples (list): A list of tuples, each containing start and end dates for data retrieval.
+        farm_bbox (BBox): Bounding box of the farm area.
+        farm_size (tuple): Size of the farm area.
+        request_function (function): Function used for making API requests.
+        scheduler (dict): Download scheduler shared with other downloads, see 'dsf.create_download_scheduler()'
+            (default is None, a new client with 5 threads).
+        mosaic_dir (str): Folder for temporary files backing each time slot's data as a memory map (default is
+            None, in RAM).
+        cache (dict): Response cache read before downloading and added to after, see 'rcf.open_response_cache()'
+            (default is None).
+
+    Returns:
+        list of np.ndarray: The downloaded data, one array per time slot.
+    """
+
+    if (mosaic_dir is not None or cache is not None or len(tlf.split_bbox(farm_bbox, farm_size)) > 1):
+        return list(sentinelhub_download_iter(date_tuples, farm_bbox, farm_size, request_function,
+                                              scheduler=scheduler, window=len(date_tuples), mosaic_dir=mosaic_dir,
+                                              cache=cache))
+
     # create a list of requests
     list_of_requests = [request_function(slot, farm_bbox, farm_size, config) for slot in date_tuples]
     list_of_requests = [request.download_list[0] for request in list_of_requests]
 
+    if (scheduler is not None):
+        return dsf.scheduler_download(scheduler, list_of_requests, units=request_units(farm_size))
+
     # download data with multiple threads
-    data = SentinelHubDownloadClient(config=config).download(list_of_requests, max_threads=5)
+    return SentinelHubDownloadClient(config=config).download(list_of_requests, max_threads=5)
+
+
+def sentinelhub_download_iter(date_tuples,  # List of tuples, each containing start and end dates for data retrieval.
+                              farm_bbox,  # Bounding box of the farm area.
+                              farm_size,  # Size of the farm area.
+                              request_function,  # Function used for making API requests.
+                              scheduler=None,  # Optional shared download scheduler.
+                              window=10,  # Most time slots downloaded ahead of the consumer.
+                              mosaic_dir=None,  # Optional folder for memory maps backing the mosaics.
+                              cache=None  # Optional response cache.
+                              ):
+    """
+    Download the data of a request for every passed time slot, yielding each time slot's data in order. At most
+    'window' time slots are downloaded ahead of the one being consumed, so only that many are held in memory. An
+    area over the API's pixel limit is split into tiles, every tile of a time slot is downloaded in parallel and
+    written into the time slot's mosaic as it arrives.
 
-    if (isinstance(data[0][0][0], np.ndarray)):
-        data = ao.reshape_data(data, i)
+    Args:
+        date_tuples (list): A list of tuples, each containing start and end dates for data retrieval.
+        farm_bbox (BBox): Bounding box of the farm area.
+        farm_size (tuple): Size of the farm area.
+        request_function (function): Function used for making API requests.
+        scheduler (dict): Download scheduler shared with other downloads (default is None, 5 threads).
+        window (int): Most time slots downloaded, or downloading, ahead of the consumer (default is 10).
+        mosaic_dir (str): Folder for temporary files backing each time slot's data as a memory map (default is
+            None, in RAM).
+        cache (dict): Response cache read before downloading and added to after (default is None).
+
+    Yields:
+        np.ndarray: The downloaded data of a time slot, in the order of 'date_tuples'.
+    """
+
+    tiles = tlf.split_bbox(farm_bbox, farm_size)
+
+    executor = None
+
+    if (scheduler is not None):
+        units = request_units(tiles[0]['size'])
+        download = lambda download_request: dsf.scheduler_submit(scheduler, download_request, units=units)
+    else:
+        client = SentinelHubDownloadClient(config=config)
+        executor = ThreadPoolExecutor(max_workers=5)
+        download = lambda download_request: executor.submit(lambda: client.download([download_request])[0])
+
+    submit = lambda download_request: rcf.cached_submit(cache, download_request, download)
+
+    slot_futures = deque() # Future of every tile, for each time slot in flight
+
+    try:
+        for slot in date_tuples:
+            slot_futures.append([submit(download_request)
+                                 for download_request in tlf.tile_requests(slot, tiles, request_function, config)])
+            if (len(slot_futures) >= window):
+                yield tlf.mosaic_tiles(slot_futures.popleft(), tiles, farm_size, mosaic_dir=mosaic_dir)
+
+        while (slot_futures):
+            yield tlf.mosaic_tiles(slot_futures.popleft(), tiles, farm_size, mosaic_dir=mosaic_dir)
+    finally:
+        for futures in slot_futures: # Stopped early, such as on an error
+            for future in futures:
+                future.cancel()
+        if (executor is not None):
+            executor.shutdown(wait=False)
+
+
+def sentinelhub_save_outputs(data,  # List of single band ndarrays, one per time slot.
+                             date_tuples,  # List of tuples, each containing start and end dates.
+                             sat_image_save_path,  # Directory where satellite images will be saved.
+                             operations_save_path,  # Directory where operation log file will be saved.
+                             preface,  # Prefix for file names.
+                             farm_coords_wgs84,  # Bounding box coordinates [min_lon, min_lat, max_lon, max_lat] in WGS84.
+                             figure_save_path,  # Directory where figures will be saved (if applicable).
+                             csvpath,  # File path for CSV data.
+                             operext,  # File extension for operation log and satellite images.
+                             project_name,  # Name of the project.
+                             createImages=False,  # Optional flag to create images.
+                             as_nc=False,  # Optional flag to save images as NetCDF files.
+                             catalog_path=None,  # Optional path to an indexed operation catalog.
+                             stats_store_path=None  # Optional path to a time-series store.
+                             ):
+    """
+    Write every output of a single band: npy/png images, optional nc files, the log, the figure and the csv.
+
+    Args:
+        data (list of np.ndarray): Single band data, one array per time slot.
+        date_tuples (list): A list of tuples, each containing start and end dates.
+        sat_image_save_path (str): Directory where satellite images will be saved.
+        operations_save_path (str): Directory where the operation log file will be saved.
+        preface (str): Prefix for file names.
+        farm_coords_wgs84 (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat] in WGS84.
+        figure_save_path (str): Directory where figures will be saved (if applicable).
+        csvpath (str): File path for CSV data.
+        operext (str): File extension for operation log and satellite images.
+        project_name (str): Name of the project.
+        createImages (bool): Flag to create images (default is False).
+        as_nc (bool): Flag to save images as NetCDF files (default is False).
+        catalog_path (str): Path to an SQLite operation catalog to record the slots in (default is None).
+        stats_store_path (str): Path to an SQLite time-series store, used instead of the csv (default is None).
+
+    Returns:
+        None
+    """
 
     # We are going to download these now as pngs so we don't have to call the api every time,
                                         # only done if createImages variable is True, or as_nc is True
@@ -183,13 +578,180 @@ def sentinelhub_routine(farm_bbox,  # Bounding box of the farm area.
     # Now we create a text file with the data we have, so we don't waste api calls if we are just filling data
     sff.populate_text_file(date_tuples, operext, operations_save_path, preface, project_name)
 
-    name = date_tuples[0][0] + "_" + date_tuples[len(date_tuples)-1][1] + preface + '.png'
+    if (catalog_path is not None): # Indexed copy of the log, used for the checks on the next run
+        connection = cat.open_catalog(catalog_path, operations_save_path)
+        cat.catalog_record_slots(connection, date_tuples, operext, preface, project_name)
+        connection.close()
 
-    # plot the data nicely
-    if (len(date_tuples) < 52): # Ideally this would change with allocated ram amount
-        pf.plot_ndarrays(data, date_tuples, farm_coords_wgs84, save_path=figure_save_path + project_name + '_' + name)
+    # plot the data nicely, a figure per page of time slots
+    for start in range(0, len(date_tuples), plot_page_size):
+        sentinelhub_plot_page([pf.thumbnail_ndarray(arr) for arr in data[start:start + plot_page_size]],
+                              date_tuples[start:start + plot_page_size], preface, farm_coords_wgs84,
+                              figure_save_path, project_name)
 
     ## Writing thermal data to csv
 
-    sff.write_data_to_csv(data, date_tuples, csvpath)
-    io.sort_csv_by_date(csvpath) # We do this here instead of in the write so its more efficient and can be moved
\ No newline at end of file
+    if (stats_store_path is not None): # Merged into the store, 'sentinelhub_main()' exports the csv
+        connection = ts.open_timeseries_store(stats_store_path)
+        ts.timeseries_adopt_csv(connection, os.path.abspath(csvpath), csvpath) # Keeps rows written before the store
+        ts.timeseries_insert(connection, os.path.abspath(csvpath), data, date_tuples)
+        connection.close()
+    else:
+        sff.write_data_to_csv(data, date_tuples, csvpath)
+        io.sort_csv_by_date(csvpath) # We do this here instead of in the write so its more efficient and can be moved
+
+
+def sentinelhub_stream_outputs(farm_bbox,  # Bounding box of the farm area.
+                               farm_size,  # Size of the farm area.
+                               slots,  # Date tuples to download, every one needed by at least one band.
+                               band_date_tuples,  # List holding, for every band, the date tuples it needs.
+                               bands,  # Index of every band in the downloaded data.
+                               sat_image_save_path,  # Directory where satellite images will be saved.
+                               operations_save_path,  # Directory where operation log file will be saved.
+                               prefaces,  # List of prefixes for file names, one per band.
+                               farm_coords_wgs84,  # Bounding box coordinates [min_lon, min_lat, max_lon, max_lat] in WGS84.
+                               figure_save_path,  # Directory where figures will be saved (if applicable).
+                               csvpaths,  # List of file paths for CSV data, one per band.
+                               operext,  # File extension for operation log and satellite images.
+                               project_name,  # Name of the project.
+                               request_function,  # Function used for making API requests.
+                               createImages=False,  # Optional flag to create images.
+                               as_nc=False,  # Optional flag to save images as NetCDF files.
+                               catalog_path=None,  # Optional path to an indexed operation catalog.
+                               stats_store_path=None,  # Optional path to a time-series store.
+                               scheduler=None,  # Optional shared download scheduler.
+                               mosaic_dir=None,  # Optional folder for memory maps backing the mosaics.
+                               cache=None  # Optional response cache.
+                               ):
+    """
+    Download the time slots and write the outputs of every band that needs them, one time slot at a time. As each
+    time slot arrives its npy/png/nc files, log entry, csv row and composite figure thumbnail are written, then its
+    data is released. Memory use depends on the download window and the thumbnails of one figure page, not on the
+    number of time slots. Each time slot is in the log once written, so an interrupted run resumes after it.
+
+    Args:
+        farm_bbox (BBox): Bounding box of the farm area.
+        farm_size (tuple): Size of the farm area.
+        slots (list): Date tuples to download, in order.
+        band_date_tuples (list of list): For every band, the date tuples that band needs, a subset of 'slots'.
+        bands (list): Index of every band in the downloaded data, used when a time slot has more than one band.
+        sat_image_save_path (str): Directory where satellite images will be saved.
+        operations_save_path (str): Directory where the operation log file will be saved.
+        prefaces (list): Prefixes for file names, one per band.
+        farm_coords_wgs84 (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat] in WGS84.
+        figure_save_path (str): Directory where figures will be saved (if applicable).
+        csvpaths (list): File paths for CSV data, one per band.
+        operext (str): File extension for operation log and satellite images.
+        project_name (str): Name of the project.
+        request_function (function): Function used for making API requests.
+        createImages (bool): Flag to create images (default is False).
+        as_nc (bool): Flag to save images as NetCDF files (default is False).
+        catalog_path (str): Path to an SQLite operation catalog to record the slots in (default is None).
+        stats_store_path (str): Path to an SQLite time-series store, used instead of the csv (default is None).
+        scheduler (dict): Download scheduler the requests are queued on (default is None).
+        mosaic_dir (str): Folder for temporary files backing each time slot's data as a memory map (default is
+            None, in RAM).
+        cache (dict): Response cache read before downloading and added to after (default is None).
+
+    Returns:
+        None
+    """
+
+    catalog = cat.open_catalog(catalog_path, operations_save_path) if catalog_path is not None else None
+    store = ts.open_timeseries_store(stats_store_path) if stats_store_path is not None else None
+
+    # Every band needing a time slot, with the slot's index among that band's date tuples, used in the file names
+    slot_bands = {}
+    pages = []
+    for j in range(len(prefaces)):
+        pages.append([])
+        for index, date_tuple in enumerate(band_date_tuples[j]):
+            slot_bands.setdefault(tuple(date_tuple), []).append((j, index))
+
+        if (store is not None and len(band_date_tuples[j]) != 0): # Keeps rows written before the store
+            ts.timeseries_adopt_csv(store, os.path.abspath(csvpaths[j]), csvpaths[j])
+
+    try:
+        for date_tuple, slot_data in zip(slots, sentinelhub_download_iter(slots, farm_bbox, farm_size,
+                                                                          request_function, scheduler=scheduler,
+                                                                          mosaic_dir=mosaic_dir, cache=cache)):
+            for j, index in slot_bands.get(tuple(date_tuple), []):
+                arr = slot_data[:, :, bands[j]] if np.ndim(slot_data) == 3 else slot_data
+
+                if (createImages or as_nc):
+                    sff.save_ndarrays_as_npy([arr], sat_image_save_path, prefaces[j], date_tuples=[date_tuple],
+                                             project_name=project_name, start_index=index)
+                    sff.save_ndarrays_as_png([arr], sat_image_save_path, prefaces[j], date_tuples=[date_tuple],
+                                             project_name=project_name, start_index=index)
+
+                if (as_nc):
+                    fcf.convert_all_npy_and_nc(sat_image_save_path, prefaces[j], date_tuples=[date_tuple],
+                                               project_name=project_name, start_index=index)
+
+                sff.populate_text_file([date_tuple], operext, operations_save_path, prefaces[j], project_name,
+                                       start_index=index)
+
+                if (catalog is not None):
+                    cat.catalog_record_slots(catalog, [date_tuple], operext, prefaces[j], project_name)
+
+                if (store is not None):
+                    ts.timeseries_insert(store, os.path.abspath(csvpaths[j]), [arr], [date_tuple])
+                else:
+                    sff.write_data_to_csv([arr], [date_tuple], csvpaths[j])
+
+                pages[j].append((date_tuple, pf.thumbnail_ndarray(arr)))
+                if (len(pages[j]) == plot_page_size):
+                    sentinelhub_plot_page([thumbnail for _, thumbnail in pages[j]], [slot for slot, _ in pages[j]],
+                                          prefaces[j], farm_coords_wgs84, figure_save_path, project_name)
+                    pages[j] = []
+
+            slot_data = arr = None # Released before the next time slot is taken
+    finally:
+        if (catalog is not None):
+            catalog.close()
+        if (store is not None):
+            store.close()
+
+    for j in range(len(prefaces)):
+        if (len(pages[j]) != 0):
+            sentinelhub_plot_page([thumbnail for _, thumbnail in pages[j]], [slot for slot, _ in pages[j]],
+                                  prefaces[j], farm_coords_wgs84, figure_save_path, project_name)
+
+        if (store is None and len(band_date_tuples[j]) != 0):
+            io.sort_csv_by_date(csvpaths[j]) # Once per run rather than once per row
+
+
+def sentinelhub_plot_page(arrays, date_tuples, preface, farm_coords_wgs84, figure_save_path, project_name):
+    """
+    Plot the composite figure of a page of time slots, named after the first and last dates of the page.
+
+    Args:
+        arrays (list of np.ndarray): Data to plot, such as thumbnails, one array per time slot.
+        date_tuples (list): Date tuples of the page, one per array.
+        preface (str): Prefix for the file name.
+        farm_coords_wgs84 (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat] in WGS84.
+        figure_save_path (str): Directory where figures will be saved.
+        project_name (str): Name of the project.
+
+    Returns:
+        None
+    """
+
+    name = date_tuples[0][0] + "_" + date_tuples[len(date_tuples)-1][1] + preface + '.png'
+
+    pf.plot_ndarrays(arrays, date_tuples, farm_coords_wgs84, save_path=figure_save_path + project_name + '_' + name)
+
+
+def request_units(farm_size):
+    """
+    Estimate the processing units a request uses, one unit per 512 x 512 pixels with a floor of 0.01. The number of
+    bands and the data type also count, a scheduler corrects its estimate from the responses.
+
+    Args:
+        farm_size (tuple): Size of the farm area in pixels.
+
+    Returns:
+        float: The estimated processing units.
+    """
+
+    return max(0.01, farm_size[0] * farm_size[1] / (512 * 512))
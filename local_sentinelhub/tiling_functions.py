@@ -0,0 +1,139 @@
+"""
+File: tiling_functions.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the functions for tiling large areas for the SentinelHub API. A request may be
+             at most 2500 pixels wide and high, so a bounding box larger than that at the chosen resolution is split
+             into tiles that each fit, the tiles are downloaded in parallel and then mosaicked back into a single
+             array. Tiles share the pixel grid of the full request, so the mosaic matches what a single request
+             would return. Each tile is written into the mosaic as soon as it arrives and then released.
+
+Contents:
+    - split_bbox: Function that splits a bounding box into tiles that fit in a single request.
+    - tile_requests: Function that returns the download request of every tile for a time slot.
+    - mosaic_tiles: Function that assembles downloaded tiles into a single array or memory map.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+import math
+import tempfile
+from concurrent.futures import as_completed
+
+# Third-party library imports
+from sentinelhub import BBox
+import numpy as np
+
+# Local module imports
+
+
+# Most pixels a SentinelHub process request may have along each side
+max_request_pixels = 2500
+
+
+def split_bbox(farm_bbox, farm_size, max_pixels=max_request_pixels):
+    """
+    Split a bounding box into the fewest tiles, of about equal size, that each fit in a single request. Tile edges
+    fall on pixel edges of the full request, so the tiles together cover exactly its pixels.
+
+    Args:
+        farm_bbox (BBox): Bounding box of the area.
+        farm_size (tuple): Width and height of the area in pixels, as returned by 'bbox_to_dimensions()'.
+        max_pixels (int): Most pixels a tile may have along each side (default is 2500).
+
+    Returns:
+        list of dict: Every tile's 'bbox', its 'size' as (width, height) and its 'offset' as the (row, column) of
+            its top left pixel in the full area, row 0 being the northern edge.
+    """
+
+    width, height = farm_size
+    min_x, min_y, max_x, max_y = list(farm_bbox)
+
+    n_columns = max(1, math.ceil(width / max_pixels))
+    n_rows = max(1, math.ceil(height / max_pixels))
+
+    column_edges = [round(k * width / n_columns) for k in range(n_columns + 1)]
+    row_edges = [round(k * height / n_rows) for k in range(n_rows + 1)]
+
+    tiles = []
+
+    for r in range(n_rows):
+        for c in range(n_columns):
+            tile_bbox = BBox(bbox=[min_x + (max_x - min_x) * column_edges[c] / width,
+                                   max_y - (max_y - min_y) * row_edges[r + 1] / height,
+                                   min_x + (max_x - min_x) * column_edges[c + 1] / width,
+                                   max_y - (max_y - min_y) * row_edges[r] / height], crs=farm_bbox.crs)
+
+            tiles.append({
+                'bbox': tile_bbox,
+                'size': (column_edges[c + 1] - column_edges[c], row_edges[r + 1] - row_edges[r]),
+                'offset': (row_edges[r], column_edges[c]),
+            })
+
+    return tiles
+
+
+def tile_requests(date_tuple, tiles, request_function, config):
+    """
+    Get the download request of every tile for a time slot.
+
+    Args:
+        date_tuple (tuple): Start and end dates of the time slot.
+        tiles (list of dict): Tiles from 'split_bbox()'.
+        request_function (function): Function used for making API requests.
+        config (SHConfig): Configuration of the SentinelHub account.
+
+    Returns:
+        list of DownloadRequest: The requests, in the order of 'tiles'.
+    """
+
+    return [request_function(date_tuple, tile['bbox'], tile['size'], config).download_list[0] for tile in tiles]
+
+
+def mosaic_tiles(futures, tiles, farm_size, mosaic_dir=None):
+    """
+    Assemble the downloaded tiles of a time slot into a single array. Each tile is written into place as soon as
+    its download completes, in whatever order they complete, and released, so at most the mosaic and the tiles
+    still in flight are held. The shape beyond the first two axes, such as the bands, and the data type are taken
+    from the first tile to arrive.
+
+    Args:
+        futures (list of Future): Future of each tile's decoded data, in the order of 'tiles'. The list is emptied,
+            so a tile's future, and the data it holds, is freed once the tile is written.
+        tiles (list of dict): Tiles from 'split_bbox()'.
+        farm_size (tuple): Width and height of the full area in pixels.
+        mosaic_dir (str): Folder for a temporary file backing the mosaic, as a memory map rather than in RAM. The
+            file is deleted as soon as the memory map is released (default is None, an array in RAM).
+
+    Returns:
+        np.ndarray: The mosaic, of (height, width) followed by the tiles' remaining axes.
+    """
+
+    if (len(tiles) == 1 and mosaic_dir is None): # Nothing to assemble
+        return futures[0].result()
+
+    pending = dict(zip(futures, tiles))
+    del futures[:]
+    mosaic = None
+
+    for future in as_completed(list(pending)):
+        tile = pending.pop(future)
+        data = np.asarray(future.result())
+
+        if (mosaic is None):
+            shape = (farm_size[1], farm_size[0]) + data.shape[2:]
+            if (mosaic_dir is None):
+                mosaic = np.empty(shape, dtype=data.dtype)
+            else: # Removed once closed, the memory map keeps its own handle until then
+                mosaic = np.memmap(tempfile.TemporaryFile(dir=mosaic_dir), dtype=data.dtype, mode='w+',
+                                   shape=shape)
+
+        row, column = tile['offset']
+        mosaic[row:row + data.shape[0], column:column + data.shape[1]] = data
+
+        future = data = None # Releases the tile before waiting on the next one
+
+    return mosaic
@@ -0,0 +1,147 @@
+"""
+File: product_ranking_functions.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the functions that rank the products returned by a catalogue query, so the
+             snapshot downloaded for a time slot is the one most likely to be usable over the bounding box rather
+             than simply the first one sensed. Products are scored using only the metadata the catalogue returns,
+             how much of the bounding box their footprint covers and their cloud cover when it is available.
+
+Contents:
+    - rank_slot_products: Function that ranks the products sensed within each time slot.
+    - rank_products: Function that ranks products, best first.
+    - product_score: Function that scores a product over a bounding box.
+    - product_coverage: Function that returns the fraction of a bounding box a product's footprint covers.
+    - product_cloud_fraction: Function that returns the cloud cover of a product as a fraction.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+
+
+# Third-party library imports
+from shapely import wkt
+from shapely.geometry import box
+
+# Local module imports
+
+
+def rank_slot_products(candidates,  # Maps product ids to their metadata.
+                       slot_ranges,  # List of (start, end) datetime tuples of the time slots.
+                       bbox,  # Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
+                       min_coverage=0.99  # Fraction of the bounding box a product must cover to rank first.
+                       ):
+    """
+    Rank the products sensed within each time slot, see 'rank_products()'. The first product of each ranking is
+    the one to download, the rest are the fallbacks, in order, should it fail.
+
+    Args:
+        candidates (OrderedDict): Maps product ids to their metadata, as returned by 'api.query()'.
+        slot_ranges (list): A list of (start, end) datetime tuples, the end being excluded.
+        bbox (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
+        min_coverage (float): Fraction of the bounding box a product must cover to be ranked before the products
+            that don't (default is 0.99).
+
+    Returns:
+        list: The ranked product ids of each time slot, an empty list for time slots without a product.
+    """
+
+    rankings = []
+
+    for start_date, end_date in slot_ranges:
+        in_slot = {product_id: properties for product_id, properties in candidates.items()
+                   if start_date <= properties['beginposition'] < end_date}
+
+        rankings.append(rank_products(in_slot, bbox, min_coverage=min_coverage))
+
+    return rankings
+
+
+def rank_products(candidates, bbox, min_coverage=0.99):
+    """
+    Rank products, best first. Products covering at least 'min_coverage' of the bounding box come first, then
+    each group is ordered by its score, see 'product_score()', and ties go to the product sensed earliest.
+
+    Args:
+        candidates (dict): Maps product ids to their metadata.
+        bbox (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
+        min_coverage (float): Fraction of the bounding box a product must cover to rank first (default is 0.99).
+
+    Returns:
+        list: The product ids, best first.
+    """
+
+    def rank_key(product_id):
+        properties = candidates[product_id]
+        return (product_coverage(properties, bbox) < min_coverage, -product_score(properties, bbox),
+                properties['beginposition'])
+
+    return sorted(candidates, key=rank_key)
+
+
+def product_score(properties, bbox):
+    """
+    Score a product by the fraction of the bounding box it is expected to see clearly, its coverage of the
+    bounding box times its cloud free fraction. Products without cloud cover metadata are scored as cloud free,
+    so they are ordered by coverage and sensing time alone.
+
+    Args:
+        properties (dict): Metadata of the product.
+        bbox (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
+
+    Returns:
+        float: The score, from 0 to 1.
+    """
+
+    cloud_fraction = product_cloud_fraction(properties)
+
+    if (cloud_fraction is None):
+        cloud_fraction = 0.0
+
+    return product_coverage(properties, bbox) * (1.0 - cloud_fraction)
+
+
+def product_coverage(properties, bbox):
+    """
+    Get the fraction of a bounding box covered by a product's footprint.
+
+    Args:
+        properties (dict): Metadata of the product, with its 'footprint' as WKT.
+        bbox (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
+
+    Returns:
+        float: The fraction covered, 1.0 if the product has no footprint as it then can't be ruled out.
+    """
+
+    if (not properties.get('footprint')):
+        return 1.0
+
+    area = box(*bbox)
+
+    if (area.area == 0): # A single point
+        return 1.0 if wkt.loads(properties['footprint']).intersects(area) else 0.0
+
+    return wkt.loads(properties['footprint']).intersection(area).area / area.area
+
+
+def product_cloud_fraction(properties):
+    """
+    Get the cloud cover of a product as a fraction, from the 'cloudcoverpercentage' the catalogue returns for
+    some product types.
+
+    Args:
+        properties (dict): Metadata of the product.
+
+    Returns:
+        float: The cloud cover, from 0 to 1, or None if the product has no cloud cover metadata.
+    """
+
+    cloud_cover = properties.get('cloudcoverpercentage')
+
+    if (cloud_cover is None):
+        return None
+
+    return min(max(float(cloud_cover) / 100.0, 0.0), 1.0)
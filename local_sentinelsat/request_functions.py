@@ -15,61 +15,70 @@ from datetime import datetime, timedelta
 from collections import OrderedDict
 from conf.config import *
 import utils.misc_functions as mf
+import utils.io_functions as io
+import utils.product_store_functions as pstf
+import local_sentinelsat.product_ranking_functions as prf
 
 ## End of imports
 
+# Query used for OLCI snapshots, EFR folders are the 'best' for data analysis
+olci_query = {
+    'platformname': 'Sentinel-3',
+    'instrumentshortname': 'OLCI',
+    'producttype': 'OL_1_EFR___',
+}
+
 def get_olci(date_tuples,  # List of tuples, each containing start and end dates for data retrieval.
              bbox,  # Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
-             download_directory  # Directory where downloaded data will be saved.
+             download_directory,  # Directory where downloaded data will be saved.
+             api=api,  # SentinelAPI instance used for the queries and downloads.
+             store=None,  # Product store shared with other projects.
+             exclude=None,  # Titles of products not to download.
+             members=None  # Patterns of the zip members extracted into the store.
              ):
     """
     Downloads multiple OLCI (Ocean and Land Color Instrument) snapshot's data based on the specified parameters.
+    The catalogue is queried once per run of consecutive time slots, rather than once per day, and the products
+    of each time slot are ranked by their metadata, see 'prf.rank_slot_products()'. Only the best product of each
+    time slot is downloaded, falling back to the next best if its download fails. With a product store, products
+    already in the store, or being fetched by another run, are linked into 'download_directory' instead of being
+    downloaded again.
 
     Args:
         date_tuples (list): A list of tuples, each containing start and end dates for data retrieval.
         bbox (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
         download_directory (str): The directory where downloaded data will be saved.
+        api (SentinelAPI): Instance used for the queries and downloads (default is the one in 'conf/config.py'),
+            one pointed at a local mock of the OpenSearch API can be passed for testing.
+        store (dict): A product store from 'pstf.open_product_store()' (default is None, no store).
+        exclude (list): Titles of products not to download, such as snapshots already used for other sites, so
+            the next best product is picked instead (default is None).
+        members (list): Patterns of the zip members extracted into the store, such as 'pf.polymer_olci_members()'.
+            Only used with a store, otherwise 'smf.sentinelsat_routine()' extracts the zips (default is None,
+            every member).
 
     Returns:
         None
     """
 
-    wkt_bbox = mf.bbox_to_WKT(bbox)
-
-    # Initialize an empty OrderedDict to store the products
-    products = OrderedDict()
-
-    for i in range(len(date_tuples)):
-        start_date = datetime.strptime(date_tuples[i][0], '%Y-%m-%d')
-        end_date = datetime.strptime(date_tuples[i][1], '%Y-%m-%d')
-
-        # Query for products on the earliest date within the date range
-        current_date = start_date
-        while current_date <= end_date:
-            query_kwargs = {
-                'platformname': 'Sentinel-3',
-                'instrumentshortname': 'OLCI',
-                'date': (current_date, current_date + timedelta(days=1)),  # Query for a single day
-                'area': wkt_bbox,  # Use the WKT representation for the bounding box, required by API
-                'producttype': 'OL_1_EFR___', # Fetches EFR folders only, these are the 'best' for data analysis
-                'limit': 1 # Only downloading one snapshot for the date range
-            }
-            pp = api.query(**query_kwargs)
-
-            if pp:
-                # If products are found on the current date, add them to the products OrderedDict and break the loop
-                products.update(pp)
-                break
-
-            # Move to the next date, one day forwards, if no snapshot on current date
-            current_date += timedelta(days=1)
+    candidates = query_products(date_tuples, bbox, olci_query, api=api)
+    if (exclude):
+        candidates = OrderedDict((product_id, properties) for product_id, properties in candidates.items()
+                                 if properties.get('title') not in exclude)
+    rankings = prf.rank_slot_products(candidates, slot_date_ranges(date_tuples), bbox)
 
-    # Use the download_path parameter to specify the download directory
-    api.download_all(products, directory_path=download_directory)
+    if (store is not None):
+        download_ranked_stored(rankings, download_directory, store, api=api, members=members)
+    else:
+        download_ranked(rankings, candidates, download_directory, api=api)
 
 def get_olci_singular(date_tuple,     # Tuple containing start and end dates for data retrieval.
                       bbox,           # Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
-                      download_directory  # Directory where downloaded data will be saved.
+                      download_directory,  # Directory where downloaded data will be saved.
+                      api=api,  # SentinelAPI instance used for the query and download.
+                      store=None,  # Product store shared with other projects.
+                      exclude=None,  # Titles of products not to download.
+                      members=None  # Patterns of the zip members extracted into the store.
                       ):
     """
     Downloads a singular OLCI (Ocean and Land Color Instrument) snapshot's data based on the specified parameters.
@@ -78,41 +87,173 @@ def get_olci_singular(date_tuple,     # Tuple containing start and end dates for
         date_tuple (tuple): A tuple containing the start and end dates for data retrieval.
         bbox (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
         download_directory (str): The directory where downloaded data will be saved.
+        api (SentinelAPI): Instance used for the query and download (default is the one in 'conf/config.py').
+        store (dict): A product store from 'pstf.open_product_store()' (default is None, no store).
+        exclude (list): Titles of products not to download (default is None).
+        members (list): Patterns of the zip members extracted into the store (default is None, every member).
 
     Returns:
         None
     """
 
+    get_olci(date_tuple[:1], bbox, download_directory, api=api, store=store, exclude=exclude, members=members)
+
+def query_products(date_tuples,  # List of tuples, each containing start and end dates.
+                   bbox,  # Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
+                   query,  # Keyword arguments of the query, such as 'olci_query'.
+                   api=api  # SentinelAPI instance used for the queries.
+                   ):
+    """
+    Fetches every product, with its metadata, sensed within the time slots over the bounding box. Time slots that
+    overlap or follow on from each other are merged, so a run of consecutive time slots costs a single query.
+    The end date of a time slot is included, as it was when each day was queried on its own.
+
+    Args:
+        date_tuples (list): A list of tuples, each containing start and end dates.
+        bbox (list): Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
+        query (dict): Keyword arguments passed to 'api.query()', other than the area and date.
+        api (SentinelAPI): Instance used for the queries (default is the one in 'conf/config.py').
+
+    Returns:
+        OrderedDict: Maps product ids to their metadata, as returned by 'api.query()'.
+    """
+
     wkt_bbox = mf.bbox_to_WKT(bbox)
 
-    # Initialize an empty OrderedDict to store the products
     products = OrderedDict()
 
-    start_date = datetime.strptime(date_tuple[0][0], '%Y-%m-%d')
-    end_date = datetime.strptime(date_tuple[0][1], '%Y-%m-%d')
-
-    # Query for products on the earliest date within the date range
-    current_date = start_date
-    while current_date <= end_date:
-        query_kwargs = {
-            'platformname': 'Sentinel-3',
-            'instrumentshortname': 'OLCI',
-            'date': (current_date, current_date + timedelta(days=1)),  # Query for a single day
-            'area': wkt_bbox,  # Use the WKT representation for the bounding box
-            'producttype': 'OL_1_EFR___',
-            'limit': 1
-        }
-        pp = api.query(**query_kwargs)
-
-        if pp:
-            # If products are found on the current date, add them to the products OrderedDict and break the loop
-            products.update(pp)
+    for start_date, end_date in merge_date_ranges(date_tuples):
+        products.update(api.query(area=wkt_bbox, date=(start_date, end_date), **query))
+
+    return products
+
+def download_ranked(rankings,  # The ranked product ids of each time slot.
+                    candidates,  # Maps product ids to their metadata.
+                    download_directory,  # Directory where downloaded data will be saved.
+                    api=api  # SentinelAPI instance used for the downloads.
+                    ):
+    """
+    Downloads the best ranked product of each time slot. Products that fail to download, or that are offline
+    in the long term archive, are replaced by the next product in their time slot's ranking until one downloads
+    or the ranking runs out.
+
+    Args:
+        rankings (list): The ranked product ids of each time slot, see 'prf.rank_slot_products()'.
+        candidates (OrderedDict): Maps product ids to their metadata.
+        download_directory (str): The directory where downloaded data will be saved.
+        api (SentinelAPI): Instance used for the downloads (default is the one in 'conf/config.py').
+
+    Returns:
+        list: The product id downloaded for each time slot, None where none could be.
+    """
+
+    positions = [0] * len(rankings) # Position in each ranking of the product being tried
+    downloaded = [None] * len(rankings)
+
+    while True:
+        pending = [i for i in range(len(rankings)) if downloaded[i] is None and positions[i] < len(rankings[i])]
+        if (not pending):
             break
 
-        # Move to the next date
-        current_date += timedelta(days=1)
+        products = OrderedDict((rankings[i][positions[i]], candidates[rankings[i][positions[i]]]) for i in pending)
+
+        # Use the download_path parameter to specify the download directory
+        completed, triggered, failed = api.download_all(products, directory_path=download_directory)
+
+        for i in pending:
+            product_id = rankings[i][positions[i]]
+            if (product_id in completed):
+                downloaded[i] = product_id
+            else:
+                print(f"Error: could not download '{product_id}', trying the next product of its time slot.")
+                positions[i] += 1
+
+    return downloaded
+
+def download_ranked_stored(rankings,  # The ranked product ids of each time slot.
+                           download_directory,  # Directory the products are linked into.
+                           store,  # Product store shared with other projects.
+                           api=api,  # SentinelAPI instance used for the downloads.
+                           members=None  # Patterns of the zip members to extract.
+                           ):
+    """
+    Links the best ranked product of each time slot from a product store into the download directory, see
+    'pstf.store_acquire()'. Products the store doesn't hold are downloaded and unzipped into it first, once, however
+    many projects or farms need them. Products that fail are replaced by the next in their time slot's ranking.
+
+    Args:
+        rankings (list): The ranked product ids of each time slot, see 'prf.rank_slot_products()'.
+        download_directory (str): The directory the unzipped products are linked into.
+        store (dict): A product store from 'pstf.open_product_store()'.
+        api (SentinelAPI): Instance used for the downloads (default is the one in 'conf/config.py').
+        members (list): Patterns matched against the file name of each zip member, only matching members are
+            extracted, see 'io.extract_zip_members()'. Products extracted with different patterns are stored
+            apart (default is None, every member).
+
+    Returns:
+        list: The product id linked for each time slot, None where none could be.
+    """
+
+    options = {'members': list(members)} if members is not None else None # Part of the key, see 'pstf.store_key()'
+
+    def fetch(product_id):
+        def fetch_product(staging_dir):
+            api.download(product_id, directory_path=staging_dir)
+            io.unzip_all_zip_files(staging_dir, members=members)
+            return True
+        return fetch_product
+
+    linked = [None] * len(rankings)
+
+    for i in range(len(rankings)):
+        for product_id in rankings[i]:
+            try:
+                link = pstf.store_acquire(store, pstf.store_key(product_id, options), fetch(product_id),
+                                          download_directory)
+            except Exception as e:
+                print(f"Error: {e}")
+                link = None
+
+            if (link is not None):
+                linked[i] = product_id
+                break
+
+            print(f"Error: could not fetch '{product_id}', trying the next product of its time slot.")
+
+    return linked
+
+def slot_date_ranges(date_tuples):
+    """
+    Converts time slots into the datetime ranges they cover, from the start of the first day up to, but not
+    including, the day after the last.
+
+    Args:
+        date_tuples (list): A list of tuples, each containing start and end dates as 'YYYY-MM-DD'.
+
+    Returns:
+        list: A list of (start, end) datetime tuples.
+    """
+
+    return [(datetime.strptime(start, '%Y-%m-%d'), datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1))
+            for start, end in date_tuples]
+
+def merge_date_ranges(date_tuples):
+    """
+    Merges the datetime ranges of time slots that overlap or follow on from each other.
+
+    Args:
+        date_tuples (list): A list of tuples, each containing start and end dates as 'YYYY-MM-DD'.
+
+    Returns:
+        list: A list of (start, end) datetime tuples, sorted by start.
+    """
 
-    # Use the download_path parameter to specify the download directory
-    api.download_all(products, directory_path=download_directory)
+    merged = []
 
+    for start_date, end_date in sorted(slot_date_ranges(date_tuples)):
+        if (merged and start_date <= merged[-1][1]):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end_date))
+        else:
+            merged.append((start_date, end_date))
 
+    return merged
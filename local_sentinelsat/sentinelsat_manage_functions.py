@@ -20,7 +20,9 @@ import utils.array_operations as ao
 def sentinelsat_routine(bbox,  # Bounding box coordinates [min_lon, min_lat, max_lon, max_lat].
                         date_tuples,  # List of tuples, each containing start and end dates for data retrieval.
                         download_directory,  # Directory where downloaded zip files will be saved.
-                        request_function  # Function used for making API requests and downloading zips.
+                        request_function,  # Function used for making API requests and downloading zips.
+                        members=None,  # Patterns of the zip members to extract.
+                        max_workers=1  # Number of zips extracted at once.
                         ):
     """
     Routine for using SentinelSat API to download and process Sentinel data.
@@ -30,6 +32,9 @@ def sentinelsat_routine(bbox,  # Bounding box coordinates [min_lon, min_lat, max
         date_tuples (list): A list of tuples, each containing start and end dates for data retrieval.
         download_directory (str): Directory where downloaded zip files will be saved.
         request_function (function): Function used for making API requests and downloading zip files.
+        members (list): Patterns matched against the file name of each zip member, only matching members are
+            extracted, such as 'pf.polymer_olci_members()'. Default is None, every member.
+        max_workers (int): Number of zip files extracted at once. Default is 1.
 
     Returns:
         None
@@ -46,4 +51,4 @@ def sentinelsat_routine(bbox,  # Bounding box coordinates [min_lon, min_lat, max
 
     request_function(date_tuples, bbox, download_directory)  # Downloads zips
 
-    io.unzip_all_zip_files(download_directory)  # Unzips and deletes all the folders, so we have folders of .nc files
\ No newline at end of file
+    io.unzip_all_zip_files(download_directory, members=members, max_workers=max_workers)  # Unzips and deletes all the folders, so we have folders of .nc files
\ No newline at end of file
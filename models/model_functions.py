@@ -7,6 +7,7 @@ Description: This module contains all functions for parameter models.
 
 Contents:
     - chlor: Function to perform linear chlorophyll model.
+    - chlor_block: Function to perform linear chlorophyll model on a single block of bands.
 
 Notes:
     - This code is distributed under the MIT License. See LICENSE.txt for more details.
@@ -18,44 +19,61 @@ import os
 # Third-party library imports
 
 # Local module imports
-import utils.model_application_functions as maf
 import utils.misc_functions as mf
 import utils.io_functions as io
+import utils.band_math_functions as bmf
 
-def chlor(changeDir, tmp_, npy_save_to, name):
+# Regression coefficients of 'chlor()', keyed by the POLYMER output band they weight
+chlor_intercept = 0.761
+chlor_coefficients = {'Rw443': 0.3495, 'Rw490': -1.512, 'Rw560': 1.925, 'Rw674': -9.0585, 'Rw681': 8.4015}
+chlor_bands = list(chlor_coefficients) # POLYMER output bands used by 'chlor()'
+
+def chlor(changeDir, tmp_, npy_save_to, name, bands=None):
     """
     Algorithm to calculate chlorophyll-a concentration from remote sensing data.
     https://www.sciencedirect.com/science/article/pii/S1569843223000456#b0040
 
     Args:
-        changeDir (str): Directory path for changing directory.
+        changeDir (str): Directory a relative 'tmp_' is relative to, the working directory isn't changed.
         tmp_ (str): Temporary directory path.
         npy_save_to (str): Path to save NumPy files.
         name (str): Name for saving results.
+        bands (dict): Maps band names to arrays, or NetCDF variables, holding the band data. When passed these are
+            used instead of the npy files (default is None).
 
     Returns:
-        None
+        str: Path of the saved result.
     """
 
-    os.chdir(changeDir)  # Change directory to that of polymer, just in case
     chlor_alg = 'algOut'  # Folder name for chlorophyll algorithm output files
+    tmp_ = os.path.join(changeDir, tmp_) # Unchanged if already absolute
     path2 = os.path.join(tmp_, npy_save_to)
 
-    # Defining regression coefficients
-    vals = []
-    vals.append(0.761)
-    vals.append(0.3495)
-    vals.append(-1.512)
-    vals.append(1.925)
-    vals.append(-9.0585)
-    vals.append(8.4015)
-
-    filevals = ['Rw443', 'Rw490', 'Rw560', 'Rw674', 'Rw681'] # Defining the bands we care about
+    if (bands is None): # Memory mapping this snapshot's npy files, keyed by band
+        bands = bmf.load_bands(mf.map_bands_to_files(path2, name, chlor_bands))
 
-    paths = mf.find_files_with_strings(path2, filevals) # Getting file paths for npy files
-
-    saveLoc = os.path.join(os.getcwd(), tmp_)
+    saveLoc = tmp_
     io.create_folder(saveLoc, chlor_alg)
     saveLoc = os.path.join(saveLoc, chlor_alg)
 
-    maf.calculate_and_save_result(paths, vals, name, saveLoc)
\ No newline at end of file
+    # Bands are matched to the coefficients by name, the result is written a block at a time
+    savePath = os.path.join(saveLoc, name + '.npy')
+    bmf.linear_combination_to_npy(bands, chlor_coefficients, chlor_intercept, savePath)
+
+    return savePath
+
+
+def chlor_block(bands, out):
+    """
+    Block version of 'chlor()', used when several models are computed in one pass, see 'bmf.evaluate_models()'.
+
+    Args:
+        bands (dict): Maps band names to the block of each band.
+        out (np.ndarray): Output block, overwritten with the chlorophyll-a concentration.
+
+    Returns:
+        np.ndarray: The output block.
+    """
+
+    return bmf.linear_block(bands, chlor_coefficients, chlor_intercept, out)
+
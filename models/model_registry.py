@@ -0,0 +1,179 @@
+"""
+File: model_registry.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the registry of models that can be computed together in one pass. Each model
+             declares the POLYMER output bands and flags it reads, the dtype of its output and the function that
+             computes a block of it, which lets POLYMER be asked for only the datasets the models need.
+
+Contents:
+    - register_model: Function that adds a model to the registry.
+    - get_model_spec: Function that returns the spec of a registered model.
+    - model_function_bands: Function that returns the bands and flags read by a registered model function.
+    - required_bands: Function that returns the union of the bands and flags read by models.
+    - required_datasets: Function that returns the POLYMER datasets needed by models.
+    - polymer_dataset_name: Function that returns the POLYMER dataset an output variable belongs to.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+import re
+
+# Third-party library imports
+import numpy as np
+
+# Local module imports
+import models.model_functions as mmf
+
+model_registry = {} # Maps model names to their specs
+
+# Always requested from POLYMER, they are needed to place the output pixels
+geometry_datasets = ['latitude', 'longitude']
+
+
+def register_model(name,  # Name of the model.
+                   bands,  # POLYMER output bands the model reads.
+                   block_function,  # Function computing a block of the model's output.
+                   flags=None,  # POLYMER output flags the model reads.
+                   dtype=np.float32,  # Data type of the model's output.
+                   folder=None,  # Folder the model's outputs are saved to.
+                   function=None  # Function computing the model over a whole snapshot.
+                   ):
+    """
+    Add a model to the registry, replacing any model already registered under the same name.
+
+    Args:
+        name (str): Name of the model.
+        bands (list): POLYMER output bands the model reads, such as 'Rw443'.
+        block_function (function): Function called as 'block_function(block_bands, out_block)', writing the
+            model's output for a block of bands and flags into 'out_block'.
+        flags (list): POLYMER output flags the model reads, such as 'bitmask' (default is None).
+        dtype (np.dtype): Data type of the model's output (default is np.float32).
+        folder (str): Folder the model's outputs are saved to (default is None, '<name>Out').
+        function (function): Function computing the model over a whole snapshot, such as 'mmf.chlor', so
+            passing it to the model routines only asks POLYMER for the bands declared here (default is None).
+
+    Returns:
+        dict: The model's spec.
+    """
+
+    spec = {
+        'name': name,
+        'bands': list(bands),
+        'flags': list(flags) if flags is not None else [],
+        'block_function': block_function,
+        'dtype': np.dtype(dtype),
+        'folder': folder if folder is not None else name + 'Out',
+        'function': function,
+    }
+
+    model_registry[name] = spec
+
+    return spec
+
+
+def get_model_spec(model):
+    """
+    Get the spec of a model.
+
+    Args:
+        model (str or dict): Name of a registered model, or a spec which is returned as is.
+
+    Returns:
+        dict: The model's spec.
+    """
+
+    if (not isinstance(model, str)):
+        return model
+
+    if (model not in model_registry):
+        raise ValueError(f"Model '{model}' is not registered, registered models are {list(model_registry)}.")
+
+    return model_registry[model]
+
+
+def model_function_bands(function):
+    """
+    Get the bands and flags read by a model function, if it was registered as a model's 'function'.
+
+    Args:
+        function (function): Function computing a model over a whole snapshot, such as 'mmf.chlor'.
+
+    Returns:
+        list: Names of the POLYMER output variables the model reads, or None if the function isn't registered.
+    """
+
+    for spec in model_registry.values():
+        if (spec.get('function') is function):
+            return required_bands([spec])
+
+    return None
+
+
+def required_bands(models):
+    """
+    Get the union of the bands and flags read by models, in the order they are first declared.
+
+    Args:
+        models (list): Names of registered models or specs.
+
+    Returns:
+        list: Names of the POLYMER output variables the models read.
+    """
+
+    bands = []
+
+    for model in models:
+        spec = get_model_spec(model)
+        bands += [band for band in spec['bands'] + spec.get('flags', []) if band not in bands]
+
+    return bands
+
+
+def required_datasets(models=None, variables=None):
+    """
+    Get the POLYMER datasets needed to compute models, to be passed to 'call_polymer()' as 'datasets'.
+    POLYMER writes a band dataset such as 'Rw' as one variable per band ('Rw443', 'Rw490', ...), so datasets are
+    requested by the name of the variable without its wavelength.
+
+    Args:
+        models (list): Names of registered models or specs (default is None).
+        variables (list): Further POLYMER output variables that are needed (default is None).
+
+    Returns:
+        list: Names of the POLYMER datasets, or None if neither models nor variables were passed, in which case
+            POLYMER writes its default datasets.
+    """
+
+    if (models is None and variables is None):
+        return None
+
+    datasets = list(geometry_datasets)
+
+    for variable in required_bands(models or []) + list(variables or []):
+        dataset = polymer_dataset_name(variable)
+        if (dataset not in datasets):
+            datasets.append(dataset)
+
+    return datasets
+
+
+def polymer_dataset_name(variable):
+    """
+    Get the POLYMER dataset an output variable belongs to, by removing any wavelength from its name.
+
+    Args:
+        variable (str): Name of the output variable, such as 'Rw443' or 'bitmask'.
+
+    Returns:
+        str: Name of the dataset, such as 'Rw' or 'bitmask'.
+    """
+
+    return re.sub(r'\d+$', '', variable)
+
+
+# Models shipped with this project
+register_model('chlor', mmf.chlor_bands, mmf.chlor_block, folder='algOut', function=mmf.chlor)
@@ -165,7 +165,7 @@ if __name__ == "__main__":
         tmpdir = sys.argv[sys.argv.index("--tmpdir") + 1] if "--tmpdir" in sys.argv else None
         outdir = sys.argv[sys.argv.index("--outdir") + 1] if "--outdir" in sys.argv else None
         overwrite = bool(sys.argv[sys.argv.index("--overwrite") + 1]) if "--overwrite" in sys.argv else None
-        datasets = list(sys.argv[sys.argv.index("--datasets") + 1]) if "--datasets" in sys.argv else None
+        datasets = sys.argv[sys.argv.index("--datasets") + 1].split(',') if "--datasets" in sys.argv else None
         compress = bool(sys.argv[sys.argv.index("--compress") + 1]) if "--compress" in sys.argv else None
         format = sys.argv[sys.argv.index("--format") + 1] if "--format" in sys.argv else None
         multiprocessing = int(
@@ -33,7 +33,9 @@ def run_polymer(dirname, filetype=True, sline=None, eline=None, scol=None, ecol=
         scol (int): Start column for data processing. Default is 0.
         ecol (int): End column for data processing. Default is -1.
         blocksize (int): Block size for processing. Default is 198.
-        ancillary (object): An ancillary data instance (Ancillary_NASA, Ancillary_ERA). Default is None.
+        ancillary (Union[int, object]): If 0 a new Ancillary_NASA instance is used, an existing Ancillary_NASA instance
+            is used as is (this lets a long running worker reuse its loaded data), otherwise no ancillary data.
+            Default is 0.
         landmask (Union[str, None, GSW object]): Landmask information. Can be a string, None, or a GSW object.
             Default is None.
         altitude (Union[float, DEM object]): Altitude parameter. Can be a float, or a DEM object.
@@ -74,10 +76,12 @@ def run_polymer(dirname, filetype=True, sline=None, eline=None, scol=None, ecol=
             Default is None.
 
     Returns:
-        None
+        bool: True if POLYMER was run, False if an argument was invalid.
     """
 
-    if (ancillary == 0):
+    if (isinstance(ancillary, Ancillary_NASA)): # Already loaded, reused as is
+        pass
+    elif (ancillary == 0):
         ancillary = Ancillary_NASA()
     else:
         ancillary=None
@@ -86,25 +90,25 @@ def run_polymer(dirname, filetype=True, sline=None, eline=None, scol=None, ecol=
 
     if (not(dirname.endswith(".SEN3"))):
         print(f"Error, please enter a valid Sentinel3 directory for variable 'dirname'. Received: '{dirname}'")
-        return
+        return False
 
     if(not (filetype == True or filetype == False)):
         print(f"Error, please enter a valid boolean value for 'filetype' variable. Received: '{filetype}'")
-        return
+        return False
 
     if ((not isinstance(sline, int)) and sline is not None):
         print(f"Error, 'sline' not an integer, attempting to cast.")
         sline = try_cast_to_int(sline)
         if (sline == False):
             print(f"Error, please enter a valid integer for 'sline' variable. Received: '{sline}'")
-            return
+            return False
 
     if ((not isinstance(eline, int)) and eline is not None):
         print(f"Error, 'eline' not an integer, attempting to cast.")
         eline = try_cast_to_int(eline)
         if (eline == False):
             print(f"Error, please enter a valid integer for 'eline' variable. Received: '{eline}'")
-            return
+            return False
 
     if (isinstance(outdir, str) and outdir is not None): # Checks if output folder passed
         outdir = ensure_end_char(outdir, '/') # Makes sure folder starts and ends with '/' character
@@ -139,6 +143,8 @@ def run_polymer(dirname, filetype=True, sline=None, eline=None, scol=None, ecol=
         run_atm_corr(Level1_OLCI(dirname, **level1_args_dict), Level2_HDF(**level2_args_dict),
                      **run_opt_corr_args_dict)
 
+    return True
+
 if __name__ == "__main__":
     if len(sys.argv) >= 3 and sys.argv[1] == "run_polymer":
         dirname = sys.argv[2]
@@ -157,7 +163,7 @@ if __name__ == "__main__":
         tmpdir = sys.argv[sys.argv.index("--tmpdir") + 1] if "--tmpdir" in sys.argv else None
         outdir = sys.argv[sys.argv.index("--outdir") + 1] if "--outdir" in sys.argv else None
         overwrite = bool(sys.argv[sys.argv.index("--overwrite") + 1]) if "--overwrite" in sys.argv else None
-        datasets = list(sys.argv[sys.argv.index("--datasets") + 1]) if "--datasets" in sys.argv else None
+        datasets = sys.argv[sys.argv.index("--datasets") + 1].split(',') if "--datasets" in sys.argv else None
         compress = bool(sys.argv[sys.argv.index("--compress") + 1]) if "--compress" in sys.argv else None
         format = sys.argv[sys.argv.index("--format") + 1] if "--format" in sys.argv else None
         multiprocessing = int(
@@ -166,8 +172,10 @@ if __name__ == "__main__":
         calib = dict(sys.argv[sys.argv.index("--calib") + 1]) if "--calib" in sys.argv else None
         normalize = int(sys.argv[sys.argv.index("--normalize") + 1]) if "--normalize" in sys.argv else None
 
-        run_polymer(dirname, filetype, sline=sline, eline=eline, scol=scol, ecol=ecol, blocksize=blocksize,
-                    ancillary=ancillary, landmask=landmask, altitude=altitude, add_noise=add_noise,
-                    filename=filename, ext=ext, tmpdir=tmpdir, outdir=outdir, overwrite=overwrite,
-                    datasets=datasets, compress=compress, format=format, multiprocessing=multiprocessing,
-                    dir_base=dir_base, calib=calib, normalize=normalize)
\ No newline at end of file
+        success = run_polymer(dirname, filetype, sline=sline, eline=eline, scol=scol, ecol=ecol, blocksize=blocksize,
+                              ancillary=ancillary, landmask=landmask, altitude=altitude, add_noise=add_noise,
+                              filename=filename, ext=ext, tmpdir=tmpdir, outdir=outdir, overwrite=overwrite,
+                              datasets=datasets, compress=compress, format=format, multiprocessing=multiprocessing,
+                              dir_base=dir_base, calib=calib, normalize=normalize)
+
+        sys.exit(0 if success else 1) # Lets the caller tell a rejected argument from a successful run
\ No newline at end of file
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+## Aidan McEnaney
+## October 17th, 2026
+## Long running worker that runs the POLYMER algorithm on jobs sent over a local socket
+
+## Start of imports
+
+from poly_script_olci import run_polymer
+from polymer.ancillary import Ancillary_NASA
+import json
+import os
+import socket
+import sys
+import time
+import traceback
+
+## End of imports
+
+## Starting POLYMER means sourcing conda, starting python and importing POLYMER along with its auxiliary data.
+## This worker does that once, then runs every job it is sent, so that cost is not paid per snapshot.
+## Each connection carries one JSON request on a single line and receives one JSON reply on a single line:
+##   {"command": "run", "dirname": "...SEN3", "options": {...}} -> {"status": "success"|"failed", "error": ..., "seconds": ...}
+##   {"command": "ping"} -> {"status": "ready"}
+##   {"command": "shutdown"} -> {"status": "stopping"}
+## The options are the keyword arguments of 'run_polymer()' in 'poly_script_olci.py'.
+
+def handle_request(request, ancillary):
+    """
+    Run a single request sent to the worker.
+
+    Args:
+        request (dict): The decoded request.
+        ancillary (Ancillary_NASA): Ancillary data instance shared by every job.
+
+    Returns:
+        dict: The reply to send back.
+    """
+
+    command = request.get('command')
+
+    if (command == 'ping'):
+        return {'status': 'ready'}
+
+    if (command == 'shutdown'):
+        return {'status': 'stopping'}
+
+    if (command != 'run'):
+        return {'status': 'failed', 'error': f"Unknown command '{command}'"}
+
+    options = dict(request.get('options', {}))
+
+    # Same meaning as the command line, 0 means NASA ancillary data and leaving it out means none. The loaded
+    # instance is reused, rather than a new one per job.
+    options['ancillary'] = ancillary if options.get('ancillary') == 0 else None
+
+    start = time.time()
+
+    try:
+        success = run_polymer(request['dirname'], **options)
+    except Exception:
+        return {'status': 'failed', 'error': traceback.format_exc(), 'seconds': time.time() - start}
+
+    if (not success):
+        return {'status': 'failed', 'error': 'Invalid arguments, see worker output', 'seconds': time.time() - start}
+
+    return {'status': 'success', 'error': None, 'seconds': time.time() - start}
+
+
+def serve(socket_path):
+    """
+    Listen on a unix socket and run the requests sent to it, one at a time, until told to shut down.
+
+    Args:
+        socket_path (str): Path of the unix socket to listen on.
+
+    Returns:
+        None
+    """
+
+    if (os.path.exists(socket_path)): # Left over from a worker that didn't shut down cleanly
+        os.remove(socket_path)
+
+    ancillary = Ancillary_NASA()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(1)
+
+    print(f"POLYMER worker listening on '{socket_path}'")
+    sys.stdout.flush()
+
+    running = True
+
+    try:
+        while running:
+            connection, _ = server.accept()
+            with connection:
+                with connection.makefile('r') as reader:
+                    line = reader.readline()
+
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    reply = {'status': 'failed', 'error': f"Could not decode request '{line}'"}
+                else:
+                    reply = handle_request(request, ancillary)
+                    running = request.get('command') != 'shutdown'
+
+                connection.sendall((json.dumps(reply) + '\n').encode())
+    finally:
+        server.close()
+        if (os.path.exists(socket_path)):
+            os.remove(socket_path)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: poly_worker.py <socket_path>")
+        sys.exit(1)
+
+    serve(sys.argv[1])
@@ -2,8 +2,11 @@
 
 # Bash script to call POLYMER via 'polymer_cli.py'
 
+# Get the directory where the script is located, so this works from any working directory
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )"
+
 # Read the conda source path from the text file and remove leading/trailing whitespaces and newlines
-CONDA_SOURCE_PATH=$(<../text_files/conda_source_path.txt)
+CONDA_SOURCE_PATH=$(<"$SCRIPT_DIR/../text_files/conda_source_path.txt")
 
 # Using 'echo' and 'tr' to remove newlines
 CONDA_SOURCE_PATH=$(echo "$CONDA_SOURCE_PATH" | tr -d '[:space:]')
@@ -11,7 +14,7 @@ CONDA_SOURCE_PATH=$(echo "$CONDA_SOURCE_PATH" | tr -d '[:space:]')
 # Source the conda script from the specified path
 source "$CONDA_SOURCE_PATH"
 
-pol_dir=$(cat "../text_files/polymer_root_name.txt")
+pol_dir=$(cat "$SCRIPT_DIR/../text_files/polymer_root_name.txt")
 
 cd "$pol_dir" # Move over to the polymer root directory
 
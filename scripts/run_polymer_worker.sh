@@ -0,0 +1,22 @@
+#!/bin/bash
+
+# Bash script to start a long running POLYMER worker via 'poly_worker.py'
+# Usage: ./run_polymer_worker.sh <socket_path>
+
+# Get the directory where the script is located, so this works from any working directory
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )"
+
+# Read the conda source path from the text file, using 'tr' to remove whitespace and newlines
+CONDA_SOURCE_PATH=$(tr -d '[:space:]' < "$SCRIPT_DIR/../text_files/conda_source_path.txt")
+
+# Source the conda script from the specified path
+source "$CONDA_SOURCE_PATH"
+
+pol_dir=$(cat "$SCRIPT_DIR/../text_files/polymer_root_name.txt")
+
+cd "$pol_dir" # Move over to the polymer root directory, outputs are written here as with 'run_polymer.sh'
+
+conda activate sentPoly # Activate environment for polymer
+
+# 'exec' so the worker replaces this shell and receives signals sent to it
+exec python "${pol_dir}/poly_worker.py" "$@"
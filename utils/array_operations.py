@@ -8,6 +8,7 @@ Description: This module contains functions performing array operations.
 Contents:
     - move_elements_down_one: Function to shift elements one to the right.
     - reshape_data: Function that reshapes a np.ndarry so a multiple band request can be treated as multiple singular band requests.
+    - array_statistics: Function that computes the summary statistics written for each array.
 
 Notes:
     - This code is distributed under the MIT License. See LICENSE.txt for more details.
@@ -57,4 +58,18 @@ def reshape_data(data, p):
         reshaped_arr = np.transpose(arr, axes=(0, 1, 2))
         reshaped_arr = reshaped_arr[:, :, p]
         reshaped_data.append(reshaped_arr)
-    return reshaped_data
\ No newline at end of file
+    return reshaped_data
+
+
+def array_statistics(arr):
+    """
+    Compute the summary statistics kept for each array, in the order of the csv columns.
+
+    Args:
+        arr (np.ndarray): Array to compute the statistics of.
+
+    Returns:
+        list: Average, minimum, maximum and standard deviation of the array.
+    """
+
+    return [np.average(arr), np.min(arr), np.max(arr), np.std(arr)]
\ No newline at end of file
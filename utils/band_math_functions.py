@@ -0,0 +1,201 @@
+"""
+File: band_math_functions.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the functions for evaluating linear band models. Bands are passed by name and
+             evaluated a block of rows at a time into a single float32 output, accumulating in place so no full
+             size temporaries are created.
+
+Contents:
+    - load_bands: Function that memory maps npy band files, keyed by band name.
+    - linear_combination: Function that evaluates an intercept plus a weighted sum of bands.
+    - linear_combination_to_npy: Function that evaluates a linear combination straight into an npy file.
+    - linear_block: Function that evaluates a linear combination for a single block of bands, in place.
+    - evaluate_models: Function that evaluates several models in one pass over the bands they need.
+    - check_bands: Function that checks every needed band is present and all have the same shape.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+
+
+# Third-party library imports
+import numpy as np
+
+# Local module imports
+
+
+def load_bands(band_paths):
+    """
+    Memory map npy band files, so only the blocks being evaluated are read.
+
+    Args:
+        band_paths (dict): Maps band names to .npy file paths.
+
+    Returns:
+        dict: Maps band names to read only memory mapped arrays.
+    """
+
+    return {band: np.load(path, mmap_mode='r') for band, path in band_paths.items()}
+
+
+def linear_combination(bands,  # Maps band names to arrays, memory maps or NetCDF variables.
+                       coefficients,  # Maps band names to their weights.
+                       intercept=0.0,  # Constant term of the model.
+                       out=None,  # Preallocated output array.
+                       block_rows=512,  # Number of rows evaluated at a time.
+                       dtype=np.float32  # Data type of the output.
+                       ):
+    """
+    Evaluate 'intercept + sum(coefficients[band] * bands[band])'. Bands are matched to coefficients by name,
+    never by position, and are read a block of rows at a time. Each block is accumulated in place in the output,
+    using one scratch block, so memory use is the output plus about two blocks.
+
+    Args:
+        bands (dict): Maps band names to arrays, memory maps or NetCDF variables, all the same shape.
+        coefficients (dict): Maps band names to their weights, every name must be present in 'bands'.
+        intercept (float): Constant term of the model (default is 0.0).
+        out (np.ndarray): Preallocated output array, such as a memory map (default is None, a new array).
+        block_rows (int): Number of rows evaluated at a time (default is 512).
+        dtype (np.dtype): Data type of the output when 'out' isn't passed (default is np.float32).
+
+    Returns:
+        np.ndarray: The output array.
+    """
+
+    check_bands(bands, coefficients)
+
+    shape = bands[next(iter(coefficients))].shape
+
+    if (out is None):
+        out = np.empty(shape, dtype=dtype)
+
+    scratch = np.empty((min(block_rows, shape[0]),) + tuple(shape[1:]), dtype=out.dtype)
+
+    for start in range(0, shape[0], block_rows):
+        out_block = out[start:start + block_rows]
+        block_bands = {band: bands[band][start:start + block_rows] for band in coefficients}
+
+        linear_block(block_bands, coefficients, intercept, out_block, scratch=scratch[:out_block.shape[0]])
+
+    return out
+
+
+def linear_combination_to_npy(bands, coefficients, intercept, save_path, block_rows=512):
+    """
+    Evaluate a linear combination, see 'linear_combination()', straight into a float32 memory mapped .npy file.
+
+    Args:
+        bands (dict): Maps band names to arrays, memory maps or NetCDF variables, all the same shape.
+        coefficients (dict): Maps band names to their weights.
+        intercept (float): Constant term of the model.
+        save_path (str): Path of the .npy file to write.
+        block_rows (int): Number of rows evaluated at a time (default is 512).
+
+    Returns:
+        None
+    """
+
+    check_bands(bands, coefficients)
+
+    shape = bands[next(iter(coefficients))].shape
+
+    out = np.lib.format.open_memmap(save_path, mode='w+', dtype=np.float32, shape=shape)
+    linear_combination(bands, coefficients, intercept, out=out, block_rows=block_rows)
+
+    out.flush()
+    del out # Closes the memory map
+
+
+def linear_block(block_bands, coefficients, intercept, out, scratch=None):
+    """
+    Evaluate 'intercept + sum(coefficients[band] * block_bands[band])' for a single block, in place in 'out'.
+
+    Args:
+        block_bands (dict): Maps band names to the block of each band, all the shape of 'out'.
+        coefficients (dict): Maps band names to their weights.
+        intercept (float): Constant term of the model.
+        out (np.ndarray): Output block, overwritten with the result.
+        scratch (np.ndarray): Block to hold each weighted band, the shape and dtype of 'out' (default is None,
+            a new block).
+
+    Returns:
+        np.ndarray: The output block.
+    """
+
+    if (scratch is None):
+        scratch = np.empty_like(out)
+
+    out.fill(intercept)
+
+    for band, weight in coefficients.items():
+        np.multiply(block_bands[band], weight, out=scratch, casting='unsafe')
+        np.add(out, scratch, out=out)
+
+    return out
+
+
+def evaluate_models(bands,  # Maps band names to arrays, memory maps or NetCDF variables.
+                    models,  # List of model specs, see 'mr.register_model()'.
+                    outputs,  # Output array of each model.
+                    block_rows=512  # Number of rows evaluated at a time.
+                    ):
+    """
+    Evaluate several models in a single pass. Each block of the union of the bands the models need is read once,
+    then every model computes its block of output from it, rather than each model reading the bands again.
+
+    Args:
+        bands (dict): Maps band names to arrays, memory maps or NetCDF variables, all the same shape.
+        models (list of dict): Model specs, each with the 'bands' (and optionally 'flags') it needs and a
+            'block_function' called as 'block_function(block_bands, out_block)' to write its result for a block
+            into 'out_block'.
+        outputs (list of np.ndarray): Preallocated output array of each model, in the same order as 'models'.
+        block_rows (int): Number of rows evaluated at a time (default is 512).
+
+    Returns:
+        None
+    """
+
+    needed = []
+    for spec in models:
+        needed += [band for band in spec['bands'] + spec.get('flags', []) if band not in needed]
+
+    check_bands(bands, needed)
+
+    shape = bands[needed[0]].shape
+
+    for start in range(0, shape[0], block_rows):
+        # Read once here, every model then works from memory
+        block_bands = {band: np.asarray(bands[band][start:start + block_rows]) for band in needed}
+
+        for spec, out in zip(models, outputs):
+            spec['block_function'](block_bands, out[start:start + block_rows])
+
+
+def check_bands(bands, band_names):
+    """
+    Check that at least one band is needed, that every needed band was passed and that they all have the same
+    shape.
+
+    Args:
+        bands (dict): Maps band names to arrays, memory maps or NetCDF variables.
+        band_names (list): Names of the bands needed, or a dict keyed by them such as the model coefficients.
+
+    Returns:
+        None
+    """
+
+    if (not band_names):
+        raise ValueError("At least one band is needed.")
+
+    missing = [band for band in band_names if band not in bands]
+    if (missing):
+        raise ValueError(f"Bands {missing} are needed by the model but were not passed.")
+
+    shape = bands[next(iter(band_names))].shape
+    for band in band_names:
+        if (bands[band].shape != shape):
+            raise ValueError(f"Band '{band}' has shape {bands[band].shape}, expected {shape}.")
@@ -0,0 +1,168 @@
+"""
+File: catalog_functions.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the functions for the indexed operation catalog, an SQLite replacement for the
+             plain text operation log used to avoid repeat SentinelHub API calls.
+
+Contents:
+    - open_catalog: Function that opens (and if needed creates) a catalog, importing an existing text log.
+    - import_text_log: Function that copies the entries of a text operation log into a catalog.
+    - catalog_fetched_slots: Function that returns the set of date tuples already fetched for a preface.
+    - catalog_missing_slots: Function that returns the date tuples not yet fetched for a preface.
+    - catalog_record_slots: Function that records date tuples as fetched.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+import os
+import re
+import sqlite3
+
+# Third-party library imports
+
+
+# Local module imports
+import utils.misc_functions as mf
+
+# Matches the names written by 'populate_text_file()': <project>_<start>_<end>_<preface>_<index><extension>
+log_line_pattern = re.compile(r'^(.*)_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})_(.*)_\d+(\.[^._]*)?$')
+
+
+def open_catalog(catalog_path, text_log_path=None):
+    """
+    Open the catalog at the passed path, creating it if it doesn't already exist.
+    When the catalog is created and a text operation log exists, the log's entries are imported.
+
+    Args:
+        catalog_path (str): Path to the SQLite catalog file.
+        text_log_path (str): Path to an existing text operation log to import (default is None).
+
+    Returns:
+        sqlite3.Connection: Connection to the catalog, to be closed by the caller.
+    """
+
+    new_catalog = not os.path.exists(catalog_path)
+
+    if (new_catalog):
+        mf.folder_creation_manage(catalog_path) # Creates folders leading up to file
+
+    connection = sqlite3.connect(catalog_path)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS operations (
+            project TEXT NOT NULL,
+            preface TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            extension TEXT NOT NULL,
+            PRIMARY KEY (project, preface, extension, start_date, end_date)
+        ) WITHOUT ROWID
+    """)
+    connection.commit()
+
+    if (new_catalog and text_log_path is not None and os.path.exists(text_log_path)):
+        import_text_log(connection, text_log_path)
+
+    return connection
+
+
+def import_text_log(connection, text_log_path):
+    """
+    Copy the entries of a text operation log, as written by 'populate_text_file()', into a catalog.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the catalog.
+        text_log_path (str): Path to the text operation log.
+
+    Returns:
+        int: Number of log lines that were imported.
+    """
+
+    rows = []
+
+    with open(text_log_path, "r") as file:
+        for line in file:
+            match = log_line_pattern.match(line.strip())
+            if match:
+                project, start_date, end_date, preface, extension = match.groups()
+                rows.append((project, preface, start_date, end_date, extension or ''))
+
+    with connection:
+        connection.executemany("INSERT OR IGNORE INTO operations VALUES (?, ?, ?, ?, ?)", rows)
+
+    return len(rows)
+
+
+def catalog_fetched_slots(connection, file_extension, preface, project):
+    """
+    Get every date tuple already fetched for a project and preface, using a single indexed lookup.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the catalog.
+        file_extension (str): File extension of the operation.
+        preface (str): Prefix for filenames.
+        project (str): Project name.
+
+    Returns:
+        set of tuple: Date tuples, (start_date, end_date), that have already been fetched.
+    """
+
+    cursor = connection.execute(
+        "SELECT start_date, end_date FROM operations WHERE project = ? AND preface = ? AND extension = ?",
+        (project, preface, file_extension))
+
+    return set(cursor.fetchall())
+
+
+def catalog_missing_slots(connection,  # Connection to the catalog.
+                          date_tuples,  # List of tuples, each containing start and end dates.
+                          file_extension,  # File extension of the operation.
+                          preface,  # Prefix for filenames.
+                          project  # Project name.
+                          ):
+    """
+    Get the date tuples that have not been fetched yet, the catalog equivalent of 'check_files_exist_in_text_file()'.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the catalog.
+        date_tuples (list): A list of tuples, each containing start and end dates.
+        file_extension (str): File extension of the operation.
+        preface (str): Prefix for filenames.
+        project (str): Project name.
+
+    Returns:
+        list of tuple: Date tuples not present in the catalog, in the order they were passed.
+    """
+
+    fetched = catalog_fetched_slots(connection, file_extension, preface, project)
+
+    return [tuple(date_tuple) for date_tuple in date_tuples if tuple(date_tuple) not in fetched]
+
+
+def catalog_record_slots(connection,  # Connection to the catalog.
+                         date_tuples,  # List of tuples, each containing start and end dates.
+                         file_extension,  # File extension of the operation.
+                         preface,  # Prefix for filenames.
+                         project  # Project name.
+                         ):
+    """
+    Record date tuples as fetched, the catalog equivalent of 'populate_text_file()'.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the catalog.
+        date_tuples (list): A list of tuples, each containing start and end dates.
+        file_extension (str): File extension of the operation.
+        preface (str): Prefix for filenames.
+        project (str): Project name.
+
+    Returns:
+        None
+    """
+
+    rows = [(project, preface, date_tuple[0], date_tuple[1], file_extension) for date_tuple in date_tuples]
+
+    with connection:
+        connection.executemany("INSERT OR IGNORE INTO operations VALUES (?, ?, ?, ?, ?)", rows)
@@ -7,6 +7,11 @@ Description: This module contains all functions involving file conversions for t
 
 Contents:
     - convert_nc_to_npy: Function that takes an nc files and converts it to an npy file.
+    - write_variable_to_npy: Function that copies a NetCDF variable into an npy file, a block of rows at a time.
+    - read_variable: Function that reads a NetCDF variable into memory, a block of rows at a time.
+    - variable_block_rows: Function that picks how many rows of a NetCDF variable to read at a time.
+    - convert_nc_to_npy_cached: Function that converts an nc file to npy files, unless it was already converted.
+    - conversion_cache_key: Function that builds the conversion cache key of an nc file and variable list.
     - convert_npy_to_nc: Function that takes a npy file and writes it as a nc file.
     - convert_all_nc_and_npy: Function that converts multiple npy files to nc files.
 
@@ -16,6 +21,8 @@ Notes:
 
 # Standard library imports
 import os
+import json
+import tempfile
 
 # Third-party library imports
 from netCDF4 import Dataset
@@ -27,23 +34,35 @@ import utils.io_functions as io
 import utils.load_file_functions as lff
 import utils.misc_functions as mf
 
-def convert_nc_to_npy(nc_file_path, save_to=None):
+conversion_cache_name = 'conversion_cache.json' # Kept in the folder the npy files are written to
+
+def convert_nc_to_npy(nc_file_path, save_to=None, variables=None, block_rows=None):
     """
-    Convert a NetCDF (.nc) file to a NumPy array saved as .npy file.
+    Convert a NetCDF (.nc) file to NumPy arrays saved as .npy files, one per variable.
+    Variables are copied a block of rows at a time into memory mapped .npy files, so only a few blocks are ever
+    held in memory rather than the whole file.
 
     Args:
         nc_file_path (str): Path to the input .nc file.
         save_to (str): Directory path to save the converted .npy file (default is None).
+        variables (list): Names of the variables to convert, such as the bands a model needs (default is None,
+            every variable in the file).
+        block_rows (int): Number of rows copied at a time (default is None, picked from the file's chunking).
 
     Returns:
-        None
+        dict: Maps the name of each converted variable to the path of its .npy file.
     """
 
+    converted = {}
+
     try:
         # Open the NetCDF file
         dataset = nc.Dataset(nc_file_path)
 
-        for variable_name in list(dataset.variables.keys()):
+        if (variables is None):
+            variables = list(dataset.variables.keys())
+
+        for variable_name in variables:
             try:
                 # Check if the variable_name exists in the NetCDF file
                 if variable_name not in dataset.variables:
@@ -51,22 +70,18 @@ def convert_nc_to_npy(nc_file_path, save_to=None):
                     continue  # Skip to the next variable
 
                 if isinstance(save_to, str) and save_to is not None:
-                    npy_file_path_tmp = os.path.join(os.getcwd(), os.path.dirname(nc_file_path)) # Excludes file name
+                    npy_file_path_tmp = os.path.dirname(os.path.abspath(nc_file_path)) # Excludes file name
                     io.create_folder(npy_file_path_tmp, save_to) # Creates folder to save to
                     npy_file_path1 = os.path.join(npy_file_path_tmp, save_to, os.path.basename(nc_file_path))
                 else:
                     npy_file_path1 = nc_file_path
 
-                npy_file_path = mf.remove_file_extension(npy_file_path1) + str(variable_name)
-
-                # Read the data from the NetCDF file
-                data = dataset.variables[variable_name][:]
+                npy_file_path = mf.remove_file_extension(npy_file_path1) + str(variable_name) + '.npy'
 
-                # Convert the data to NumPy array
-                np_data = np.array(data)
+                # Copy the data from the NetCDF file to the npy file
+                write_variable_to_npy(dataset.variables[variable_name], npy_file_path, block_rows=block_rows)
 
-                # Save the NumPy array to an npy file
-                np.save(npy_file_path, np_data)
+                converted[variable_name] = npy_file_path
 
             except Exception as e:
                 if not (isinstance(e, FileNotFoundError) and "No such file or directory: 'None'" in str(e)):
@@ -79,6 +94,165 @@ def convert_nc_to_npy(nc_file_path, save_to=None):
         if not (isinstance(e, FileNotFoundError) and "No such file or directory: 'None'" in str(e)):
             print("An error occurred:", e)
 
+    return converted
+
+
+def write_variable_to_npy(variable, npy_file_path, block_rows=None):
+    """
+    Copy a NetCDF variable into an .npy file. Variables with two or more dimensions are read a block of rows at a
+    time and written straight into a memory mapped .npy file, smaller ones are read whole.
+
+    Args:
+        variable (netCDF4.Variable): The variable to copy.
+        npy_file_path (str): Path of the .npy file to write.
+        block_rows (int): Number of rows copied at a time (default is None, picked from the variable's chunking).
+
+    Returns:
+        None
+    """
+
+    if (len(variable.shape) < 2 or variable.shape[0] == 0):
+        np.save(npy_file_path, np.array(variable[:]))
+        return
+
+    if (block_rows is None):
+        block_rows = variable_block_rows(variable)
+
+    output = None
+
+    for start in range(0, variable.shape[0], block_rows):
+        block = np.ma.getdata(variable[start:start + block_rows]) # Same values as 'np.array()' on the masked array
+
+        if (output is None): # Created from the first block, as scaling can change the dtype from the stored one
+            output = np.lib.format.open_memmap(npy_file_path, mode='w+', dtype=block.dtype, shape=variable.shape)
+
+        output[start:start + block.shape[0]] = block
+
+    output.flush()
+    del output # Closes the memory map
+
+
+def read_variable(variable, block_rows=None):
+    """
+    Read a NetCDF variable into an array, a block of rows at a time like 'write_variable_to_npy()', so only the
+    array and a single block are held in memory rather than the array and a decoded copy of the whole variable.
+
+    Args:
+        variable (netCDF4.Variable): The variable to read.
+        block_rows (int): Number of rows read at a time (default is None, picked from the variable's chunking).
+
+    Returns:
+        np.ndarray: The variable's values.
+    """
+
+    if (len(variable.shape) < 2 or variable.shape[0] == 0):
+        return np.ma.getdata(variable[:])
+
+    if (block_rows is None):
+        block_rows = variable_block_rows(variable)
+
+    output = None
+
+    for start in range(0, variable.shape[0], block_rows):
+        block = np.ma.getdata(variable[start:start + block_rows])
+
+        if (output is None): # Created from the first block, as scaling can change the dtype from the stored one
+            output = np.empty(variable.shape, dtype=block.dtype)
+
+        output[start:start + block.shape[0]] = block
+
+    return output
+
+
+def variable_block_rows(variable, min_rows=256):
+    """
+    Pick how many rows of a NetCDF variable to read at a time. For chunked variables this is a whole number of
+    chunks, so every chunk is only decompressed once.
+
+    Args:
+        variable (netCDF4.Variable): The variable to be read.
+        min_rows (int): Smallest number of rows to read at a time (default is 256).
+
+    Returns:
+        int: Number of rows to read at a time.
+    """
+
+    chunking = variable.chunking()
+
+    if (chunking == 'contiguous' or not chunking):
+        return min_rows
+
+    chunk_rows = chunking[0]
+    return chunk_rows * max(1, -(-min_rows // chunk_rows)) # Rounds up to a multiple of the chunk rows
+
+
+def convert_nc_to_npy_cached(nc_file_path, save_to=None, variables=None, block_rows=None):
+    """
+    Same as 'convert_nc_to_npy()', but the conversion is skipped if the same nc file, unchanged, was already
+    converted for the same variables and every npy file it produced still exists.
+    Conversions are recorded in a cache file kept in the folder the npy files are written to, so deleting that
+    folder also clears the cache.
+
+    Args:
+        nc_file_path (str): Path to the input .nc file.
+        save_to (str): Directory path to save the converted .npy file (default is None).
+        variables (list): Names of the variables to convert (default is None, every variable in the file).
+        block_rows (int): Number of rows copied at a time (default is None, picked from the file's chunking).
+
+    Returns:
+        dict: Maps the name of each converted variable to the path of its .npy file.
+    """
+
+    npy_folder = os.path.dirname(os.path.abspath(nc_file_path))
+    if isinstance(save_to, str):
+        npy_folder = os.path.join(npy_folder, save_to)
+
+    cache_path = os.path.join(npy_folder, conversion_cache_name)
+    key = conversion_cache_key(nc_file_path, variables)
+
+    cache = {}
+    if (os.path.isfile(cache_path)):
+        try:
+            with open(cache_path, 'r') as file:
+                cache = json.load(file)
+        except ValueError:
+            print(f"Error: conversion cache '{cache_path}' could not be read, starting a new one.")
+
+    converted = cache.get(key)
+    if (converted and all(os.path.isfile(path) for path in converted.values())):
+        return converted
+
+    converted = convert_nc_to_npy(nc_file_path, save_to=save_to, variables=variables, block_rows=block_rows)
+
+    if (converted):
+        cache[key] = converted
+        os.makedirs(npy_folder, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(suffix='.json', dir=npy_folder)
+        with os.fdopen(file_descriptor, 'w') as file:
+            json.dump(cache, file, indent=1)
+        os.replace(temp_path, cache_path)
+
+    return converted
+
+
+def conversion_cache_key(nc_file_path, variables=None):
+    """
+    Build the conversion cache key of an nc file, from its path, size and modification time along with the
+    variables converted. A rewritten nc file therefore never matches an older conversion.
+
+    Args:
+        nc_file_path (str): Path to the .nc file.
+        variables (list): Names of the variables converted (default is None, every variable in the file).
+
+    Returns:
+        str: The cache key.
+    """
+
+    stat = os.stat(nc_file_path)
+    variable_names = '*' if variables is None else ','.join(sorted(variables))
+
+    return f"{os.path.abspath(nc_file_path)}|{stat.st_size}|{stat.st_mtime_ns}|{variable_names}"
+
 
 def convert_npy_to_nc(npy_path, download_path):
     """
@@ -112,7 +286,8 @@ def convert_npy_to_nc(npy_path, download_path):
     nc_file.close()
 
 
-def convert_all_npy_and_nc(path, preface="image", date_tuples=None, project_name='name', folder_name='sen'):
+def convert_all_npy_and_nc(path, preface="image", date_tuples=None, project_name='name', folder_name='sen',
+                           start_index=0):
     """
     Convert multiple .npy files to NetCDF (.nc) format, organized in folders.
 
@@ -122,6 +297,7 @@ def convert_all_npy_and_nc(path, preface="image", date_tuples=None, project_name
         date_tuples (list of tuple): List of tuples, each containing start and end dates (default is None).
         project_name (str): Project name to be included in the filenames (default is 'name').
         folder_name (str): Name of the subfolder where converted files will be saved (default is 'sen').
+        start_index (int): Index of the first date tuple, used in the filenames (default is 0).
 
     Returns:
         None
@@ -134,7 +310,7 @@ def convert_all_npy_and_nc(path, preface="image", date_tuples=None, project_name
         path2 = path + tmp
 
         # Generate the filename
-        filename = f"{preface}_{i}."
+        filename = f"{preface}_{start_index + i}."
         if date_tuples and i < len(date_tuples) and len(date_tuples[i]) == 2:
             date_str_1 = date_tuples[i][0]
             date_str_2 = date_tuples[i][1]
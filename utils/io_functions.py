@@ -10,6 +10,7 @@ Contents:
     - del_file: Function to delete file.
     - delete_folder_with_contents: Function to delete folder and contents.
     - unzip_all_zip_files: Function to unzip all files in given directory.
+    - extract_zip_members: Function to extract the members of a zip file matching patterns.
     - create_batch_folders_absolute_path: Function that takes an absolute path and creates folders along it.
     - create_batch_folders: Function that takes a path and creates all folders along it.
     - create_folder: Function that creates a folder.
@@ -25,9 +26,13 @@ Notes:
 
 # Standard library imports
 import os
+import ast
 import csv
 import shutil
+import fnmatch
+import tempfile
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # Third-party library imports
 import zipfile
@@ -53,8 +58,7 @@ def move_files_by_type(start_folder, destination_folder, file_type):
     destination_folder = os.path.normpath(destination_folder) + os.sep
 
     # Create the destination folder if it doesn't exist
-    if not os.path.exists(destination_folder):
-        os.makedirs(destination_folder)
+    os.makedirs(destination_folder, exist_ok=True)
 
     # Get a list of all files in the starting folder (surface level only)
     files = os.listdir(start_folder)
@@ -84,7 +88,8 @@ def del_file(file_path):
 
 def delete_folder_with_contents(folder_name):
     """
-    Deletes a folder along with all of its contents.
+    Deletes a folder along with all of its contents. A link to a folder, such as a product in a product store, is
+    removed without touching the folder it points to.
 
     Args:
         folder_name (str): Path of the folder to be deleted.
@@ -94,35 +99,92 @@ def delete_folder_with_contents(folder_name):
     """
 
     try:
+        if (os.path.islink(folder_name)):
+            os.remove(folder_name)
+            return
         shutil.rmtree(folder_name)
         print(f"Folder '{folder_name}' and its contents have been deleted successfully.")
     except Exception as e:
         print(f"An error occurred while deleting '{folder_name}': {e}")
 
 
-def unzip_all_zip_files(directory):
+def unzip_all_zip_files(directory, members=None, max_workers=1):
     """
     Unzip all the .zip files in a directory and remove the original zip files (optional).
 
     Args:
         directory (str): Path to the directory containing .zip files.
+        members (list): Patterns, such as '*_radiance.nc', matched against the file name of each member. Only
+            matching members are extracted, see 'extract_zip_members()'. Default is None, every member.
+        max_workers (int): Number of zip files extracted at once. Default is 1.
 
     Returns:
         None
     """
 
-    # Iterate through all the files in the directory
-    for filename in os.listdir(directory):
-        filepath = os.path.join(directory, filename)
+    # Every zip file in the directory
+    zip_paths = [os.path.join(directory, filename) for filename in os.listdir(directory)
+                 if filename.lower().endswith(".zip")]
 
-        # Check if the current item is a zip file
-        if filename.lower().endswith(".zip"):
-            # Create a ZipFile object and extract its contents
-            with zipfile.ZipFile(filepath, 'r') as zip_ref:
-                zip_ref.extractall(directory)
+    def unzip(filepath):
+        extract_zip_members(filepath, directory, members=members)
 
-            # Remove the original zip file if desired (optional)
-            os.remove(filepath)
+        # Remove the original zip file if desired (optional)
+        os.remove(filepath)
+
+    if (max_workers <= 1 or len(zip_paths) <= 1):
+        for filepath in zip_paths:
+            unzip(filepath)
+        return
+
+    # Inflating releases the GIL, so zip files are extracted in parallel by threads
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(unzip, zip_paths))
+
+
+def extract_zip_members(zip_path, directory, members=None, chunk_size=1024 * 1024):
+    """
+    Extract the members of a zip file whose file name matches one of the patterns. Each member is streamed
+    straight to its destination, under a temporary name until complete, rather than the whole archive being
+    inflated. Members that would be written outside of 'directory' are skipped.
+
+    Args:
+        zip_path (str): Path to the zip file.
+        directory (str): Path to the directory the members are extracted into, keeping their paths in the zip.
+        members (list): Patterns matched against the file name of each member, such as '*_radiance.nc'.
+            Default is None, every member.
+        chunk_size (int): Number of bytes copied at a time. Default is 1 MiB.
+
+    Returns:
+        list: Paths of the extracted files.
+    """
+
+    root = os.path.abspath(directory)
+    extracted = []
+
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            if (info.is_dir()):
+                continue
+
+            filename = os.path.basename(info.filename)
+            if (members is not None and not any(fnmatch.fnmatch(filename, pattern) for pattern in members)):
+                continue
+
+            target = os.path.abspath(os.path.join(root, info.filename))
+            if (os.path.commonpath([root, target]) != root):
+                print(f"Error: skipping '{info.filename}' in '{zip_path}', it is outside of '{directory}'.")
+                continue
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            with zip_ref.open(info) as source, open(target + '.partial', 'wb') as destination:
+                shutil.copyfileobj(source, destination, chunk_size)
+            os.replace(target + '.partial', target)
+
+            extracted.append(target)
+
+    return extracted
 
 
 def create_batch_folders_absolute_path(file_path):
@@ -141,30 +203,27 @@ def create_batch_folders_absolute_path(file_path):
         os.makedirs(folder_path)
 
 
-def create_batch_folders(save_path, root_path = os.getcwd()):
+def create_batch_folders(save_path, root_path=None):
     """
     Create a series of nested folders based on the provided file path.
 
     Args:
         save_path (str): Path to the file, including the filename at the end.
+        root_path (str): Folder the path is relative to (default is None, the working directory at the time of
+            the call).
 
     Returns:
         None
     """
 
+    if (root_path is None):
+        root_path = os.getcwd()
+
     # Get only deeper folders
     save_path = mf.remove_overlap(root_path, save_path)
 
-    folders = save_path.split('/')  # Gets names of required folders
-
-    for i in range(len(folders) - 1):
-        tmp_path = os.path.join(*list(folders[:i + 1]))
-        if (i > 0):
-            tmp_path2 = os.path.join(*list(folders[:i]))
-        else:
-            tmp_path2 = ''
-        if (not os.path.exists(tmp_path)):
-            create_folder(tmp_path2, folders[i])
+    folder_path = os.path.dirname(os.path.join(root_path, save_path))
+    os.makedirs(folder_path, exist_ok=True) # Creates every folder along the path
 
 
 def create_folder(path, folder_name, do_prints=False):
@@ -185,8 +244,8 @@ def create_folder(path, folder_name, do_prints=False):
 
     # Check if the folder already exists
     if not os.path.exists(folder_path):
-        # Create the folder
-        os.makedirs(folder_path)
+        # Create the folder, another thread may be creating it at the same time
+        os.makedirs(folder_path, exist_ok=True)
         if (do_prints):
             print(f"Folder '{folder_name}' created at '{folder_path}'")
     else:
@@ -312,7 +371,8 @@ def sort_csv_by_date(csv_file):
         None
     """
 
-    temp_file = 'temp.csv'
+    # Temporary file goes next to the csv with a unique name, so concurrent runs don't collide
+    file_descriptor, temp_file = tempfile.mkstemp(suffix='.csv', dir=os.path.dirname(os.path.abspath(csv_file)))
 
     with open(csv_file, 'r') as file:
         reader = csv.reader(file)
@@ -321,12 +381,12 @@ def sort_csv_by_date(csv_file):
         header = rows[0]
         data = rows[1:]
 
-        sorted_data = sorted(data, key=lambda x: datetime.strptime(eval(x[0])[0], '%Y-%m-%d'))
+        sorted_data = sorted(data, key=lambda x: datetime.strptime(ast.literal_eval(x[0])[0], '%Y-%m-%d'))
 
         sorted_rows = [header] + sorted_data
 
-        with open(temp_file, 'w', newline='') as outfile:
+        with os.fdopen(file_descriptor, 'w', newline='') as outfile:
             writer = csv.writer(outfile)
             writer.writerows(sorted_rows)
 
-    shutil.move(temp_file, csv_file)
+    os.replace(temp_file, csv_file)
@@ -0,0 +1,240 @@
+"""
+File: manifest_functions.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the functions for run manifests. A manifest is a JSON file recording, for every
+             time slot of a model run, which stages have completed along with checksums of what they produced, so
+             an interrupted run can resume from the last completed stage rather than from the first time slot.
+
+Contents:
+    - open_manifest: Function that loads a manifest, or starts a new one.
+    - save_manifest: Function that atomically writes a manifest to disk.
+    - manifest_slot_key: Function that returns the key of a time slot in a manifest.
+    - manifest_record_stage: Function that records a stage of a time slot as complete.
+    - manifest_stage_done: Function that checks if a stage of a time slot is complete and its outputs are intact.
+    - manifest_resume_stage: Function that returns the first stage of a time slot that still has to run.
+    - manifest_output: Function that returns the path of an output recorded for a stage.
+    - path_checksum: Function that computes the checksum of a file or folder.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+import os
+import json
+import time
+import hashlib
+import tempfile
+
+# Third-party library imports
+
+
+# Local module imports
+import utils.misc_functions as mf
+
+# Stages of a time slot, in the order they run
+manifest_stages = ['downloaded', 'corrected', 'converted', 'modelled', 'cleaned']
+
+
+def open_manifest(manifest_path, resume=True):
+    """
+    Load the manifest at the passed path. A new, empty, manifest is returned if the file doesn't exist or
+    'resume' is False.
+
+    Args:
+        manifest_path (str): Path to the manifest file.
+        resume (bool): If False the existing manifest is ignored, and replaced once saved (default is True).
+
+    Returns:
+        dict: The manifest.
+    """
+
+    if (resume and os.path.isfile(manifest_path)):
+        try:
+            with open(manifest_path, 'r') as file:
+                return json.load(file)
+        except ValueError:
+            print(f"Error: manifest '{manifest_path}' could not be read, starting a new one.")
+
+    return {'slots': {}}
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    Write a manifest to disk. It is written to a temporary file in the same folder which then replaces the
+    manifest, so a crash never leaves a partially written manifest behind.
+
+    Args:
+        manifest (dict): The manifest.
+        manifest_path (str): Path to the manifest file.
+
+    Returns:
+        None
+    """
+
+    mf.folder_creation_manage(manifest_path) # Creates folders leading up to file
+
+    file_descriptor, temp_path = tempfile.mkstemp(suffix='.json', dir=os.path.dirname(os.path.abspath(manifest_path)))
+
+    with os.fdopen(file_descriptor, 'w') as file:
+        json.dump(manifest, file, indent=1)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp_path, manifest_path)
+
+
+def manifest_slot_key(date_tuple):
+    """
+    Get the key of a time slot in a manifest.
+
+    Args:
+        date_tuple (tuple): Start and end dates of the time slot.
+
+    Returns:
+        str: The key, '<start>_<end>'.
+    """
+
+    return str(date_tuple[0]) + '_' + str(date_tuple[1])
+
+
+def manifest_record_stage(manifest,  # The manifest.
+                          manifest_path,  # Path to the manifest file.
+                          slot,  # Key of the time slot.
+                          stage,  # Stage that completed.
+                          outputs=None  # Maps output names to the paths the stage produced.
+                          ):
+    """
+    Record a stage of a time slot as complete, along with the checksum of each output, and save the manifest.
+    Any later stages recorded for the time slot are cleared, as they were based on the previous outputs.
+
+    Args:
+        manifest (dict): The manifest.
+        manifest_path (str): Path to the manifest file.
+        slot (str): Key of the time slot, see 'manifest_slot_key()'.
+        stage (str): Stage that completed, one of 'manifest_stages'.
+        outputs (dict): Maps output names to the file or folder paths the stage produced (default is None).
+
+    Returns:
+        None
+    """
+
+    slot_stages = manifest['slots'].setdefault(slot, {})
+
+    for later_stage in manifest_stages[manifest_stages.index(stage) + 1:]:
+        slot_stages.pop(later_stage, None)
+
+    slot_stages[stage] = {
+        'time': time.time(),
+        'outputs': {name: {'path': os.path.abspath(path), 'checksum': path_checksum(path)}
+                    for name, path in (outputs or {}).items()},
+    }
+
+    save_manifest(manifest, manifest_path)
+
+
+def manifest_stage_done(manifest, slot, stage, verify=True):
+    """
+    Check if a stage of a time slot is complete. With 'verify', each output recorded for the stage must also
+    still exist with the same checksum.
+
+    Args:
+        manifest (dict): The manifest.
+        slot (str): Key of the time slot.
+        stage (str): Stage to check.
+        verify (bool): Whether to check the outputs against their checksums (default is True).
+
+    Returns:
+        bool: True if the stage is complete, False otherwise.
+    """
+
+    record = manifest['slots'].get(slot, {}).get(stage)
+
+    if (record is None):
+        return False
+
+    if (verify):
+        for output in record['outputs'].values():
+            if (not os.path.exists(output['path']) or path_checksum(output['path']) != output['checksum']):
+                return False
+
+    return True
+
+
+def manifest_resume_stage(manifest, slot):
+    """
+    Get the first stage of a time slot that still has to run. A time slot that was cleaned is finished, as the
+    outputs of its earlier stages were deleted on purpose. One that was modelled only has to be cleaned, as a run
+    stopped while cleaning may already have deleted some of the earlier outputs.
+
+    Args:
+        manifest (dict): The manifest.
+        slot (str): Key of the time slot.
+
+    Returns:
+        str: The first stage to run, or None if the time slot is finished.
+    """
+
+    if (manifest_stage_done(manifest, slot, 'cleaned', verify=False)):
+        return None
+
+    if (manifest_stage_done(manifest, slot, 'modelled')):
+        return 'cleaned'
+
+    for stage in manifest_stages:
+        if (not manifest_stage_done(manifest, slot, stage)):
+            return stage
+
+    return None
+
+
+def manifest_output(manifest, slot, stage, name):
+    """
+    Get the path of an output recorded for a stage of a time slot.
+
+    Args:
+        manifest (dict): The manifest.
+        slot (str): Key of the time slot.
+        stage (str): Stage that produced the output.
+        name (str): Name of the output.
+
+    Returns:
+        str: Path of the output, or None if it wasn't recorded.
+    """
+
+    output = manifest['slots'].get(slot, {}).get(stage, {}).get('outputs', {}).get(name)
+
+    return output['path'] if output is not None else None
+
+
+def path_checksum(path, chunk_size=1024 * 1024):
+    """
+    Compute the checksum of a file or folder. Files are hashed by their contents, folders by the relative path
+    and size of every file within them, as hashing every byte of a downloaded snapshot would take longer than
+    downloading it again.
+
+    Args:
+        path (str): Path to the file or folder.
+        chunk_size (int): Number of bytes read at a time (default is 1 MiB).
+
+    Returns:
+        str: The SHA-256 checksum as hex.
+    """
+
+    checksum = hashlib.sha256()
+
+    if (os.path.isdir(path)):
+        for root, dirs, files in os.walk(path):
+            dirs.sort() # Walks the folders in a fixed order
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                checksum.update(f"{os.path.relpath(file_path, path)}:{os.path.getsize(file_path)}\n".encode())
+        return checksum.hexdigest()
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            checksum.update(chunk)
+
+    return checksum.hexdigest()
@@ -9,10 +9,12 @@ Contents:
     - folder_creation_manage: Function that decides which folder creation function to use.
     - remove_file_extension: Function to remove file extension.
     - find_files_with_strings: Function that finds files in folders with given strings in their name.
+    - map_bands_to_files: Function that maps band names to the files holding them.
     - most_recent_folders: Function to determine the newest folders of passed folders.
     - most_recent_folder: Function to determine the newest folder of passed folders.
     - get_surface_level_folders: Function that returns the name of folders present at the surface level of passed path.
     - bbox_to_WKT: Function to convert bbox to WKT format.
+    - union_bbox: Function that returns the smallest bbox containing every passed bbox.
     - sort_list_b_based_on_list_a: Function to sort list.
     - remove_overlap: Function to make an absolute path into a local path.
     - make_absolute_paths: Function that turns local paths into absolute paths, operates on lists.
@@ -90,6 +92,31 @@ def find_files_with_strings(folder_path, search_strings):
     return matching_files
 
 
+def map_bands_to_files(folder_path, name, bands, extension='.npy'):
+    """
+    Map band names to the files holding them, named '<name><band><extension>' as written by 'convert_nc_to_npy()'.
+    Unlike 'find_files_with_strings()' the result is keyed by band, so it doesn't depend on the file order.
+
+    Args:
+        folder_path (str): Path to the folder holding the files.
+        name (str): Name every file starts with, such as the snapshot name.
+        bands (list): Names of the bands to find.
+        extension (str): File extension of the files (default is '.npy').
+
+    Returns:
+        dict: Maps each band found to its file path, bands without a file are left out.
+    """
+
+    band_files = {}
+
+    for band in bands:
+        path = os.path.join(folder_path, name + band + extension)
+        if os.path.isfile(path):
+            band_files[band] = path
+
+    return band_files
+
+
 def most_recent_folders(folder_paths, num_folders=1):
     """
     Fetches the most recently created folders and returns their absolute paths.
@@ -192,6 +219,23 @@ def bbox_to_WKT(bbox):
     return wkt_bbox
 
 
+def union_bbox(bboxes):
+    """
+    Get the smallest bounding box containing every passed bounding box.
+
+    Args:
+        bboxes (list of tuple): Bounding boxes as tuples (min_x, min_y, max_x, max_y).
+
+    Returns:
+        tuple: The bounding box containing them all.
+    """
+
+    bboxes = list(bboxes)
+
+    return (min(bbox[0] for bbox in bboxes), min(bbox[1] for bbox in bboxes),
+            max(bbox[2] for bbox in bboxes), max(bbox[3] for bbox in bboxes))
+
+
 def sort_list_b_based_on_list_a(a, b):
     """
     Sort the elements in list 'b' based on their order in list 'a'.
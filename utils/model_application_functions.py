@@ -7,9 +7,19 @@ Description: Module containing functions to apply models for use in obtaining va
 
 Contents:
     - model_routine_space_eff: Function to perform core of model execution, while deleting files.
+    - staged_download: Function that downloads a time slot into a staging folder, then moves it into place.
+    - model_routine_multi_site: Function to perform core of model execution for many sites, correcting each
+        snapshot once for every site it covers, while deleting files.
     - model_routine: Function to perform core of model execution, does not delete files.
-    - convert_eff: Function to convert output from POLYMER (NetCDF) to NumPy files.
-    - calculate_and_save_result: Function to perform linear model on npy file.
+    - model_routine_pipelined: Function to perform core of model execution with download, correction and cleanup
+        overlapped, while deleting files.
+    - pipeline_download_stage: Function that downloads every time slot ahead of the correction stage.
+    - pipeline_model_stage: Function that runs the model on corrected snapshots alongside the correction stage.
+    - pipeline_consume: Function that moves the files of a time slot aside to be deleted.
+    - pipeline_cleanup_stage: Function that deletes consumed files in the background.
+    - convert_eff: Function to hand output from POLYMER (NetCDF) to a model, optionally as NumPy files.
+    - apply_models: Function to compute several models in one pass over a snapshot's bands.
+    - calculate_and_save_result: Function to perform linear model on npy files or band arrays.
 
 
 Notes:
@@ -18,9 +28,14 @@ Notes:
 
 # Standard library imports
 import os
+import queue
+import shutil
+import functools
+import threading
 
 # Third-party library imports
 import numpy as np
+import netCDF4 as nc
 
 # Local module imports
 import utils.misc_functions as mf
@@ -28,59 +43,394 @@ import local_sentinelsat.sentinelsat_manage_functions as smf
 import utils.polymer_functions as pf
 import utils.io_functions as io
 import utils.file_conversion_functions as fcf
+import utils.band_math_functions as bmf
+import utils.manifest_functions as mfn
+import utils.workspace_functions as wsf
+import utils.product_store_functions as pstf
 import models.model_functions as mmf
+import models.model_registry as mr
 from config import *
 
-def model_routine_space_eff(bbox, date_tuples, project_name, model, poly_dir, request_function, npy_save_to=None):
+def model_routine_space_eff(bbox, date_tuples, project_name, model, poly_dir, request_function, npy_save_to=None,
+                            use_roi=False, roi_margin=10, polymer_worker=None, variables=None, export_npy=False,
+                            resume=True, manifest_path=None, extract_members=None, store=None, disk_budget=None,
+                            workspace=None, snapshot_bytes=1024 ** 3, output_bytes=256 * 1024 ** 2):
     """
     This function handles downloading, unzipping and moving files,
     before then running POLYMER on them, calling the specified model,
     then deleting the raw nc files and data to save on storage.
+    Each stage completed for a time slot is recorded in a manifest, so a rerun after a crash continues from the
+    last completed stage. Downloads and POLYMER outputs are written under temporary names and only renamed into
+    place once complete, so a partial file is never mistaken for a finished one.
 
     Args:
         bbox (tuple): Bounding box coordinates.
         date_tuples (list of tuples): List of date tuples for the time periods.
         project_name (str): Name of the project.
-        model (str): Name of the model to be called.
+        model (function or list): Model function to be called, or a list of models computed together in a single
+            pass over the bands, each a name in 'mr.model_registry' or a spec dict. POLYMER is then only asked
+            for the datasets these models need.
         poly_dir (str): Path to the directory where POLYMER will operate.
         request_function (function): Function to call for downloading files.
         npy_save_to (str): Path to save npy files. Default is None.
         polymer_root_name (str): Root name of POLYMER executable. Default is 'polymer-v4.16.1'.
+        use_roi (bool): If True POLYMER is only run on the pixel window covering the bounding box,
+            rather than the whole snapshot. Default is False.
+        roi_margin (int): Number of pixels added around the bounding box window. Default is 10.
+        polymer_worker (dict): A worker from 'start_polymer_worker()', so POLYMER isn't started again for every
+            snapshot. Default is None.
+        variables (list): Names of the POLYMER output variables the model reads, such as 'mmf.chlor_bands'. Only
+            these are written by POLYMER, passed to the model and converted to npy files. Default is None, the
+            bands declared for a model function registered in 'mr.model_registry', otherwise every variable.
+        export_npy (bool): If True the variables are also written out as npy files, for debugging, the model
+            reads straight from the POLYMER output either way. Default is False.
+        extract_members (list): Patterns of the files extracted from each downloaded zip, such as
+            'pf.polymer_olci_members()', so files POLYMER never reads aren't inflated to disk. Default is None,
+            every file.
+        resume (bool): If True stages recorded in an existing manifest, with intact outputs, are skipped. If False
+            every time slot is run again and the manifest replaced. Default is True.
+        manifest_path (str): Path of the manifest file. Default is None, '<project_name>_manifest.json' in
+            'poly_dir'.
+        store (dict): A product store from 'pstf.open_product_store()', shared with other projects and farms. Each
+            snapshot and its POLYMER output are then fetched into the store once and linked into 'poly_dir', the
+            cleanup only removing the links. 'request_function' must take 'store' and 'members' keywords, as
+            'rf.get_olci_singular()' does. Default is None.
+        disk_budget (int): Bytes the downloaded and intermediate files may use. When passed a download, or POLYMER
+            or npy output, only starts once it fits, and the cleanup marks files consumed rather than deleting
+            them, so a snapshot or POLYMER output still kept is reused. Default is None, no budget.
+        workspace (dict): A workspace from 'wsf.create_workspace()', to share one disk budget with other runs.
+            Consumed files are left in it when the run ends, 'wsf.workspace_clear()' deletes them. Default is None.
+        snapshot_bytes (int): Bytes a downloaded snapshot is expected to use, reserved before each download when
+            there is a budget. Default is 1 GiB.
+        output_bytes (int): Bytes the POLYMER output, or the npy files, of a snapshot are expected to use, reserved
+            before they are written when there is a budget. Default is 256 MiB.
 
     Returns:
         None
     """
 
+    shared_workspace = workspace is not None
+    if (workspace is None and disk_budget is not None):
+        workspace = wsf.create_workspace(disk_budget)
+
     mf.folder_creation_manage(poly_dir) # Creates the folders needed along the passed path
 
     if (npy_save_to == None):  # Default folder for npy files, this is so POLYMER doesnt get upset
         npy_save_to = project_name + '_' + 'npyFiles'
 
+    if (variables is None and callable(model)): # A registered model function only reads its declared bands
+        variables = mr.model_function_bands(model)
+
+    # Only the datasets the models read are written by POLYMER
+    datasets = mr.required_datasets(None if callable(model) else model, variables)
+
+    poly_dir_abs = os.path.abspath(poly_dir)
+    staging_dir = os.path.join(poly_dir_abs, project_name + '_staging') # Downloads still in progress
+
+    if (manifest_path == None):
+        manifest_path = os.path.join(poly_dir_abs, project_name + '_manifest.json')
+
+    manifest = mfn.open_manifest(manifest_path, resume=resume)
+
+    if (store is not None): # Snapshots are downloaded into the store, or linked from it
+        request_function = functools.partial(request_function, store=store, members=extract_members)
+
     for i in range(len(date_tuples)): # Loops through dates
 
-        date_tuple = [(str(date_tuples[i][0]), str(date_tuples[i][1]))] # Isolates single date
+        date_tuple = (str(date_tuples[i][0]), str(date_tuples[i][1])) # Isolates single date
+        slot = mfn.manifest_slot_key(date_tuple)
+
+        stage = mfn.manifest_resume_stage(manifest, slot)
+
+        if (stage == None):
+            print(f"Time slot '{slot}' was already completed, skipping.")
+            continue
+
+        if (stage == 'downloaded'):
+            if (workspace is not None):
+                wsf.workspace_admit(workspace, snapshot_bytes) # Waits for space
+
+            folder = staged_download(bbox, date_tuple, staging_dir, poly_dir_abs, request_function,
+                                     members=extract_members, store=store, workspace=workspace)
+
+            if (workspace is not None and folder is not None): # Now counted by its size rather than the reservation
+                wsf.workspace_track(workspace, folder, 'snapshot', reserved_bytes=snapshot_bytes)
+            elif (workspace is not None):
+                wsf.workspace_release(workspace, snapshot_bytes)
+
+            if (folder == None):
+                print(f"Error: nothing was downloaded for '{slot}', skipping.")
+                continue
+            mfn.manifest_record_stage(manifest, manifest_path, slot, 'downloaded', {'snapshot': folder})
+            stage = 'corrected'
+
+        folder = mfn.manifest_output(manifest, slot, 'downloaded', 'snapshot')
+        output_file = os.path.join(poly_dir_abs, os.path.basename(folder) + '.nc') # POLYMER output
+
+        if (stage == 'corrected'):
+            partial_file = output_file + '.partial' # Only renamed to 'output_file' once POLYMER has finished
+
+            if (store is not None): # Corrected once for every project using the same snapshot and options
+                options = {'datasets': datasets, 'roi': bbox if use_roi else None, 'roi_margin': roi_margin}
+                correct = lambda staging_dir: pf.call_polymer(
+                    folder, filename=os.path.join(staging_dir, os.path.basename(output_file)), overwrite=True,
+                    roi=options['roi'], roi_margin=roi_margin, worker=polymer_worker, datasets=datasets)
+
+                success = pstf.store_acquire(store, pstf.store_key(os.path.basename(folder), options), correct,
+                                             poly_dir_abs) is not None
+            elif (workspace is not None and wsf.workspace_reuse(workspace, output_file)):
+                print(f"Reusing the POLYMER output of '{os.path.basename(folder)}' kept in the workspace.")
+                success = True
+            else:
+                if (workspace is not None):
+                    wsf.workspace_admit(workspace, output_bytes) # Waits for space
+
+                success = pf.call_polymer(folder, filename=partial_file, overwrite=True,
+                                          roi=bbox if use_roi else None, roi_margin=roi_margin,
+                                          worker=polymer_worker, datasets=datasets)
+                success = success and os.path.isfile(partial_file)
+                if (success):
+                    os.replace(partial_file, output_file)
+
+                if (workspace is not None and success):
+                    wsf.workspace_track(workspace, output_file, 'nc', reserved_bytes=output_bytes)
+                elif (workspace is not None):
+                    wsf.workspace_release(workspace, output_bytes)
+
+            if (workspace is not None and store is not None): # A link into the store
+                wsf.workspace_track(workspace, output_file, 'nc')
+
+            if (not success):
+                print(f"Error: POLYMER did not finish '{slot}', skipping.")
+                continue
+
+            mfn.manifest_record_stage(manifest, manifest_path, slot, 'corrected', {'output': output_file})
+            stage = 'converted'
+
+        npy_dir = os.path.join(poly_dir_abs, npy_save_to)
+
+        if (stage in ['converted', 'modelled']):
+            if (workspace is not None and export_npy):
+                wsf.workspace_admit(workspace, output_bytes) # Waits for space
+
+            try:
+                results = convert_eff(poly_dir_abs, npy_save_to, model, variables=variables, export_npy=export_npy,
+                                      nc_paths=[output_file])
+            finally:
+                if (workspace is not None and export_npy): # Now counted by the tracked sizes instead
+                    for path in mf.find_files_with_strings(npy_dir, [os.path.basename(folder)]) \
+                            if os.path.isdir(npy_dir) else []:
+                        wsf.workspace_track(workspace, path, 'npy')
+                    wsf.workspace_release(workspace, output_bytes)
+
+            mfn.manifest_record_stage(manifest, manifest_path, slot, 'converted',
+                                      {'npy': npy_dir} if os.path.isdir(npy_dir) else None)
+
+            outputs = {}
+            for name, model_outputs in results.items():
+                for model_name, path in model_outputs.items():
+                    outputs[name + ':' + model_name] = path
+            mfn.manifest_record_stage(manifest, manifest_path, slot, 'modelled', outputs)
+
+        if (workspace is not None): # Kept for reuse until their space is needed, unless left by an earlier run
+            npy_paths = mf.find_files_with_strings(npy_dir, [os.path.basename(folder)]) \
+                if os.path.isdir(npy_dir) else []
+            for path in [folder, output_file] + npy_paths:
+                if (not wsf.workspace_consume(workspace, path)):
+                    wsf.delete_path(path)
+        else: # A run stopped while cleaning may already have deleted some of these
+            if (os.path.lexists(folder)):
+                io.delete_folder_with_contents(folder) # Deletes sentinel folder
+            if (os.path.exists(output_file)):
+                io.del_file(output_file) # Deletes polymer output file
+            if (os.path.isdir(npy_dir)): # Only exists if npy files were exported
+                io.delete_folder_with_contents(npy_dir) # Deletes the excess files generated by model
+
+        mfn.manifest_record_stage(manifest, manifest_path, slot, 'cleaned')
+
+    if (os.path.isdir(staging_dir)):
+        io.delete_folder_with_contents(staging_dir)
+
+    if (workspace is not None and not shared_workspace): # Left for other runs sharing the workspace to evict
+        wsf.workspace_clear(workspace)
+        if (os.path.isdir(os.path.join(poly_dir_abs, npy_save_to))): # Emptied, but for its cache file
+            io.delete_folder_with_contents(os.path.join(poly_dir_abs, npy_save_to))
+
+
+def staged_download(bbox, date_tuple, staging_dir, poly_dir, request_function, members=None, store=None,
+                    workspace=None):
+    """
+    Download the snapshot of a time slot into its own staging folder, then move it into 'poly_dir' once the
+    download is complete. A snapshot in 'poly_dir' is therefore never a partial download.
+
+    Args:
+        bbox (tuple): Bounding box coordinates.
+        date_tuple (tuple): Start and end dates of the time slot.
+        staging_dir (str): Absolute path of the folder downloads are staged in.
+        poly_dir (str): Absolute path of the directory where POLYMER will operate.
+        request_function (function): Function to call for downloading files.
+        members (list): Patterns of the files extracted from the downloaded zip. Default is None, every file.
+        store (dict): Product store the snapshot may be a link into, the link is then moved. Default is None.
+        workspace (dict): Workspace the snapshot may still be kept in from an earlier run, it is then reused and
+            the new download deleted. Default is None.
 
-        smf.sentinelsat_routine(bbox, date_tuple, poly_dir, request_function) # Calls the core function for sentinelsat
+    Returns:
+        str: Path of the snapshot folder in 'poly_dir', or None if nothing was downloaded.
+    """
 
-        filevals = mf.get_surface_level_folders(poly_dir)  # Gets a list of the downloaded folders
+    slot_dir = os.path.join(staging_dir, date_tuple[0] + '_' + date_tuple[1])
 
-        for i in range(len(filevals)):
-            filevals[i] = os.path.join(poly_dir, filevals[i])
+    if (os.path.isdir(slot_dir)): # Partial download from an interrupted run
+        io.delete_folder_with_contents(slot_dir)
 
-        folder = mf.most_recent_folder(filevals)
+    smf.sentinelsat_routine(bbox, [date_tuple], os.path.join(slot_dir, ''), request_function, members=members)
+
+    filevals = [os.path.join(slot_dir, f) for f in mf.get_surface_level_folders(slot_dir)]
+    download_folder = mf.most_recent_folder(filevals) # Only this time slot's download is in the folder
+
+    if (download_folder == None):
+        return None
+
+    target = os.path.join(poly_dir, os.path.basename(download_folder))
+    if (workspace is not None and wsf.workspace_reuse(workspace, target)): # Kept from an earlier run
+        io.delete_folder_with_contents(slot_dir)
+        return target
+    if (os.path.isdir(target)): # Left over from an interrupted run
+        io.delete_folder_with_contents(target)
+
+    folder = pstf.store_move(store, download_folder, target)
+    io.delete_folder_with_contents(slot_dir)
+
+    return folder
+
+def model_routine_multi_site(sites, date_tuples, project_name, model, poly_dir, request_function, npy_save_to=None,
+                             roi_margin=10, site_margin=0, polymer_worker=None, variables=None, export_npy=False,
+                             extract_members=None):
+    """
+    Version of 'model_routine_space_eff()' for many sites, such as neighbouring farms, at once. For each time slot
+    the snapshot covering the bounding box around every site is downloaded, and POLYMER is run once on the pixel
+    window covering the sites it holds. The models are then run on each site's crop of that single output. For a
+    site the snapshot doesn't cover, the best other snapshot covering it is downloaded, along with any further
+    sites that snapshot covers, so the cost grows with the number of snapshots rather than snapshots times sites.
+
+    Args:
+        sites (dict): Maps site names to bounding boxes.
+        date_tuples (list of tuples): List of date tuples for the time periods.
+        project_name (str): Name of the project.
+        model (function or list): Model function to be called, or a list of models computed together in a single
+            pass over the bands, each a name in 'mr.model_registry' or a spec dict. POLYMER is then only asked
+            for the datasets these models need.
+        poly_dir (str): Path to the directory where POLYMER will operate.
+        request_function (function): Function to call for downloading files. It must take an 'exclude' keyword,
+            the titles of the snapshots already used, as 'rf.get_olci_singular()' does.
+        npy_save_to (str): Path to save npy files. Default is None.
+        roi_margin (int): Number of pixels added around the window POLYMER is run on. Default is 10.
+        site_margin (int): Number of pixels added around each site's crop. Default is 0.
+        polymer_worker (dict): A worker from 'start_polymer_worker()', so POLYMER isn't started again for every
+            snapshot. Default is None.
+        variables (list): Names of the POLYMER output variables the model reads, such as 'mmf.chlor_bands'. Only
+            these are written by POLYMER, passed to the model and converted to npy files. Default is None, the
+            bands declared for a model function registered in 'mr.model_registry', otherwise every variable.
+        export_npy (bool): If True the variables are also written out as npy files, for debugging, the model
+            reads straight from the POLYMER output either way. Default is False.
+        extract_members (list): Patterns of the files extracted from each downloaded zip, such as
+            'pf.polymer_olci_members()'. Default is None, every file.
+
+    Returns:
+        dict: Maps each site name to its model outputs, keyed by '<snapshot>_<site>' then by model name.
+    """
+
+    poly_dir = os.path.abspath(poly_dir)
+    mf.folder_creation_manage(os.path.join(poly_dir, '')) # Creates the folders needed along the passed path
+
+    if (npy_save_to == None):  # Default folder for npy files, this is so POLYMER doesnt get upset
+        npy_save_to = project_name + '_' + 'npyFiles'
+
+    if (variables is None and callable(model)): # A registered model function only reads its declared bands
+        variables = mr.model_function_bands(model)
+
+    # Only the datasets the models read are written by POLYMER
+    datasets = mr.required_datasets(None if callable(model) else model, variables)
+
+    staging_dir = os.path.join(poly_dir, project_name + '_staging') # Downloads still in progress
+
+    results = {site: {} for site in sites}
+
+    for i in range(len(date_tuples)): # Loops through dates
+
+        date_tuple = (str(date_tuples[i][0]), str(date_tuples[i][1])) # Isolates single date
+
+        remaining = dict(sites) # Sites not yet covered by a snapshot of this time slot
+        snapshots = [] # Snapshots already downloaded for this time slot
+
+        while (remaining):
+            if (not snapshots): # Ranked by how much of every site's bounding box it covers
+                wanted = list(remaining)
+                function = request_function
+            else: # Ranked for a site still uncovered, passing over the snapshots already used
+                wanted = [next(iter(remaining))]
+                function = functools.partial(request_function,
+                                             exclude=[mf.remove_file_extension(snapshot) for snapshot in snapshots])
+
+            folder = staged_download(mf.union_bbox([remaining[site] for site in wanted]), date_tuple, staging_dir,
+                                     poly_dir, function, members=extract_members)
+
+            if (folder == None or os.path.basename(folder) in snapshots):
+                print(f"Error: no snapshot of '{date_tuple}' covers sites {wanted}, skipping them.")
+                if (folder != None): # Downloaded again, it has already been used
+                    io.delete_folder_with_contents(folder)
+                for site in wanted:
+                    remaining.pop(site)
+                continue
+            snapshots.append(os.path.basename(folder))
+
+            covered = {site: bbox for site, bbox in remaining.items()
+                       if pf.polymer_roi_window(folder, bbox, margin=0) is not None}
+
+            for site in covered:
+                remaining.pop(site)
+
+            if (not covered):
+                io.delete_folder_with_contents(folder)
+                if (len(wanted) == 1): # Another snapshot is tried for the other sites
+                    print(f"Error: no snapshot of '{date_tuple}' covers sites {wanted}, skipping them.")
+                    remaining.pop(wanted[0])
+                continue
+
+            output_file = os.path.join(poly_dir, os.path.basename(folder) + '.nc') # POLYMER output
+
+            # Corrected once, on the window around every site this snapshot covers
+            success = pf.call_polymer(folder, filename=output_file, overwrite=True,
+                                      roi=mf.union_bbox(covered.values()), roi_margin=roi_margin,
+                                      worker=polymer_worker, datasets=datasets)
+
+            if (success and os.path.isfile(output_file)):
+                outputs = convert_eff(poly_dir, npy_save_to, model, variables=variables, export_npy=export_npy,
+                                      nc_paths=[output_file], sites=covered, site_margin=site_margin)
+
+                for site in covered:
+                    crop_name = os.path.basename(folder) + '_' + site
+                    if (crop_name in outputs):
+                        results[site][crop_name] = outputs[crop_name]
+            else:
+                print(f"Error: POLYMER did not finish '{folder}', skipping sites {list(covered)}.")
 
-        pf.call_polymer(folder)
+            io.delete_folder_with_contents(folder) # Deletes sentinel folder
+            if (os.path.isfile(output_file)):
+                io.del_file(output_file) # Deletes polymer output file
+            if (os.path.isdir(os.path.join(poly_dir, npy_save_to))): # Only exists if npy files were exported
+                io.delete_folder_with_contents(os.path.join(poly_dir, npy_save_to))
+
+    if (os.path.isdir(staging_dir)):
+        io.delete_folder_with_contents(staging_dir)
 
-        convert_eff(poly_dir, npy_save_to, model)
+    return results
 
-        io.delete_folder_with_contents(folder) # Deletes sentinel folder
-        file = mf.find_files_with_strings(poly_dir, folder) # Finds polymer output file
-        io.del_file(file[0]) # Deletes found file
-        io.delete_folder_with_contents(os.path.join(poly_dir, npy_save_to)) # Deletes the excess files generated by model
 
 def model_routine(bbox, date_tuples, project_name, path, model, poly_dir, request_function,
                   del_sat_folder=False, del_poly_file=False, del_excess=False,
-                  npy_save_to=None):
+                  npy_save_to=None, use_roi=False, roi_margin=10, polymer_worker=None, variables=None,
+                  export_npy=False, extract_members=None):
     """
     Similar to 'model_routine_space_eff()', however, by default none of files are deleted.
     This would probably take up hundreds of gigabytes, even with a relatively small number of data points.
@@ -90,26 +440,48 @@ def model_routine(bbox, date_tuples, project_name, path, model, poly_dir, reques
         bbox (tuple): Bounding box coordinates.
         date_tuples (list of tuples): List of date tuples for the time periods.
         project_name (str): Name of the project.
-        model (str): Name of the model to be called.
+        model (function or list): Model function to be called, or a list of models computed together in a single
+            pass over the bands, each a name in 'mr.model_registry' or a spec dict. POLYMER is then only asked
+            for the datasets these models need.
         poly_dir (str): Path to the directory where POLYMER will operate.
         request_function (function): Function to call for downloading files.
         npy_save_to (str): Path to save npy files. Default is None.
         polymer_root_name (str): Root name of POLYMER executable. Default is 'polymer-v4.16.1'.
+        use_roi (bool): If True POLYMER is only run on the pixel window covering the bounding box,
+            rather than the whole snapshot. Default is False.
+        roi_margin (int): Number of pixels added around the bounding box window. Default is 10.
+        polymer_worker (dict): A worker from 'start_polymer_worker()', so POLYMER isn't started again for every
+            snapshot. Default is None.
+        variables (list): Names of the POLYMER output variables the model reads, such as 'mmf.chlor_bands'. Only
+            these are written by POLYMER, passed to the model and converted to npy files. Default is None, the
+            bands declared for a model function registered in 'mr.model_registry', otherwise every variable.
+        export_npy (bool): If True the variables are also written out as npy files, for debugging, the model
+            reads straight from the POLYMER output either way. Default is False.
+        extract_members (list): Patterns of the files extracted from each downloaded zip, such as
+            'pf.polymer_olci_members()', so files POLYMER never reads aren't inflated to disk. Default is None,
+            every file.
 
     Returns:
         None
     """
 
+    poly_dir = os.path.abspath(poly_dir)
+
     if (npy_save_to == None):  # Default folder for npy files, this is so POLYMER doesnt get upset
         npy_save_to = project_name + '_' + 'npyFiles'
 
+    if (variables is None and callable(model)): # A registered model function only reads its declared bands
+        variables = mr.model_function_bands(model)
+
+    # Only the datasets the models read are written by POLYMER
+    datasets = mr.required_datasets(None if callable(model) else model, variables)
+
     for i in range(len(date_tuples)):
 
         date_tuple = [(str(date_tuples[i][0]), str(date_tuples[i][1]))]
 
-        poly_dir2 = mf.remove_overlap(os.getcwd(), poly_dir)
-
-        smf.sentinelsat_routine(bbox, date_tuple, poly_dir2, request_function)
+        smf.sentinelsat_routine(bbox, date_tuple, os.path.join(poly_dir, ''), request_function,
+                                members=extract_members)
 
         filevals = mf.get_surface_level_folders(poly_dir)  # Gets a list of the downloaded folders
 
@@ -118,66 +490,509 @@ def model_routine(bbox, date_tuples, project_name, path, model, poly_dir, reques
 
         folder = mf.most_recent_folder(filevals)
 
-        pf.call_polymer(folder)
+        pf.call_polymer(folder, roi=bbox if use_roi else None, roi_margin=roi_margin, worker=polymer_worker,
+                        datasets=datasets)
 
-        convert_eff(poly_dir, npy_save_to, model)
+        convert_eff(poly_dir, npy_save_to, model, variables=variables, export_npy=export_npy)
 
         if (del_sat_folder):
             io.delete_folder_with_contents(folder) # Deletes sentinel folder
 
         if (del_poly_file):
-            file = mf.find_files_with_strings(poly_dir, folder) # Finds polymer output file
-            io.del_file(file[0]) # Deletes found file
+            file = mf.find_files_with_strings(poly_dir, [os.path.basename(folder)]) # Finds polymer output file
+            if (file):
+                io.del_file(file[0]) # Deletes found file
 
-        if (del_excess):
+        if (del_excess and os.path.isdir(os.path.join(poly_dir, npy_save_to))):
             io.delete_folder_with_contents(os.path.join(poly_dir, npy_save_to)) # Deletes the excess files generated by model
 
-def convert_eff(tmp_, npy_save_to, model_func):
+def model_routine_pipelined(bbox, date_tuples, project_name, model, poly_dir, request_function, npy_save_to=None,
+                            queue_depth=1, use_roi=False, roi_margin=10, polymer_worker=None, variables=None,
+                            export_npy=False, disk_budget=None, workspace=None, snapshot_bytes=1024 ** 3,
+                            extract_members=None, output_bytes=256 * 1024 ** 2):
+    """
+    Pipelined version of 'model_routine_space_eff()'. The next time slot's snapshot is downloaded while the current
+    one is being run through POLYMER, the model runs on the previous one, and the consumed files are deleted in
+    the background.
+    Each time slot is downloaded into its own folder, so the snapshot being corrected is never confused with one
+    that is still downloading.
+
+    Args:
+        bbox (tuple): Bounding box coordinates.
+        date_tuples (list of tuples): List of date tuples for the time periods.
+        project_name (str): Name of the project.
+        model (function or list): Model function to be called, or a list of models computed together in a single
+            pass over the bands, each a name in 'mr.model_registry' or a spec dict. POLYMER is then only asked
+            for the datasets these models need.
+        poly_dir (str): Path to the directory where POLYMER will operate.
+        request_function (function): Function to call for downloading files.
+        npy_save_to (str): Path to save npy files. Default is None.
+        queue_depth (int): Number of downloaded snapshots allowed to wait for correction. At most this many plus
+            four snapshots, one downloading, one being corrected, one waiting for the model and one being modelled,
+            are on disk at once. Default is 1.
+        use_roi (bool): If True POLYMER is only run on the pixel window covering the bounding box,
+            rather than the whole snapshot. Default is False.
+        roi_margin (int): Number of pixels added around the bounding box window. Default is 10.
+        polymer_worker (dict): A worker from 'start_polymer_worker()', so POLYMER isn't started again for every
+            snapshot. Default is None.
+        variables (list): Names of the POLYMER output variables the model reads, such as 'mmf.chlor_bands'. Only
+            these are written by POLYMER, passed to the model and converted to npy files. Default is None, the
+            bands declared for a model function registered in 'mr.model_registry', otherwise every variable.
+        export_npy (bool): If True the variables are also written out as npy files, for debugging, the model
+            reads straight from the POLYMER output either way. Default is False.
+        extract_members (list): Patterns of the files extracted from each downloaded zip, such as
+            'pf.polymer_olci_members()', so files POLYMER never reads aren't inflated to disk. Default is None,
+            every file.
+        disk_budget (int): Bytes the downloaded and intermediate files may use. When passed a download, or POLYMER
+            or npy output, only starts once it fits, and each file is tracked from when it is written. Consumed
+            files stay where they are until their space is needed, then are deleted least recently used first, and
+            a snapshot or POLYMER output still kept is reused rather than made again. Default is None, no budget.
+        workspace (dict): A workspace from 'wsf.create_workspace()', to share one disk budget with other runs.
+            Consumed files are left in it when the run ends, 'wsf.workspace_clear()' deletes them. Default is None.
+        snapshot_bytes (int): Bytes a downloaded snapshot is expected to use, reserved before each download when
+            there is a budget. Default is 1 GiB.
+        output_bytes (int): Bytes the POLYMER output, or the npy files, of a snapshot are expected to use, reserved
+            before they are written when there is a budget. Default is 256 MiB.
+
+    Returns:
+        None
+    """
+
+    shared_workspace = workspace is not None
+    if (workspace is None and disk_budget is not None):
+        workspace = wsf.create_workspace(disk_budget)
+
+    poly_dir = os.path.abspath(poly_dir) # The download thread must not depend on the working directory
+    mf.folder_creation_manage(os.path.join(poly_dir, '')) # Creates the folders needed along the passed path
+
+    if (npy_save_to == None):  # Default folder for npy files, this is so POLYMER doesnt get upset
+        npy_save_to = project_name + '_' + 'npyFiles'
+
+    if (variables is None and callable(model)): # A registered model function only reads its declared bands
+        variables = mr.model_function_bands(model)
+
+    # Only the datasets the models read are written by POLYMER
+    datasets = mr.required_datasets(None if callable(model) else model, variables)
+
+    prefetch_dir = os.path.join(poly_dir, project_name + '_prefetch') # Downloaded, waiting for correction
+    consumed_dir = os.path.join(poly_dir, project_name + '_consumed') # Corrected, waiting for deletion
+
+    downloaded = queue.Queue(maxsize=max(1, queue_depth))
+    corrected = queue.Queue(maxsize=1) # Corrected, waiting for the model
+    consumed = queue.Queue()
+    stop = threading.Event() # Set if the correction loop stops early, no more time slots are downloaded
+
+    downloader = threading.Thread(target=pipeline_download_stage,
+                                  args=(bbox, date_tuples, prefetch_dir, request_function, downloaded),
+                                  kwargs={'workspace': workspace, 'snapshot_bytes': snapshot_bytes,
+                                          'members': extract_members, 'stop': stop}, daemon=True)
+    modeller = threading.Thread(target=pipeline_model_stage,
+                                args=(corrected, consumed, poly_dir, consumed_dir, npy_save_to, model),
+                                kwargs={'variables': variables, 'export_npy': export_npy, 'workspace': workspace,
+                                        'output_bytes': output_bytes}, daemon=True)
+    cleaner = threading.Thread(target=pipeline_cleanup_stage, args=(consumed,), daemon=True)
+    downloader.start()
+    modeller.start()
+    cleaner.start()
+
+    item = ()
+    try:
+        while True:
+            item = downloaded.get()
+            if (item is None): # Every time slot has been downloaded
+                break
+
+            date_tuple, download_folder = item
+            if (download_folder is None):
+                print(f"Error: nothing was downloaded for '{date_tuple}', skipping.")
+                continue
+
+            folder = os.path.join(poly_dir, os.path.basename(download_folder))
+
+            if (workspace is not None and wsf.workspace_reuse(workspace, folder)): # Kept from an earlier run
+                wsf.workspace_release(workspace, snapshot_bytes) # The new download is deleted with its folder
+            else:
+                folder = shutil.move(download_folder, folder)
+                if (workspace is not None): # Now counted by its size rather than the reservation
+                    wsf.workspace_track(workspace, folder, 'snapshot', reserved_bytes=snapshot_bytes)
+            io.delete_folder_with_contents(os.path.dirname(download_folder))
+
+            output_file = os.path.join(poly_dir, os.path.basename(folder) + '.nc') # POLYMER output
+            partial_file = output_file + '.partial' # Only renamed to 'output_file' once POLYMER has finished
+
+            if (workspace is not None and wsf.workspace_reuse(workspace, output_file)):
+                print(f"Reusing the POLYMER output of '{os.path.basename(folder)}' kept in the workspace.")
+                success = True
+            else:
+                if (workspace is not None):
+                    wsf.workspace_admit(workspace, output_bytes) # Waits for space
+
+                success = pf.call_polymer(folder, filename=partial_file, overwrite=True,
+                                          roi=bbox if use_roi else None, roi_margin=roi_margin,
+                                          worker=polymer_worker, datasets=datasets)
+                success = success and os.path.isfile(partial_file)
+                if (success):
+                    os.replace(partial_file, output_file)
+
+                if (workspace is not None and success):
+                    wsf.workspace_track(workspace, output_file, 'nc', reserved_bytes=output_bytes)
+                elif (workspace is not None):
+                    wsf.workspace_release(workspace, output_bytes)
+
+            if (not success):
+                print(f"Error: POLYMER did not finish '{date_tuple}', skipping.")
+                partial_paths = mf.find_files_with_strings(poly_dir, [os.path.basename(folder)])
+                pipeline_consume(date_tuple, [folder] + partial_paths, consumed_dir, consumed, workspace=workspace)
+                continue
+
+            if (workspace is not None): # Corrected, so it may be evicted once its space is needed
+                wsf.workspace_consume(workspace, folder)
+
+            corrected.put((date_tuple, folder)) # The model runs while the next snapshot is corrected
+    finally:
+        corrected.put(None)
+        modeller.join()
+
+        stop.set()
+        while (item is not None): # Only when the loop stopped early, unblocks the downloader
+            item = downloaded.get()
+            if (item is not None and item[1] is not None and workspace is not None):
+                wsf.workspace_release(workspace, snapshot_bytes) # Deleted with the prefetch folder below
+        downloader.join()
+        io.delete_folder_with_contents(prefetch_dir)
+
+        consumed.put(None)
+        cleaner.join()
+
+    if (workspace is not None and shared_workspace): # Left for other runs sharing the workspace to evict
+        return
+
+    if (workspace is not None):
+        wsf.workspace_clear(workspace)
+        if (os.path.isdir(os.path.join(poly_dir, npy_save_to))): # Emptied by the workspace, but for its cache file
+            io.delete_folder_with_contents(os.path.join(poly_dir, npy_save_to))
+    io.delete_folder_with_contents(consumed_dir)
+
+
+def pipeline_download_stage(bbox, date_tuples, prefetch_dir, request_function, downloaded, workspace=None,
+                            snapshot_bytes=1024 ** 3, members=None, stop=None):
+    """
+    Download every time slot into its own folder, handing each snapshot to the correction stage through a
+    bounded queue. Blocks whenever the queue is full, or the snapshot doesn't fit in the workspace, which is what
+    limits the disk space used.
+
+    Args:
+        bbox (tuple): Bounding box coordinates.
+        date_tuples (list of tuples): List of date tuples for the time periods.
+        prefetch_dir (str): Absolute path of the folder the time slots are downloaded into.
+        request_function (function): Function to call for downloading files.
+        downloaded (queue.Queue): Queue receiving (date_tuple, snapshot folder) pairs, followed by None once
+            every time slot is done. The folder is None if the download failed.
+        workspace (dict): Workspace to reserve 'snapshot_bytes' in before each download. The reservation is given
+            back by the correction stage, or here if the download fails. Default is None.
+        snapshot_bytes (int): Bytes a downloaded snapshot is expected to use. Default is 1 GiB.
+        members (list): Patterns of the files extracted from each downloaded zip. Default is None, every file.
+        stop (threading.Event): Once set, no more time slots are downloaded. Default is None.
+
+    Returns:
+        None
+    """
+
+    try:
+        for i in range(len(date_tuples)):
+            if (stop is not None and stop.is_set()):
+                break
+
+            date_tuple = (str(date_tuples[i][0]), str(date_tuples[i][1]))
+            slot_dir = os.path.join(prefetch_dir, date_tuple[0] + '_' + date_tuple[1])
+
+            if (workspace is not None):
+                wsf.workspace_admit(workspace, snapshot_bytes) # Waits for space
+
+            try:
+                smf.sentinelsat_routine(bbox, [date_tuple], os.path.join(slot_dir, ''), request_function,
+                                        members=members)
+                filevals = [os.path.join(slot_dir, f) for f in mf.get_surface_level_folders(slot_dir)]
+                folder = mf.most_recent_folder(filevals)
+            except Exception as e:
+                print(f"Error: download of '{date_tuple}' failed: {e}")
+                folder = None
+
+            if (folder is None and workspace is not None):
+                wsf.workspace_release(workspace, snapshot_bytes)
+
+            downloaded.put((date_tuple, folder))
+    finally:
+        downloaded.put(None)
+
+
+def pipeline_model_stage(corrected,  # Queue of corrected snapshots.
+                         consumed,  # Queue of folders to delete.
+                         poly_dir,  # Absolute path of the directory where POLYMER operates.
+                         consumed_dir,  # Absolute path of the folder consumed files are moved to.
+                         npy_save_to,  # Folder name for npy files.
+                         model,  # Model function, or list of models.
+                         variables=None,  # Names of the variables the model reads.
+                         export_npy=False,  # Whether to also write npy files.
+                         workspace=None,  # Workspace the intermediate files are tracked in.
+                         output_bytes=256 * 1024 ** 2  # Bytes reserved for a snapshot's npy files.
+                         ):
+    """
+    Run the model on each corrected snapshot, then hand the snapshot and its outputs over to be deleted, see
+    'pipeline_consume()', until None is received. Runs in its own thread, alongside the correction of the next
+    snapshot.
+
+    Args:
+        corrected (queue.Queue): Queue of (date_tuple, snapshot folder) pairs, followed by None.
+        consumed (queue.Queue): Queue receiving the folders to delete.
+        poly_dir (str): Absolute path of the directory where POLYMER operates.
+        consumed_dir (str): Absolute path of the folder consumed files are moved to.
+        npy_save_to (str): Folder name for npy files.
+        model (function or list): Model function to be called, or a list of models, see 'convert_eff()'.
+        variables (list): Names of the POLYMER output variables the model reads (default is None).
+        export_npy (bool): If True the variables are also written out as npy files (default is False).
+        workspace (dict): Workspace the intermediate files are tracked in. The npy files only start once
+            'output_bytes' fit in it, and are kept rather than deleted at once (default is None).
+        output_bytes (int): Bytes the npy files of a snapshot are expected to use (default is 256 MiB).
+
+    Returns:
+        None
+    """
+
+    npy_dir = os.path.join(poly_dir, npy_save_to)
+
+    while True:
+        item = corrected.get()
+        if (item is None):
+            break
+
+        date_tuple, folder = item
+
+        # Nothing may stop this thread early, the correction loop would then wait on 'corrected' forever
+        try:
+            nc_paths = [path for path in mf.find_files_with_strings(poly_dir, [os.path.basename(folder)])
+                        if path.endswith('.nc')] # POLYMER output of this snapshot alone
+
+            if (workspace is not None and export_npy):
+                wsf.workspace_admit(workspace, output_bytes) # Waits for space
+
+            try:
+                convert_eff(poly_dir, npy_save_to, model, variables=variables, export_npy=export_npy,
+                            nc_paths=nc_paths)
+            except Exception as e:
+                print(f"Error: model failed on '{date_tuple}': {e}")
+
+            consumed_paths = [folder] + mf.find_files_with_strings(poly_dir, [os.path.basename(folder)])
+            if (workspace is None):
+                consumed_paths.append(npy_dir)
+            elif (export_npy): # Each snapshot's npy files are tracked on their own, the folder is shared
+                npy_paths = mf.find_files_with_strings(npy_dir, [os.path.basename(folder)]) \
+                    if os.path.isdir(npy_dir) else []
+                for path in npy_paths:
+                    wsf.workspace_track(workspace, path, 'npy')
+                wsf.workspace_release(workspace, output_bytes) # Now counted by the tracked sizes instead
+                consumed_paths += npy_paths
+
+            pipeline_consume(date_tuple, consumed_paths, consumed_dir, consumed, workspace=workspace)
+        except Exception as e:
+            print(f"Error: files of '{date_tuple}' could not be moved aside: {e}")
+
+
+def pipeline_consume(date_tuple, paths, consumed_dir, consumed, workspace=None):
+    """
+    Hand the files of a time slot that are no longer needed over to be deleted. Without a workspace they are moved
+    out of 'poly_dir', into the slot's folder within 'consumed_dir', renaming is quick and the slow deletion is
+    left to the cleanup thread. With one, the files it tracks are marked consumed where they are, so they can be
+    reused until their space is needed, and the rest, such as partial POLYMER output, are deleted.
+
+    Args:
+        date_tuple (tuple): Start and end dates of the time slot.
+        paths (list): Paths of the files and folders, those that don't exist are skipped.
+        consumed_dir (str): Absolute path of the folder consumed files are moved to.
+        consumed (queue.Queue): Queue receiving the slot's folder to delete, when there is no workspace.
+        workspace (dict): Workspace tracking the files (default is None).
+
+    Returns:
+        None
+    """
+
+    if (workspace is not None):
+        for path in paths:
+            if (not wsf.workspace_consume(workspace, path)):
+                wsf.delete_path(path)
+        return
+
+    slot_consumed_dir = os.path.join(consumed_dir, date_tuple[0] + '_' + date_tuple[1])
+    os.makedirs(slot_consumed_dir, exist_ok=True)
+
+    for path in paths:
+        if (os.path.exists(path)):
+            shutil.move(path, os.path.join(slot_consumed_dir, os.path.basename(path)))
+
+    consumed.put(slot_consumed_dir)
+
+
+def pipeline_cleanup_stage(consumed):
+    """
+    Delete the folders passed through a queue, until None is received.
+
+    Args:
+        consumed (queue.Queue): Queue of folder paths to delete.
+
+    Returns:
+        None
     """
-    Converts output from POLYMER (NetCDF) to NumPy files, calls a specified model,
-    and performs necessary directory changes.
+
+    while True:
+        path = consumed.get()
+        if (path is None):
+            break
+        io.delete_folder_with_contents(path)
+
+
+def convert_eff(tmp_, npy_save_to, model_func, variables=None, export_npy=False, nc_paths=None, sites=None,
+                site_margin=0):
+    """
+    Hands the output from POLYMER (NetCDF) to a specified model.
+    The model is called once per snapshot with the snapshot's variables as 'bands', read straight from the NetCDF
+    file into memory, so nothing is written to disk in between. Optionally the variables are also converted to
+    NumPy files, each snapshot at most once, see 'convert_nc_to_npy_cached()'.
+    Only absolute paths are used and the working directory is never changed, so several snapshots can be handled
+    at once from different threads, as long as each passes its own 'nc_paths'. The NetCDF library isn't thread
+    safe, so reading the outputs is done under 'pf.netcdf_lock', while the models run outside it.
 
     Args:
         tmp_ (str): Temporary directory where POLYMER output is stored.
         npy_save_to (str): Path to save NumPy files.
-        model_func (function): Specified model function to be called.
-        polymer_root_name (str): Root name of POLYMER directory.
+        model_func (function or list): Specified model function to be called, or a list of models computed in one
+            pass, see 'apply_models()'.
+        variables (list): Names of the variables passed to the model, the rest are skipped (default is None,
+            the bands the models, or a registered model function, declare, otherwise every variable).
+        export_npy (bool): If True the variables are also saved as NumPy files (default is False).
+        nc_paths (list): Paths of the POLYMER outputs to hand to the model (default is None, the outputs in
+            'tmp_', after moving over any POLYMER wrote to its own directory).
+        sites (dict): Maps site names to bounding boxes. When passed the model is run on each site's crop of
+            every output rather than the whole output, named '<snapshot>_<site>'. Sites an output doesn't cover
+            are skipped (default is None).
+        site_margin (int): Number of pixels added around each site's crop (default is 0).
 
     Returns:
-        None
+        dict: Maps the name of each snapshot, or of each snapshot's site crop, to the absolute paths of the model
+            outputs, keyed by model name. A model function's outputs are keyed by the function's name, and only
+            known if it returns a path.
     """
 
-    os.chdir(os.path.join(os.getcwd(), polymer_path)) # Change directory to that of polymer
+    results = {}
+
+    models = None
+    if (not callable(model_func)): # Several models computed in one pass
+        models = [mr.get_model_spec(model) for model in model_func]
+        if (variables is None):
+            variables = mr.required_bands(models)
+    elif (variables is None): # A registered model function only reads its declared bands
+        variables = mr.model_function_bands(model_func)
+
+    tmp_ = os.path.abspath(tmp_)
+
+    if (nc_paths is None):
+        io.move_files_by_type(polymer_path, tmp_, '.nc') # Moves the outputs POLYMER wrote to its own directory
+
+        filevals = mf.get_surface_level_folders(tmp_) # Gets a list of the downloaded folders
 
-    tmp_ = mf.remove_overlap(os.getcwd(), tmp_) # Turns into local file path
+        nc_paths = mf.find_files_with_strings(tmp_, filevals) # Get nc files output by POLYMER
 
-    io.move_files_by_type(os.getcwd(), tmp_, '.nc') # Moves the outputs from POLYMER
+    for path in nc_paths: # Runs the model on each nc file
+        name = os.path.basename(path)
+        name = name.rsplit('.', 1)[0]
 
-    filevals = mf.get_surface_level_folders(tmp_) # Gets a list of the downloaded folders
+        # The NetCDF library isn't thread safe, so only reading the output waits here, the models run outside it
+        with pf.netcdf_lock:
+            if (export_npy): # Debug copy of the variables
+                fcf.convert_nc_to_npy_cached(path, save_to=npy_save_to, variables=variables)
 
-    paths = mf.find_files_with_strings(tmp_, filevals) # Get nc files output by POLYMER to convert to npy
+            dataset = nc.Dataset(path)
+            dataset.set_auto_mask(False) # Plain arrays, the same values the npy files hold
 
-    for path in paths: # Creates npy files for all the parts of each nc file
-        fcf.convert_nc_to_npy(path, save_to=npy_save_to)
+            try:
+                names = dataset.variables.keys() if variables is None else variables
+                bands = {band: dataset.variables[band] for band in names if band in dataset.variables}
 
-    path = mf.most_recent_folder(paths)
+                if (sites is None): # Only the bands the model reads
+                    crops = {name: {band: fcf.read_variable(variable) for band, variable in bands.items()}}
+                else: # Each site's pixels only
+                    crops = {}
+                    for site, bbox in sites.items():
+                        window = pf.polymer_roi_window(path, bbox, margin=site_margin, geo_path=path)
+                        if (window is None):
+                            continue
+                        sline, eline, scol, ecol = window
+                        crops[name + '_' + site] = {band: variable[sline:eline, scol:ecol]
+                                                    for band, variable in bands.items()}
+            finally:
+                dataset.close()
 
-    fcf.convert_nc_to_npy(path, save_to=npy_save_to)
+        for crop_name, crop_bands in crops.items():
+            if (models is not None):
+                outputs = apply_models(tmp_, crop_name, crop_bands, models)
+            else:
+                output = model_func(polymer_path, tmp_, npy_save_to, crop_name, bands=crop_bands) # Calls the specified model
+                outputs = {model_func.__name__: output} if isinstance(output, str) else {}
 
-    name = mf.remove_overlap(tmp_, paths[0])
-    name = name.rsplit('.', 1)[0]
+            results[crop_name] = {model: os.path.abspath(output) for model, output in outputs.items()}
 
-    model_func(os.getcwd(), tmp_, npy_save_to, name) # Calls the specified model
+        crops = None # Frees the bands before the next snapshot is read
 
-    os.chdir(os.path.dirname(os.getcwd())) # Move back one directory, like with cd ..
+    return results
+
+
+def apply_models(tmp_, name, bands, models, block_rows=512):
+    """
+    Compute several models in one pass over a snapshot's bands, see 'bmf.evaluate_models()'. Each model's output
+    is written as a .npy file of the model's dtype, named after the snapshot, in the model's folder within 'tmp_'.
+
+    Args:
+        tmp_ (str): Temporary directory where POLYMER output is stored.
+        name (str): Name of the snapshot, used for the output files.
+        bands (dict): Maps band names to arrays, memory maps or NetCDF variables.
+        models (list): Names of registered models or specs, see 'mr.register_model()'.
+        block_rows (int): Number of rows evaluated at a time (default is 512).
+
+    Returns:
+        dict: Maps each model name to the path of its output file.
+    """
+
+    models = [mr.get_model_spec(model) for model in models]
+
+    bmf.check_bands(bands, mr.required_bands(models))
+
+    shape = bands[models[0]['bands'][0]].shape
+
+    save_paths = {}
+    outputs = []
+
+    for spec in models:
+        io.create_folder(tmp_, spec['folder'])
+        save_paths[spec['name']] = os.path.join(tmp_, spec['folder'], name + '.npy')
+        outputs.append(np.lib.format.open_memmap(save_paths[spec['name']], mode='w+', dtype=spec.get('dtype', np.float32),
+                                                      shape=shape))
+
+    bmf.evaluate_models(bands, models, outputs, block_rows=block_rows)
+
+    for out in outputs:
+        out.flush()
+    del outputs # Closes the memory maps
+
+    return save_paths
 
 
 def calculate_and_save_result(npy_files, float_list, name, saveLoc):
     """
-    Calculate a weighted sum using data from .npy files and save the result to a new .npy file.
+    Calculate a weighted sum using data from .npy files and save the result to a new float32 .npy file.
+    The files are matched to the weights by position, 'bmf.linear_combination_to_npy()' does the same by band name.
 
     Args:
-        npy_files (list): List of paths to .npy files containing data.
+        npy_files (list): List of paths to .npy files containing data, or of arrays (such as NetCDF variables)
+            to read the data from directly.
         float_list (list): List of floating-point weights for each .npy file.
         name (str): Name of the output .npy file (without extension).
         saveLoc (str): Directory where the output .npy file will be saved.
@@ -191,16 +1006,12 @@ def calculate_and_save_result(npy_files, float_list, name, saveLoc):
         print(f"float list: '{float_list}'")
         raise ValueError("The length of float_list should be one more than the number of npy_files.")
 
-    # Read the data from each .npy file and store it in a list
-    npy_data = [np.load(file_path) for file_path in npy_files]
-
-    # Perform the calculations
-    result = float_list[0]
-    for i in range(len(npy_data)):
-        result += float_list[i+1] * npy_data[i]
+    # Map each .npy file rather than reading it, so only the block being used is held in memory
+    bands = {i: np.load(item, mmap_mode='r') if isinstance(item, str) else item for i, item in enumerate(npy_files)}
+    coefficients = {i: float_list[i+1] for i in range(len(npy_files))}
 
     name = name + '.npy'
     savePath = os.path.join(saveLoc, name)
 
-    # Save the result to a new .npy file
-    np.save(savePath, result)
\ No newline at end of file
+    # Perform the calculations, block by block, straight into the new .npy file
+    bmf.linear_combination_to_npy(bands, coefficients, float_list[0], savePath)
\ No newline at end of file
@@ -8,6 +8,7 @@ Description: This module contains all the plotting functions for this project.
 Contents:
     - plot_ndarrays: Function to create a nice looking collection of npy files.
     - plot_csv_data: Function that plots data from a provided csv file.
+    - thumbnail_ndarray: Function that returns a downsampled copy of an ndarray, small enough to plot.
 
 Notes:
     - This code is distributed under the MIT License. See LICENSE.txt for more details.
@@ -160,3 +161,21 @@ def plot_csv_data(csv_path, down_path, column_name, ylabel, corner_text, title=N
 
     # Close the plot to free up resources
     plt.close()
+
+
+def thumbnail_ndarray(arr, max_side=512):
+    """
+    Downsample an ndarray by keeping every n-th row and column, so its longest side is at most 'max_side'. A copy
+    is returned, so the full array can be released while the thumbnail is kept for a figure.
+
+    Args:
+        arr (np.ndarray): Array to downsample.
+        max_side (int): Most rows or columns the thumbnail has (default is 512, above what a 4 inch subplot shows).
+
+    Returns:
+        np.ndarray: The thumbnail.
+    """
+
+    step = max(1, int(np.ceil(max(arr.shape[:2]) / max_side)))
+
+    return np.array(arr[::step, ::step])
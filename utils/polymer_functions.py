@@ -7,7 +7,13 @@ Description: This module contains the functions that interface with POLYMER.
 
 Contents:
 
+    - run_polymer_on_folder: Function to run polymer on every folder in a directory.
     - call_polymer: Function to run polymer on a singular folder.
+    - polymer_roi_window: Function that finds the pixel window of a snapshot covering a bounding box.
+    - polymer_olci_members: Function that returns the files of an OLCI snapshot POLYMER reads.
+    - start_polymer_worker: Function that starts a long running POLYMER worker.
+    - stop_polymer_worker: Function that shuts down a POLYMER worker.
+    - send_polymer_request: Function that sends a single request to a POLYMER worker and returns the reply.
 
 Notes:
     - This code is distributed under the MIT License. See LICENSE.txt for more details.
@@ -15,23 +21,45 @@ Notes:
 
 # Standard library imports
 import os
+import json
+import time
+import signal
+import socket
+import tempfile
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 # Third-party library imports
-
+import netCDF4 as nc
+import numpy as np
 
 # Local module imports
 import utils.misc_functions as mf
+import utils.workspace_functions as wsf
 from config import *
 
+netcdf_lock = threading.Lock() # The NetCDF library is not thread safe, reads from parallel jobs go through this
+
+# Radiance file of each OLCI band, keyed by its wavelength in nm
+olci_band_files = {400: 'Oa01', 412: 'Oa02', 443: 'Oa03', 490: 'Oa04', 510: 'Oa05', 560: 'Oa06', 620: 'Oa07',
+                   665: 'Oa08', 674: 'Oa09', 681: 'Oa10', 709: 'Oa11', 754: 'Oa12', 761: 'Oa13', 764: 'Oa14',
+                   767: 'Oa15', 779: 'Oa16', 865: 'Oa17', 885: 'Oa18', 900: 'Oa19', 940: 'Oa20', 1020: 'Oa21'}
+
+# Files of an OLCI snapshot, other than the radiances, that 'Level1_OLCI' reads
+olci_auxiliary_files = ['xfdumanifest.xml', 'geo_coordinates.nc', 'tie_geo_coordinates.nc', 'tie_geometries.nc',
+                        'tie_meteo.nc', 'instrument_data.nc', 'qualityFlags.nc', 'time_coordinates.nc']
+
 def run_polymer_on_folder(poly_dir, satellite_type=0, filetype=True, sline=None, eline=None, scol=None, ecol=None,
                           blocksize=None, resolution=None, ancillary=0, landmask=None, altitude=None, add_noise=None,
                           srf_file=None, use_srf=None, filename=None, ext=None, tmpdir=None, outdir=None, overwrite=None,
                           datasets=None, compress=None, format=None, multiprocessing=None, dir_base=None, calib=None,
-                          normalize=None):
+                          normalize=None, roi=None, roi_margin=10, max_jobs=1, cpu_budget=None, memory_budget=None,
+                          job_memory=4 * 1024 ** 3, deadline=None, workspace=None, output_bytes=256 * 1024 ** 2):
     """
     Calls the POLYMER algorithm on an entire folder of snapshots by calling a bash script in a subprocess that
     then calls a python script, which parses arguments before finally passing them to POLYMER.
+    Several snapshots can be run at once, limited by 'max_jobs' and by how many jobs fit in the cpu and memory budgets.
 
     Args:
         poly_dir (str): Directory containing folders with snapshots for POLYMER processing.
@@ -91,30 +119,109 @@ def run_polymer_on_folder(poly_dir, satellite_type=0, filetype=True, sline=None,
                 - 2: Apply wavelength normalization for MERIS and OLCI
                 - 3: Apply both geometry and wavelength normalization
             Default is None.
+        roi (tuple): Bounding box coordinates (min_lon, min_lat, max_lon, max_lat). When passed, and no line or
+            column limits are, POLYMER is only run on the pixel window covering the box. Default is None.
+        roi_margin (int): Number of pixels added around the window on every side. Default is 10.
+        max_jobs (int): Maximum number of snapshots processed at once. Default is 1, one after another.
+        cpu_budget (int): Number of CPUs the jobs may use in total, each job counting the threads set by
+            'multiprocessing'. Default is None, the number of CPUs on the local machine.
+        memory_budget (int): Bytes of memory the jobs may use in total. Default is None, no limit.
+        job_memory (int): Bytes of memory a single job is expected to use. Default is 4 GiB.
+        deadline (float): Seconds after which jobs still running are stopped and jobs not yet started are skipped.
+            Default is None, no deadline.
+        workspace (dict): A workspace from 'wsf.create_workspace()' sharing a disk budget with other stages. Each
+            job only starts once 'output_bytes' fit in it, each snapshot is marked consumed once corrected, so it
+            may be evicted, and the outputs found in 'outdir' are tracked. A snapshot whose outputs are still kept
+            in the workspace isn't corrected again. Default is None.
+        output_bytes (int): Bytes the output of a single job is expected to use. Default is 256 MiB.
 
     Returns:
-        None
+        dict: Maps each snapshot folder to 'success', 'failed' or 'timeout'.
     """
 
+    folders = []
     for folder in os.listdir(poly_dir):
         folder_path = os.path.join(poly_dir, folder)
         if os.path.isdir(folder_path):
             folder_name = os.path.basename(folder_path)
-            folder_name = os.path.join(poly_dir, folder_name)
+            folders.append(os.path.join(poly_dir, folder_name))
+
+    # Threads used by one job, as POLYMER reads 'multiprocessing': 0 is a single thread and negative is every CPU
+    if (not multiprocessing):
+        job_cpus = 1
+    elif (multiprocessing < 0):
+        job_cpus = os.cpu_count() or 1
+    else:
+        job_cpus = multiprocessing
+
+    jobs = min(max_jobs, (cpu_budget or os.cpu_count() or 1) // job_cpus)
+    if (memory_budget is not None):
+        jobs = min(jobs, memory_budget // job_memory)
+    jobs = max(1, jobs) # Always at least one, even if a single job is over budget
+
+    end_time = None if deadline is None else time.time() + deadline
+
+    if (workspace is not None):
+        for folder_name in folders:
+            wsf.workspace_track(workspace, folder_name, 'snapshot')
+
+    def run_job(folder_name):
+        if (end_time is not None and time.time() >= end_time):
+            return 'timeout'
+
+        if (workspace is not None and outdir is not None):
+            outputs = mf.find_files_with_strings(outdir, [os.path.basename(folder_name)])
+            if (outputs and all([wsf.workspace_reuse(workspace, output) for output in outputs])):
+                print(f"Reusing the POLYMER output of '{os.path.basename(folder_name)}' kept in the workspace.")
+                wsf.workspace_consume(workspace, folder_name)
+                return 'success'
+
+        if (workspace is not None):
+            if (not wsf.workspace_admit(workspace, output_bytes,
+                                        timeout=None if end_time is None else max(end_time - time.time(), 0))):
+                return 'timeout'
+            wsf.workspace_touch(workspace, folder_name)
 
-            call_polymer(folder_name, filetype=filetype, sline=sline, eline=eline, scol=scol, ecol=ecol, blocksize=blocksize,
-                            ancillary=ancillary, landmask=landmask, altitude=altitude, add_noise=add_noise, filename=filename,
-                            ext=ext, tmpdir=tmpdir, outdir=outdir, overwrite=overwrite, datasets=datasets, compress=compress,
-                            format=format, multiprocessing=multiprocessing, dir_base=dir_base, calib=calib, normalize=normalize)
+        success = call_polymer(folder_name, satellite_type=satellite_type, filetype=filetype, sline=sline, eline=eline,
+                               scol=scol, ecol=ecol, blocksize=blocksize, resolution=resolution, ancillary=ancillary,
+                               landmask=landmask, altitude=altitude, add_noise=add_noise, srf_file=srf_file,
+                               use_srf=use_srf, filename=filename, ext=ext, tmpdir=tmpdir, outdir=outdir,
+                               overwrite=overwrite, datasets=datasets, compress=compress, format=format,
+                               multiprocessing=multiprocessing, dir_base=dir_base, calib=calib, normalize=normalize,
+                               roi=roi, roi_margin=roi_margin,
+                               timeout=None if end_time is None else max(end_time - time.time(), 0))
+
+        if (workspace is not None):
+            if (success and outdir is not None):
+                for output in mf.find_files_with_strings(outdir, [os.path.basename(folder_name)]):
+                    wsf.workspace_track(workspace, output, 'nc')
+            if (success):
+                wsf.workspace_consume(workspace, folder_name)
+            wsf.workspace_release(workspace, output_bytes)
+
+        if (success):
+            return 'success'
+        if (end_time is not None and time.time() >= end_time):
+            return 'timeout'
+        return 'failed'
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor: # Each job is its own process, threads only wait on them
+        statuses = dict(zip(folders, executor.map(run_job, folders)))
+
+    for folder_name, status in statuses.items():
+        if (status != 'success'):
+            print(f"POLYMER {status} on '{folder_name}'")
+
+    return statuses
 
 
 def call_polymer(dirname, satellite_type=0, filetype=True, sline=None, eline=None, scol=None, ecol=None,
                           blocksize=None, resolution=None, ancillary=0, landmask=None, altitude=None, add_noise=None,
                           srf_file=None, use_srf=None, filename=None, ext=None, tmpdir=None, outdir=None, overwrite=None,
                           datasets=None, compress=None, format=None, multiprocessing=None, dir_base=None, calib=None,
-                          normalize=None):
+                          normalize=None, roi=None, roi_margin=10, worker=None, timeout=None):
     """
-    Calls the POLYMER algorithm on a single snapshot using subprocess.
+    Calls the POLYMER algorithm on a single snapshot using subprocess, or by sending the job to a running worker.
 
     Args:
         dirname (str): Directory name containing input data for POLYMER.
@@ -174,13 +281,49 @@ def call_polymer(dirname, satellite_type=0, filetype=True, sline=None, eline=Non
                 - 2: Apply wavelength normalization for MERIS and OLCI
                 - 3: Apply both geometry and wavelength normalization
             Default is None.
+        roi (tuple): Bounding box coordinates (min_lon, min_lat, max_lon, max_lat). When passed, and no line or
+            column limits are, POLYMER is only run on the pixel window covering the box. Default is None.
+        roi_margin (int): Number of pixels added around the window on every side. Default is 10.
+        worker (dict): A worker returned by 'start_polymer_worker()'. When passed the job is run by the worker,
+            which already has POLYMER loaded, instead of a new subprocess. Only used for OLCI. Default is None.
+        timeout (float): Seconds after which the subprocess, and POLYMER with it, is stopped. Default is None.
 
     Returns:
-        None
+        bool: True if POLYMER ran successfully, False otherwise.
     """
 
     file_path = os.path.join(project_root_path, script_path)
 
+    if (roi is not None and sline is None and eline is None and scol is None and ecol is None):
+        with netcdf_lock:
+            window = polymer_roi_window(dirname, roi, margin=roi_margin)
+        if (window is not None): # Only correcting the pixels around the bounding box
+            sline, eline, scol, ecol = window
+
+    if (worker is not None and satellite_type == 0):
+        # Keyword arguments of 'run_polymer()' in 'poly_script_olci.py', sent as is rather than as strings
+        option_strings = ['filetype', 'sline', 'eline', 'scol', 'ecol', 'blocksize', 'ancillary', 'landmask',
+                          'altitude', 'add_noise', 'filename', 'ext', 'tmpdir', 'outdir', 'overwrite', 'datasets',
+                          'compress', 'format', 'multiprocessing', 'dir_base', 'calib', 'normalize']
+        option_variables = [filetype, sline, eline, scol, ecol, blocksize, ancillary, landmask, altitude, add_noise,
+                            filename, ext, tmpdir, outdir, overwrite, datasets, compress, format, multiprocessing,
+                            dir_base, calib, normalize]
+        options = {opt: arg for opt, arg in zip(option_strings, option_variables) if arg is not None}
+
+        try:
+            reply = send_polymer_request(worker['socket_path'], {'command': 'run', 'dirname': dirname,
+                                                                 'options': options})
+        except (OSError, ValueError) as e:
+            print(f"Error: could not reach POLYMER worker at '{worker['socket_path']}': {e}")
+            return False
+
+        if (reply.get('status') != 'success'):
+            print(f"Error: POLYMER failed on '{dirname}': {reply.get('error')}")
+            return False
+
+        print(f"POLYMER finished '{os.path.basename(dirname)}' in {reply.get('seconds', 0):.1f} seconds")
+        return True
+
     if (satellite_type == 0):
         command = os.path.join(file_path, 'run_polymer.sh')
         args = [command, "run_polymer", dirname] # Initialize with required arguments
@@ -225,8 +368,8 @@ def call_polymer(dirname, satellite_type=0, filetype=True, sline=None, eline=Non
         args.extend(["--outdir", outdir])
     if overwrite is not None:
         args.extend(["--overwrite", str(overwrite)])
-    if datasets is not None:
-        args.extend(["--datasets", datasets])
+    if datasets is not None: # Passed as a single comma separated argument
+        args.extend(["--datasets", datasets if isinstance(datasets, str) else ','.join(datasets)])
     if compress is not None:
         args.extend(["--compress", str(compress)])
     if format is not None:
@@ -241,6 +384,199 @@ def call_polymer(dirname, satellite_type=0, filetype=True, sline=None, eline=Non
         args.extend(["--normalize", str(normalize)])
 
     try:
-        subprocess.run(args, check=True) # Calls script
+        if (timeout is None):
+            subprocess.run(args, check=True) # Calls script
+        else: # Own process group, so POLYMER is stopped along with the script when time runs out
+            process = subprocess.Popen(args, start_new_session=True)
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+                print(f"Error: POLYMER on '{dirname}' stopped after {timeout:.0f} seconds.")
+                return False
+            if (process.returncode != 0):
+                raise subprocess.CalledProcessError(process.returncode, args)
     except subprocess.CalledProcessError as e:
-        print(f"Error: {e}")
\ No newline at end of file
+        print(f"Error: {e}")
+        return False
+
+    return True
+
+
+def polymer_roi_window(dirname, bbox, margin=10, block_rows=512, geo_path=None):
+    """
+    Find the pixel window of an OLCI snapshot that covers a bounding box, using the latitude and longitude grids
+    in the snapshot's 'geo_coordinates.nc', or in any other file holding them such as a POLYMER output.
+    The grids are read a block of rows at a time to keep memory low.
+    If no pixel centre falls inside the box, which happens for boxes smaller than a pixel, the pixel closest to
+    the centre of the box is used instead.
+
+    Args:
+        dirname (str): Snapshot directory (.SEN3) containing 'geo_coordinates.nc'.
+        bbox (tuple): Bounding box coordinates (min_lon, min_lat, max_lon, max_lat).
+        margin (int): Number of pixels added around the window on every side. Default is 10.
+        block_rows (int): Number of rows read at a time. Default is 512.
+        geo_path (str): Path of the NetCDF file holding the 'latitude' and 'longitude' grids. Default is None,
+            the snapshot's 'geo_coordinates.nc'.
+
+    Returns:
+        tuple: (sline, eline, scol, ecol) with the end line and column exclusive, as taken by POLYMER,
+            or None if the box is not covered by the snapshot.
+    """
+
+    if (geo_path is None):
+        geo_path = os.path.join(dirname, 'geo_coordinates.nc')
+
+    if (not os.path.exists(geo_path)):
+        print(f"Error: '{geo_path}' not found, running POLYMER on the whole snapshot.")
+        return None
+
+    min_lon, min_lat, max_lon, max_lat = bbox
+    centre_lon, centre_lat = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+    lon_scale = np.cos(np.radians(centre_lat)) # Degrees of longitude are shorter away from the equator
+
+    rows, cols = [], []
+    nearest = (np.inf, None, None) # (squared distance, row, col) of the pixel closest to the centre
+
+    with nc.Dataset(geo_path) as dataset:
+        latitude = dataset.variables['latitude']
+        longitude = dataset.variables['longitude']
+        height, width = latitude.shape
+
+        for start in range(0, height, block_rows):
+            lat = np.ma.filled(latitude[start:start + block_rows, :], np.nan)
+            lon = np.ma.filled(longitude[start:start + block_rows, :], np.nan)
+
+            inside = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+            if inside.any():
+                block_rows_inside, block_cols_inside = np.nonzero(inside)
+                rows.extend([start + block_rows_inside.min(), start + block_rows_inside.max()])
+                cols.extend([block_cols_inside.min(), block_cols_inside.max()])
+            elif (len(rows) == 0):
+                distance = ((lon - centre_lon) * lon_scale) ** 2 + (lat - centre_lat) ** 2
+                if (not np.isnan(distance).all()):
+                    index = np.nanargmin(distance)
+                    if (distance.flat[index] < nearest[0]):
+                        row, col = np.unravel_index(index, distance.shape)
+                        nearest = (distance.flat[index], start + row, col)
+
+    if (len(rows) == 0):
+        if (nearest[0] > 0.01 ** 2): # Further than roughly a kilometre, so the box isn't in this snapshot
+            print(f"Error: bounding box '{bbox}' is not covered by '{dirname}'.")
+            return None
+        rows, cols = [nearest[1]], [nearest[2]]
+
+    sline = max(int(min(rows)) - margin, 0)
+    eline = min(int(max(rows)) + margin + 1, height)
+    scol = max(int(min(cols)) - margin, 0)
+    ecol = min(int(max(cols)) + margin + 1, width)
+
+    return sline, eline, scol, ecol
+
+
+def polymer_olci_members(bands=None):
+    """
+    Get the files of an OLCI snapshot POLYMER reads, to be passed as 'members' to 'io.unzip_all_zip_files()' so
+    the files it never opens, such as 'removed_pixels.nc' and the browse images, aren't extracted. A pixel window
+    (see 'polymer_roi_window()') can't be applied here, as each file is extracted whole.
+
+    Args:
+        bands (list): Wavelengths, in nm, of the radiance bands to extract. These must include every band POLYMER
+            reads for the correction as well as the bands the models need. Default is None, every band.
+
+    Returns:
+        list: File name patterns of the members to extract.
+    """
+
+    if (bands is None):
+        return olci_auxiliary_files + ['Oa??_radiance.nc']
+
+    return olci_auxiliary_files + [olci_band_files[band] + '_radiance.nc' for band in bands]
+
+
+def start_polymer_worker(socket_path=None, timeout=300):
+    """
+    Start a long running POLYMER worker, via 'run_polymer_worker.sh', and wait until it is ready for jobs.
+    The worker sources conda, activates the POLYMER environment and loads POLYMER a single time, then runs every
+    job passed to 'call_polymer()' with 'worker=', one at a time.
+
+    Args:
+        socket_path (str): Path of the unix socket the worker listens on. Default is None, a path in the
+            temporary directory is used.
+        timeout (float): Seconds to wait for the worker to be ready. Default is 300.
+
+    Returns:
+        dict: The worker, holding its 'process' and 'socket_path', or None if it failed to start.
+    """
+
+    if (socket_path is None):
+        socket_path = os.path.join(tempfile.gettempdir(), f"polymer_worker_{os.getpid()}.sock")
+
+    command = os.path.join(project_root_path, script_path, 'run_polymer_worker.sh')
+    process = subprocess.Popen([command, socket_path])
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if (process.poll() is not None):
+            print(f"Error: POLYMER worker exited with code {process.returncode} before it was ready.")
+            return None
+
+        try:
+            if (send_polymer_request(socket_path, {'command': 'ping'}, timeout=5).get('status') == 'ready'):
+                return {'process': process, 'socket_path': socket_path}
+        except (OSError, ValueError): # Not listening yet, still loading POLYMER
+            time.sleep(0.5)
+
+    print(f"Error: POLYMER worker was not ready after {timeout} seconds, stopping it.")
+    process.kill()
+    process.wait()
+    return None
+
+
+def stop_polymer_worker(worker, timeout=30):
+    """
+    Shut down a POLYMER worker started by 'start_polymer_worker()'.
+
+    Args:
+        worker (dict): The worker to stop.
+        timeout (float): Seconds to wait for the worker to exit before it is killed. Default is 30.
+
+    Returns:
+        None
+    """
+
+    try:
+        send_polymer_request(worker['socket_path'], {'command': 'shutdown'}, timeout=timeout)
+    except (OSError, ValueError) as e:
+        print(f"Error: could not reach POLYMER worker to shut it down: {e}")
+
+    try:
+        worker['process'].wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        worker['process'].kill()
+        worker['process'].wait()
+
+
+def send_polymer_request(socket_path, request, timeout=None):
+    """
+    Send a single request to a POLYMER worker and wait for its reply.
+
+    Args:
+        socket_path (str): Path of the unix socket the worker listens on.
+        request (dict): The request, see 'poly_worker.py' for the supported commands.
+        timeout (float): Seconds to wait on the socket. Default is None, waits until the job is finished.
+
+    Returns:
+        dict: The decoded reply.
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + '\n').encode())
+
+        with client.makefile('r') as reader:
+            line = reader.readline()
+
+    return json.loads(line)
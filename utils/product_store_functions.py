@@ -0,0 +1,441 @@
+"""
+File: product_store_functions.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the functions for a product store, a folder shared by every project and farm
+             that holds each downloaded snapshot and POLYMER output once, keyed by the product's identifier.
+             Runs link to the products they use rather than downloading or correcting their own copy. A product
+             is fetched into a staging folder and renamed into place once complete, so it is never seen half
+             written, and a lock file marks a fetch in flight so concurrent runs, in any process, wait for it
+             instead of starting a duplicate. The links pointing at a product are its references, once none are
+             left 'store_collect()' may delete it.
+
+Contents:
+    - open_product_store: Function that opens, creating if needed, a product store.
+    - store_acquire: Function that links a product into a folder, fetching it first if the store doesn't hold it.
+    - store_move: Function that moves a file or folder, keeping the reference if it is a link to a product.
+    - store_release: Function that removes a link to a product.
+    - store_references: Function that returns the links pointing at a product.
+    - store_collect: Function that deletes every product without references.
+    - store_key: Function that returns the key of a product, optionally qualified by the options it was made with.
+    - store_product_path: Function that returns the folder of a product in the store.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+    - Lock files rely on 'fcntl', so the store is only supported on Linux and macOS, as is POLYMER.
+"""
+
+# Standard library imports
+import os
+import re
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+# Third-party library imports
+
+
+# Local module imports
+
+
+def open_product_store(root_path, poll_interval=5.0):
+    """
+    Open a product store, creating its folders if they don't exist yet.
+
+    Args:
+        root_path (str): Path of the store's folder, shared by every project using it.
+        poll_interval (float): Seconds between checks while waiting on a fetch in flight (default is 5.0).
+
+    Returns:
+        dict: The store.
+    """
+
+    root = os.path.abspath(root_path)
+
+    for folder in ['products', 'staging', 'inflight', 'refs']:
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    return {'root': root, 'poll_interval': poll_interval}
+
+
+def store_acquire(store,  # The product store.
+                  key,  # Key of the product, see 'store_key()'.
+                  fetch_function,  # Function writing the product into a staging folder.
+                  link_dir,  # Folder the product is linked into.
+                  timeout=None  # Seconds to wait at most on a fetch in flight.
+                  ):
+    """
+    Link a product into a folder. If the store doesn't hold the product yet it is fetched by calling
+    'fetch_function(staging_dir)', which must write the product, a single file or folder, into 'staging_dir' and
+    return a true value on success. If another run is already fetching it, this waits for that fetch instead.
+
+    Args:
+        store (dict): The product store.
+        key (str): Key of the product, see 'store_key()'.
+        fetch_function (function): Function called as 'fetch_function(staging_dir)' to write the product.
+        link_dir (str): Folder the product is linked into, under the name it was fetched with.
+        timeout (float): Seconds to wait at most on a fetch in flight (default is None, no limit).
+
+    Returns:
+        str: Path of the link, or None if the fetch failed or the timeout passed.
+    """
+
+    end_time = None if timeout is None else time.time() + timeout
+    lock_path = os.path.join(store['root'], 'inflight', key + '.lock')
+
+    while True:
+        with store_lock(store):
+            if (os.path.isdir(store_product_path(store, key))):
+                return link_product(store, key, link_dir)
+
+            try: # Only one run fetches a product, the lock file is created or not in a single step
+                lock_descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                lock_descriptor = None
+
+        if (lock_descriptor is not None):
+            break
+
+        if (fetch_abandoned(lock_path)):
+            print(f"Warning: fetch of '{key}' was abandoned, fetching it again.")
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            continue
+
+        if (end_time is not None and time.time() >= end_time):
+            print(f"Error: timed out waiting for '{key}' to be fetched.")
+            return None
+
+        time.sleep(store['poll_interval'])
+
+    with os.fdopen(lock_descriptor, 'w') as lock_file:
+        json.dump({'pid': os.getpid(), 'time': time.time()}, lock_file)
+
+    staging_dir = tempfile.mkdtemp(prefix=key + '.', dir=os.path.join(store['root'], 'staging'))
+
+    try:
+        success = fetch_function(staging_dir)
+
+        if (not success or not os.listdir(staging_dir)):
+            print(f"Error: fetch of '{key}' failed.")
+            return None
+
+        with store_lock(store):
+            os.replace(staging_dir, store_product_path(store, key)) # Publishes the product in one step
+            return link_product(store, key, link_dir)
+    finally:
+        if (os.path.isdir(staging_dir)):
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        os.remove(lock_path)
+
+
+def store_move(store, path, target):
+    """
+    Move a file or folder. A link to a product is moved as a link and its reference updated to the new path,
+    anything else is moved by 'shutil.move()'.
+
+    Args:
+        store (dict): The product store, or None.
+        path (str): Path to move.
+        target (str): Path to move it to.
+
+    Returns:
+        str: The new path.
+    """
+
+    key = linked_key(store, path)
+
+    if (key is None):
+        return shutil.move(path, target)
+
+    with store_lock(store):
+        os.replace(path, target)
+        references = read_references(store, key)
+        references = [reference for reference in references if reference != os.path.abspath(path)]
+        write_references(store, key, references + [os.path.abspath(target)])
+
+    return target
+
+
+def store_release(store, path):
+    """
+    Remove a link to a product, dropping its reference. The product stays in the store until 'store_collect()'.
+
+    Args:
+        store (dict): The product store.
+        path (str): Path of the link.
+
+    Returns:
+        int: Number of references left to the product, or None if the path wasn't a link to a product.
+    """
+
+    key = linked_key(store, path)
+
+    if (key is None):
+        return None
+
+    with store_lock(store):
+        os.remove(path)
+        return len(live_references(store, key))
+
+
+def store_references(store, key):
+    """
+    Get the links pointing at a product. Links that were deleted, or now point elsewhere, are dropped.
+
+    Args:
+        store (dict): The product store.
+        key (str): Key of the product.
+
+    Returns:
+        list: Paths of the links.
+    """
+
+    with store_lock(store):
+        return live_references(store, key)
+
+
+def store_collect(store):
+    """
+    Delete every product that no link points at.
+
+    Args:
+        store (dict): The product store.
+
+    Returns:
+        list: Keys of the deleted products.
+    """
+
+    deleted = []
+
+    with store_lock(store):
+        for key in os.listdir(os.path.join(store['root'], 'products')):
+            if (not live_references(store, key)):
+                shutil.rmtree(store_product_path(store, key), ignore_errors=True)
+                write_references(store, key, [])
+                deleted.append(key)
+
+    return deleted
+
+
+def store_key(identifier, options=None):
+    """
+    Get the key of a product. A product made from another, such as a POLYMER output, is qualified by a digest of
+    the options it was made with, so outputs made with different options are stored apart.
+
+    Args:
+        identifier (str): Identifier of the product, such as its UUID or snapshot name.
+        options (dict): Options the product was made with, must be JSON serialisable (default is None).
+
+    Returns:
+        str: The key, safe to use as a file name.
+    """
+
+    key = re.sub(r'[^A-Za-z0-9._-]', '_', str(identifier))
+
+    if (options is not None):
+        key += '.' + hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:16]
+
+    return key
+
+
+def store_product_path(store, key):
+    """
+    Get the folder of a product in the store.
+
+    Args:
+        store (dict): The product store.
+        key (str): Key of the product.
+
+    Returns:
+        str: Path of the product's folder.
+    """
+
+    return os.path.join(store['root'], 'products', key)
+
+
+@contextmanager
+def store_lock(store):
+    """
+    Hold the lock guarding the store's products and references, across threads and processes.
+
+    Args:
+        store (dict): The product store.
+
+    Yields:
+        None
+    """
+
+    with open(os.path.join(store['root'], 'store.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def link_product(store, key, link_dir):
+    """
+    Link the file or folder of a product into a folder and record the reference. Must be called with the store's
+    lock held.
+
+    Args:
+        store (dict): The product store.
+        key (str): Key of the product.
+        link_dir (str): Folder the product is linked into.
+
+    Returns:
+        str: Path of the link.
+    """
+
+    product_path = store_product_path(store, key)
+    name = os.listdir(product_path)[0]
+
+    os.makedirs(link_dir, exist_ok=True)
+    link_path = os.path.join(os.path.abspath(link_dir), name)
+
+    temp_link = link_path + '.link'
+    if (os.path.lexists(temp_link)):
+        os.remove(temp_link)
+    os.symlink(os.path.join(product_path, name), temp_link)
+    os.replace(temp_link, link_path)
+
+    references = read_references(store, key)
+    if (link_path not in references):
+        write_references(store, key, references + [link_path])
+
+    return link_path
+
+
+def live_references(store, key):
+    """
+    Get the links pointing at a product, dropping those that were deleted or now point elsewhere. Must be called
+    with the store's lock held.
+
+    Args:
+        store (dict): The product store.
+        key (str): Key of the product.
+
+    Returns:
+        list: Paths of the links.
+    """
+
+    product_path = store_product_path(store, key)
+
+    references = [reference for reference in read_references(store, key)
+                  if os.path.islink(reference)
+                  and os.path.dirname(os.path.realpath(reference)) == os.path.realpath(product_path)]
+
+    write_references(store, key, references)
+
+    return references
+
+
+def linked_key(store, path):
+    """
+    Get the key of the product a path links to.
+
+    Args:
+        store (dict): The product store, or None.
+        path (str): Path to check.
+
+    Returns:
+        str: Key of the product, or None if the path isn't a link into the store.
+    """
+
+    if (store is None or not os.path.islink(path)):
+        return None
+
+    products_dir = os.path.join(store['root'], 'products')
+    product_path = os.path.dirname(os.path.realpath(path))
+
+    if (os.path.dirname(product_path) != os.path.realpath(products_dir)):
+        return None
+
+    return os.path.basename(product_path)
+
+
+def read_references(store, key):
+    """
+    Read the references recorded for a product.
+
+    Args:
+        store (dict): The product store.
+        key (str): Key of the product.
+
+    Returns:
+        list: Paths of the links recorded.
+    """
+
+    refs_path = os.path.join(store['root'], 'refs', key + '.json')
+
+    if (not os.path.isfile(refs_path)):
+        return []
+
+    with open(refs_path, 'r') as file:
+        return json.load(file)
+
+
+def write_references(store, key, references):
+    """
+    Atomically write the references of a product, removing the file once there are none.
+
+    Args:
+        store (dict): The product store.
+        key (str): Key of the product.
+        references (list): Paths of the links.
+
+    Returns:
+        None
+    """
+
+    refs_path = os.path.join(store['root'], 'refs', key + '.json')
+
+    if (not references):
+        if (os.path.isfile(refs_path)):
+            os.remove(refs_path)
+        return
+
+    file_descriptor, temp_path = tempfile.mkstemp(suffix='.json', dir=os.path.dirname(refs_path))
+    with os.fdopen(file_descriptor, 'w') as file:
+        json.dump(references, file)
+    os.replace(temp_path, refs_path)
+
+
+def fetch_abandoned(lock_path):
+    """
+    Check if the process fetching a product has died, leaving its lock file behind.
+
+    Args:
+        lock_path (str): Path of the lock file.
+
+    Returns:
+        bool: True if the fetching process is no longer running.
+    """
+
+    try:
+        with open(lock_path, 'r') as lock_file:
+            pid = json.load(lock_file)['pid']
+    except FileNotFoundError:
+        return False
+    except (ValueError, KeyError): # Still being written, unless it has been empty for a minute
+        try:
+            return time.time() - os.path.getmtime(lock_path) > 60
+        except FileNotFoundError:
+            return False
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError: # Running as another user
+        return False
+
+    return False
@@ -26,12 +26,14 @@ from PIL import Image
 
 # Local module imports
 import utils.io_functions as io
+import utils.array_operations as ao
 
 def populate_text_file(date_tuples,  # List of tuples, each containing start and end dates.
                        file_extension,  # File extension for filenames.
                        path,  # File path to the text file.
                        preface,  # Prefix for filenames.
-                       project_name='name'  # Project name (default is 'name').
+                       project_name='name',  # Project name (default is 'name').
+                       start_index=0  # Index of the first date tuple, for writing a run a slot at a time.
                        ):
     """
     Populate a text file with generated filenames based on date tuples.
@@ -42,6 +44,7 @@ def populate_text_file(date_tuples,  # List of tuples, each containing start and
         path (str): File path to the text file.
         preface (str): Prefix for filenames.
         project_name (str): Project name (default is 'name').
+        start_index (int): Index of the first date tuple, used in the filenames (default is 0).
 
     Returns:
         None
@@ -52,7 +55,7 @@ def populate_text_file(date_tuples,  # List of tuples, each containing start and
         # Iterate over the date tuples
         for i, date_tuple in enumerate(date_tuples):
             # Generate the filename
-            filename = f"{preface}_{i}{file_extension}"
+            filename = f"{preface}_{start_index + i}{file_extension}"
             if len(date_tuple) == 2:
                 date_str_1 = date_tuple[0]
                 date_str_2 = date_tuple[1]
@@ -72,7 +75,8 @@ def save_ndarrays_as_png(ndarrays,  # List of ndarrays to be saved as PNGs.
                          path,  # Directory path where PNG files will be saved.
                          preface="image",  # Prefix for filenames (default is "image").
                          date_tuples=None,  # List of tuples, each containing start and end dates (default is None).
-                         project_name='name'  # Project name (default is 'name').
+                         project_name='name',  # Project name (default is 'name').
+                         start_index=0  # Index of the first ndarray, for writing a run a slot at a time.
                          ):
     """
     Save ndarrays as PNG image files with optional date-based filenames.
@@ -83,6 +87,7 @@ def save_ndarrays_as_png(ndarrays,  # List of ndarrays to be saved as PNGs.
         preface (str): Prefix for filenames (default is "image").
         date_tuples (list of tuple): List of tuples, each containing start and end dates (default is None).
         project_name (str): Project name (default is 'name').
+        start_index (int): Index of the first ndarray, used in the filenames (default is 0).
 
     Returns:
         None
@@ -102,7 +107,7 @@ def save_ndarrays_as_png(ndarrays,  # List of ndarrays to be saved as PNGs.
         image = Image.fromarray(uint8_arr)
 
         # Generate the filename
-        filename = f"{preface}_{i}.png"
+        filename = f"{preface}_{start_index + i}.png"
         if date_tuples and i < len(date_tuples) and len(date_tuples[i]) == 2:
             date_str_1 = date_tuples[i][0]
             date_str_2 = date_tuples[i][1]
@@ -124,7 +129,8 @@ def save_ndarrays_as_npy(ndarrays,  # List of ndarrays to be saved.
                          path,  # Directory path where .npy files will be saved.
                          preface="array",  # Prefix for filenames (default is "array").
                          date_tuples=None,  # List of tuples, each containing start and end dates (default is None).
-                         project_name='name'  # Project name (default is 'name').
+                         project_name='name',  # Project name (default is 'name').
+                         start_index=0  # Index of the first ndarray, for writing a run a slot at a time.
                          ):
     """
     Save ndarrays as .npy files with optional date-based filenames.
@@ -135,6 +141,7 @@ def save_ndarrays_as_npy(ndarrays,  # List of ndarrays to be saved.
         preface (str): Prefix for filenames (default is "array").
         date_tuples (list of tuple): List of tuples, each containing start and end dates (default is None).
         project_name (str): Project name (default is 'name').
+        start_index (int): Index of the first ndarray, used in the filenames (default is 0).
 
     Returns:
         None
@@ -147,7 +154,7 @@ def save_ndarrays_as_npy(ndarrays,  # List of ndarrays to be saved.
     # Iterate over the ndarrays and save them as .npy files
     for i, arr in enumerate(ndarrays):
         # Generate the filename
-        filename = f"{preface}_{i}.npy"
+        filename = f"{preface}_{start_index + i}.npy"
         if date_tuples and i < len(date_tuples) and len(date_tuples[i]) == 2:
             date_str_1 = date_tuples[i][0]
             date_str_2 = date_tuples[i][1]
@@ -179,11 +186,7 @@ def write_data_to_csv(ndarrays,  # List of ndarrays containing data to be writte
     # Prepare the data for writing to CSV
     data = []
     for date, arr in zip(date_tuples, ndarrays):
-        average = np.average(arr)
-        minimum = np.min(arr)
-        maximum = np.max(arr)
-        std_dev = np.std(arr)
-        data.append([date, average, minimum, maximum, std_dev])
+        data.append([date] + ao.array_statistics(arr))
 
     # Check if the file already exists
     file_exists = os.path.isfile(csv_path)
@@ -0,0 +1,172 @@
+"""
+File: timeseries_functions.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the functions for the time-series statistics store. Rows are kept in an SQLite
+             table keyed, and therefore ordered, by date range, so new slots are merged in place and the csv
+             layout used by 'plot_csv_data()' is only written when it is exported.
+
+Contents:
+    - open_timeseries_store: Function that opens (and if needed creates) a time-series store.
+    - timeseries_has_series: Function that checks if a series has any rows in the store.
+    - timeseries_adopt_csv: Function that imports an existing csv into an empty series.
+    - timeseries_insert: Function that computes statistics for ndarrays and merges them into a series.
+    - timeseries_export_csv: Function that writes a series out in the csv layout.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+import os
+import csv
+import ast
+import sqlite3
+import tempfile
+
+# Third-party library imports
+
+
+# Local module imports
+import utils.misc_functions as mf
+import utils.array_operations as ao
+
+csv_header = ['Date Range', 'Average', 'Minimum', 'Maximum', 'Standard Deviation']
+
+
+def open_timeseries_store(store_path):
+    """
+    Open the time-series store at the passed path, creating it if it doesn't already exist.
+
+    Args:
+        store_path (str): Path to the SQLite store file.
+
+    Returns:
+        sqlite3.Connection: Connection to the store, to be closed by the caller.
+    """
+
+    if (not os.path.exists(store_path)):
+        mf.folder_creation_manage(store_path) # Creates folders leading up to file
+
+    connection = sqlite3.connect(store_path)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS statistics (
+            series TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            average REAL,
+            minimum REAL,
+            maximum REAL,
+            std_dev REAL,
+            PRIMARY KEY (series, start_date, end_date)
+        ) WITHOUT ROWID
+    """)
+    connection.commit()
+
+    return connection
+
+
+def timeseries_has_series(connection, series):
+    """
+    Check if a series has any rows in the store.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the store.
+        series (str): Name of the series.
+
+    Returns:
+        bool: True if at least one row exists for the series, False otherwise.
+    """
+
+    cursor = connection.execute("SELECT 1 FROM statistics WHERE series = ? LIMIT 1", (series,))
+    return cursor.fetchone() is not None
+
+
+def timeseries_adopt_csv(connection, series, csv_path):
+    """
+    Import the rows of an existing csv into a series, only done if the series is still empty.
+    This way history written before the store existed is kept when the csv is next exported.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the store.
+        series (str): Name of the series.
+        csv_path (str): Path to the csv file.
+
+    Returns:
+        None
+    """
+
+    if (timeseries_has_series(connection, series) or not os.path.isfile(csv_path)):
+        return
+
+    rows = []
+
+    with open(csv_path, 'r') as csvfile:
+        reader = csv.reader(csvfile)
+        for row in reader:
+            if (row == csv_header or len(row) != len(csv_header)):
+                continue
+            start_date, end_date = ast.literal_eval(row[0])
+            rows.append([series, start_date, end_date] + [float(value) for value in row[1:]])
+
+    with connection:
+        connection.executemany("INSERT OR REPLACE INTO statistics VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def timeseries_insert(connection,  # Connection to the store.
+                      series,  # Name of the series.
+                      ndarrays,  # List of ndarrays to compute statistics for.
+                      date_tuples  # List of tuples, each containing start and end dates.
+                      ):
+    """
+    Compute statistics for each ndarray and merge them into a series. A date range that already exists is replaced,
+    so rerunning a slot never creates a duplicate row.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the store.
+        series (str): Name of the series.
+        ndarrays (list of np.ndarray): List of ndarrays to compute statistics for.
+        date_tuples (list of tuple): List of tuples, each containing start and end dates.
+
+    Returns:
+        None
+    """
+
+    rows = []
+    for date, arr in zip(date_tuples, ndarrays):
+        rows.append([series, date[0], date[1]] + [float(value) for value in ao.array_statistics(arr)])
+
+    with connection:
+        connection.executemany("INSERT OR REPLACE INTO statistics VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def timeseries_export_csv(connection, series, csv_path):
+    """
+    Write a series out in the csv layout, sorted by date. The rows are streamed in key order to a temporary file
+    in the same folder, which then replaces the csv, so readers never see a partially written file.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the store.
+        series (str): Name of the series.
+        csv_path (str): Path of the csv file to write.
+
+    Returns:
+        None
+    """
+
+    mf.folder_creation_manage(csv_path)
+
+    cursor = connection.execute(
+        "SELECT start_date, end_date, average, minimum, maximum, std_dev FROM statistics "
+        "WHERE series = ? ORDER BY start_date, end_date", (series,))
+
+    file_descriptor, temp_path = tempfile.mkstemp(suffix='.csv', dir=os.path.dirname(os.path.abspath(csv_path)))
+
+    with os.fdopen(file_descriptor, 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(csv_header)
+        for start_date, end_date, average, minimum, maximum, std_dev in cursor:
+            writer.writerow([(start_date, end_date), average, minimum, maximum, std_dev])
+
+    os.replace(temp_path, csv_path)
@@ -0,0 +1,376 @@
+"""
+File: workspace_functions.py
+Author: Aidan McEnaney
+Date: 2026-10-17
+
+Description: This module contains the functions for a workspace, a disk budget shared by every stage of a run.
+             The workspace tracks the intermediate products on disk (snapshot folders, POLYMER nc files and npy
+             folders), admits new products only when they fit in the budget and, when they don't, deletes the
+             least recently used products that have already been consumed. Every function is thread safe, so the
+             download, correction and model stages of a pipelined or parallel run can share one workspace.
+
+Contents:
+    - create_workspace: Function that creates a workspace with a byte budget.
+    - workspace_admit: Function that reserves space for a new product, waiting or evicting until it fits.
+    - workspace_release: Function that gives back space reserved by 'workspace_admit()'.
+    - workspace_track: Function that starts tracking a product on disk.
+    - workspace_touch: Function that marks a product as just used.
+    - workspace_consume: Function that marks a product as consumed, so it may be evicted.
+    - workspace_reuse: Function that claims a product kept in the workspace, so it isn't made again.
+    - workspace_remove: Function that deletes a product and stops tracking it.
+    - workspace_clear: Function that deletes every consumed product.
+    - workspace_usage: Function that returns the bytes in use, reserved and budgeted.
+    - workspace_evict: Function that picks consumed products to delete, least recently used first, until enough is
+        free.
+    - workspace_in_use: Function that returns the bytes tracked and reserved.
+    - delete_path: Function that deletes a file or folder.
+    - path_size: Function that returns the size of a file or folder in bytes.
+
+Notes:
+    - This code is distributed under the MIT License. See LICENSE.txt for more details.
+"""
+
+# Standard library imports
+import os
+import time
+import shutil
+import threading
+
+# Third-party library imports
+
+
+# Local module imports
+
+
+def create_workspace(byte_budget):
+    """
+    Create a workspace, the state shared by every stage using the same disk budget.
+
+    Args:
+        byte_budget (int): Bytes the tracked products, and space reserved for new ones, may use in total.
+
+    Returns:
+        dict: The workspace.
+    """
+
+    return {
+        'budget': byte_budget,
+        'reserved': 0, # Bytes admitted for products that are still being written
+        'items': {}, # Maps product paths to their 'kind', 'size', 'consumed' flag and 'last_used' time
+        'condition': threading.Condition(),
+    }
+
+
+def workspace_admit(workspace, expected_bytes, timeout=None):
+    """
+    Reserve space for a new product. Consumed products are evicted only if that makes it fit, otherwise this
+    waits until other stages consume or remove products. A product larger than the whole budget is admitted once
+    nothing else is in use, so a run never waits forever. Evicted products are deleted after the workspace's
+    condition is released, so other stages aren't held up by the deletion.
+
+    Args:
+        workspace (dict): The workspace.
+        expected_bytes (int): Bytes the product is expected to use.
+        timeout (float): Seconds to wait at most (default is None, no limit).
+
+    Returns:
+        bool: True if the space was reserved, False if the timeout passed first.
+    """
+
+    end_time = None if timeout is None else time.time() + timeout
+
+    while True:
+        evicted = {}
+
+        with workspace['condition']:
+            used = workspace_in_use(workspace)
+            free = workspace['budget'] - used
+            consumed = sum(item['size'] for item in workspace['items'].values() if item['consumed'])
+
+            # Evicting only helps if it makes the product fit, or frees everything for one over the budget
+            if (free < expected_bytes and (free + consumed >= expected_bytes or consumed == used)):
+                evicted = workspace_evict(workspace, expected_bytes - free)
+                used = workspace_in_use(workspace)
+                free = workspace['budget'] - used
+
+            admitted = free >= expected_bytes or used == 0
+
+            if (admitted):
+                if (free < expected_bytes):
+                    print(f"Warning: product of {expected_bytes} bytes is over the workspace budget of "
+                          f"{workspace['budget']} bytes.")
+                workspace['reserved'] += expected_bytes
+            elif (not evicted):
+                remaining = None if end_time is None else end_time - time.time()
+                if (remaining is not None and remaining <= 0):
+                    return False
+
+                workspace['condition'].wait(remaining)
+
+        for path in evicted:
+            delete_path(path)
+
+        if (admitted):
+            return True
+
+
+def workspace_release(workspace, reserved_bytes):
+    """
+    Give back space reserved by 'workspace_admit()', such as when a download failed.
+
+    Args:
+        workspace (dict): The workspace.
+        reserved_bytes (int): Bytes to give back.
+
+    Returns:
+        None
+    """
+
+    with workspace['condition']:
+        workspace['reserved'] = max(0, workspace['reserved'] - reserved_bytes)
+        workspace['condition'].notify_all()
+
+
+def workspace_track(workspace, path, kind, reserved_bytes=0):
+    """
+    Start tracking a product on disk, measuring its actual size. The space reserved for it is given back, as it
+    is now counted by its size instead.
+
+    Args:
+        workspace (dict): The workspace.
+        path (str): Path of the product's file or folder.
+        kind (str): Kind of product, such as 'snapshot', 'nc' or 'npy'.
+        reserved_bytes (int): Bytes reserved for the product by 'workspace_admit()' (default is 0).
+
+    Returns:
+        None
+    """
+
+    size = path_size(path)
+
+    with workspace['condition']:
+        workspace['items'][os.path.abspath(path)] = {'kind': kind, 'size': size, 'consumed': False,
+                                                     'last_used': time.time()}
+        workspace['reserved'] = max(0, workspace['reserved'] - reserved_bytes)
+        workspace['condition'].notify_all()
+
+
+def workspace_touch(workspace, path):
+    """
+    Mark a product as just used, so it is evicted after products that were used longer ago.
+
+    Args:
+        workspace (dict): The workspace.
+        path (str): Path of the product.
+
+    Returns:
+        None
+    """
+
+    with workspace['condition']:
+        item = workspace['items'].get(os.path.abspath(path))
+        if (item is not None):
+            item['last_used'] = time.time()
+
+
+def workspace_consume(workspace, path):
+    """
+    Mark a product as consumed, it stays on disk for reuse, see 'workspace_reuse()', until its space is needed.
+
+    Args:
+        workspace (dict): The workspace.
+        path (str): Path of the product.
+
+    Returns:
+        bool: True if the product is tracked, False otherwise.
+    """
+
+    with workspace['condition']:
+        item = workspace['items'].get(os.path.abspath(path))
+        if (item is not None):
+            item['consumed'] = True
+            item['last_used'] = time.time()
+        workspace['condition'].notify_all()
+
+    return item is not None
+
+
+def workspace_reuse(workspace, path):
+    """
+    Claim a product kept in the workspace, such as the POLYMER output of a snapshot corrected by an earlier run,
+    instead of making it again. The product is marked as in use, so it isn't evicted until consumed again.
+
+    Args:
+        workspace (dict): The workspace.
+        path (str): Path of the product.
+
+    Returns:
+        bool: True if the product is tracked and still on disk, False if it has to be made.
+    """
+
+    with workspace['condition']: # Evicted products are no longer tracked, so one can't be deleted once claimed
+        item = workspace['items'].get(os.path.abspath(path))
+        if (item is None or not os.path.exists(path)):
+            return False
+        item['consumed'] = False
+        item['last_used'] = time.time()
+
+    return True
+
+
+def workspace_remove(workspace, path):
+    """
+    Delete a product, whether consumed or not, and stop tracking it.
+
+    Args:
+        workspace (dict): The workspace.
+        path (str): Path of the product.
+
+    Returns:
+        None
+    """
+
+    with workspace['condition']:
+        workspace['items'].pop(os.path.abspath(path), None)
+        workspace['condition'].notify_all()
+
+    delete_path(path) # Outside the condition, so other stages aren't held up
+
+
+def workspace_clear(workspace):
+    """
+    Delete every consumed product, such as at the end of a run.
+
+    Args:
+        workspace (dict): The workspace.
+
+    Returns:
+        int: Bytes freed.
+    """
+
+    with workspace['condition']:
+        evicted = workspace_evict(workspace, float('inf'))
+
+    for path in evicted:
+        delete_path(path)
+
+    return sum(evicted.values())
+
+
+def workspace_usage(workspace):
+    """
+    Get how much of the budget is in use.
+
+    Args:
+        workspace (dict): The workspace.
+
+    Returns:
+        dict: Bytes 'used' by tracked products, 'reserved' for new ones, 'consumed' (evictable) and the 'budget'.
+    """
+
+    with workspace['condition']:
+        items = workspace['items'].values()
+        return {
+            'used': sum(item['size'] for item in items),
+            'reserved': workspace['reserved'],
+            'consumed': sum(item['size'] for item in items if item['consumed']),
+            'budget': workspace['budget'],
+        }
+
+
+def workspace_evict(workspace, needed_bytes):
+    """
+    Stop tracking consumed products, least recently used first, until at least 'needed_bytes' are freed or none
+    are left. Must be called with the workspace's condition held. The products aren't deleted here, rmtree can
+    take a while, the caller deletes them with 'delete_path()' once the condition is released.
+
+    Args:
+        workspace (dict): The workspace.
+        needed_bytes (float): Bytes to free.
+
+    Returns:
+        dict: Maps the path of each evicted product to its size in bytes.
+    """
+
+    consumed = [(item['last_used'], path) for path, item in workspace['items'].items() if item['consumed']]
+    consumed.sort()
+
+    evicted = {}
+    freed = 0
+
+    for last_used, path in consumed:
+        if (freed >= needed_bytes):
+            break
+        evicted[path] = workspace['items'].pop(path)['size']
+        freed += evicted[path]
+
+    if (freed):
+        workspace['condition'].notify_all()
+
+    return evicted
+
+
+def workspace_in_use(workspace):
+    """
+    Get the bytes used by tracked products plus those reserved for new ones. Must be called with the
+    workspace's condition held.
+
+    Args:
+        workspace (dict): The workspace.
+
+    Returns:
+        int: Bytes in use.
+    """
+
+    return sum(item['size'] for item in workspace['items'].values()) + workspace['reserved']
+
+
+def delete_path(path):
+    """
+    Delete a file or folder if it exists. A link is removed without touching what it points to.
+
+    Args:
+        path (str): Path of the file or folder.
+
+    Returns:
+        None
+    """
+
+    try:
+        if (os.path.islink(path)):
+            os.remove(path)
+        elif (os.path.isdir(path)):
+            shutil.rmtree(path)
+        elif (os.path.exists(path)):
+            os.remove(path)
+    except OSError as e:
+        print(f"Error: could not delete '{path}': {e}")
+
+
+def path_size(path):
+    """
+    Get the size of a file, or of every file within a folder. A link counts as 0 bytes, as what it points to, such
+    as a product in a product store, isn't deleted with it.
+
+    Args:
+        path (str): Path of the file or folder.
+
+    Returns:
+        int: Size in bytes, 0 if the path doesn't exist.
+    """
+
+    if (os.path.islink(path)):
+        return 0
+
+    if (os.path.isfile(path)):
+        return os.path.getsize(path)
+
+    size = 0
+
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            if (not os.path.islink(file_path)):
+                size += os.path.getsize(file_path)
+
+    return size